@@ -4,7 +4,7 @@ from QNetwork.q_network_impl import SecureChannel
 CONFIG_FILE = "q_network.cfg"
 
 
-def open_channel(from_name, to_name):
+def open_channel(from_name, to_name, config=None, session=False):
     """
     Opens a secure channel between the two nodes provided via their respective identifiers.
 
@@ -13,8 +13,26 @@ def open_channel(from_name, to_name):
 
     The function returns a context manager to be used in a with statement.
         - write(data) generates the necessary key end sends data encrypted to the recipient.
-            Currently only ASCII strings are supported
+            Strings are sent latin-1 encoded, bytes-like data is sent as is
+        - write_stream(source) sends bytes, a file-like object or an iterable of chunks as encrypted frames, generating
+            key frame by frame
         - read() receives an encrypted message from a sender and decrypts it using the shared key
+        - read_bytes() is like read() but returns the decrypted bytes
+        - read_stream() yields the decrypted frames of a stream sent with write_stream(source)
+        - fill_key_pool() generates key ahead of demand up to KeyPoolSize bits, the other end has to call
+            sync_key_pool() at the same time. Unused key is kept for later messages in the same direction.
+        - flush() sends the messages buffered in session mode
+        - metrics holds the phase records and traffic counters if CollectMetrics is set
+
+    In session mode many messages are exchanged in one context: written messages are buffered and sent together in a
+    single length-prefixed frame when the channel reads, flushes or exits, so they share key generation and classical
+    round trips. Both ends have to open the channel in the same mode.
+
+    >>> def example_session()
+    >>>     with open_channel('Alice', 'Bob', session=True) as channel:
+    >>>         channel.write("Hello, Bob!")
+    >>>         channel.write("How are you?")
+    >>>         reply = channel.read()
 
     >>> def example_write()
     >>>     with open_channel('Alice', 'Bob') as channel:
@@ -25,11 +43,21 @@ def open_channel(from_name, to_name):
     >>>         msg = channel.read()
     >>>         print("Bob received message:", msg)
 
+    Used in an async with statement the context is an AsyncSecureChannel offering the same methods as coroutines, so
+    one event loop can serve many channels concurrently.
+
+    >>> async def example_async_write()
+    >>>     async with open_channel('Alice', 'Bob') as channel:
+    >>>         await channel.write("Hello, Bob!")
+
 
     :param from_name: Unique identifier of sender node
     :param to_name: Unique identifier of receiver node
+    :param config: NetworkConfig object or path of a configuration file, defaults to q_network.cfg. Configuration files
+        are parsed once and only reloaded when they change
+    :param session: True to buffer written messages and send them together (see above)
     :return: SecureChannel object
     """
-    sc = SecureChannel(from_name, to_name)
-    sc.network_factory = NetworkFactory(CONFIG_FILE)
+    sc = SecureChannel(from_name, to_name, session)
+    sc.network_factory = NetworkFactory(CONFIG_FILE if config is None else config)
     return sc
@@ -0,0 +1,179 @@
+"""
+Asyncio variants of the classical and the secure channel. The connections of SimulaQron and tinyIpcLib are blocking, so
+every blocking call (sending or receiving a message, a QKD round) is run on a thread of an executor and awaited. This
+keeps the event loop free, but each pending call occupies a thread: waiting for the other end to write holds one thread
+per channel. The default executor is shared by all channels of the process and runs at most CHANNEL_WORKERS calls at
+once, further calls wait until a thread is free. Serving more channels concurrently needs a larger executor, passed to
+the channels via their executor argument.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from QNetwork.q_network_impl import END_STREAM_TAG, READING, WRITING, FRAME_SIZE, SecureChannel
+
+CHANNEL_WORKERS = 256
+
+_executor = None
+
+
+def _default_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CHANNEL_WORKERS)
+    return _executor
+
+
+class _AsyncWrapper:
+    def __init__(self, executor):
+        self._executor = executor or _default_executor()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+
+class AsyncCAChannel(_AsyncWrapper):
+    """
+    Asyncio variant of CAChannel. Every call is run on a worker thread and awaited, leaving the event loop free to drive
+    other channels in the meantime.
+    """
+    def __init__(self, ca_channel, executor=None):
+        super().__init__(executor)
+        self.ca_channel = ca_channel
+
+    async def send(self, data):
+        await self._run(self.ca_channel.send, data)
+
+    async def send_bits(self, values):
+        await self._run(self.ca_channel.send_bits, values)
+
+    async def send_indices(self, indices):
+        await self._run(self.ca_channel.send_indices, indices)
+
+    async def send_integers(self, values):
+        await self._run(self.ca_channel.send_integers, values)
+
+    async def send_bytes(self, data):
+        await self._run(self.ca_channel.send_bytes, data)
+
+    async def send_ack(self):
+        await self._run(self.ca_channel.send_ack)
+
+    async def receive(self):
+        return await self._run(self.ca_channel.receive)
+
+    async def receive_bits(self):
+        return await self._run(self.ca_channel.receive_bits)
+
+    async def receive_indices(self):
+        return await self._run(self.ca_channel.receive_indices)
+
+    async def receive_integers(self):
+        return await self._run(self.ca_channel.receive_integers)
+
+    async def receive_bytes(self):
+        return await self._run(self.ca_channel.receive_bytes)
+
+    async def receive_ack(self):
+        await self._run(self.ca_channel.receive_ack)
+
+    async def clear(self):
+        await self._run(self.ca_channel.clear)
+
+    async def close(self):
+        await self._run(self.ca_channel.close)
+
+
+class AsyncSecureChannel(_AsyncWrapper):
+    """
+    Asyncio variant of SecureChannel with the same protocol semantics. Frames, tags and acknowledgements are exchanged
+    via an AsyncCAChannel, connecting and generating key (the QKD rounds) run on worker threads, so a single process can
+    serve many secure channels concurrently from one event loop.
+
+    >>> async def example_write():
+    >>>     async with open_channel('Alice', 'Bob') as channel:
+    >>>         await channel.write("Hello, Bob!")
+    """
+    def __init__(self, secure_channel, executor=None):
+        super().__init__(executor)
+        self.secure_channel = secure_channel
+        self.ca_channel = None
+
+    async def __aenter__(self):
+        await self._run(self.secure_channel.__enter__)
+        self.ca_channel = AsyncCAChannel(self.secure_channel.ca_channel, self._executor)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        channel = self.secure_channel
+        if exc_type is not None:
+            await self._run(channel.__exit__, exc_type, exc_val, exc_tb)
+            return
+
+        await self.flush()
+        if channel.state is WRITING:
+            await self.ca_channel.receive_ack()
+            await self.ca_channel.clear()
+        elif channel.state is READING:
+            await self.ca_channel.send_ack()
+        else:
+            await self.ca_channel.clear()
+        await self._run(channel.release_channels)
+
+    async def write(self, data):
+        if self.secure_channel.session:
+            self.secure_channel.write(data)
+        else:
+            self.secure_channel.start_writing()
+            await self._write_frame(SecureChannel.to_bytes(data))
+
+    async def flush(self):
+        frame = self.secure_channel.take_session_frame()
+        if frame is not None:
+            await self._write_frame(frame)
+
+    async def write_stream(self, source, frame_size=FRAME_SIZE):
+        await self.flush()
+        self.secure_channel.start_writing()
+        frames = SecureChannel.frames_of(source, frame_size)
+        end = object()
+        frame = await self._run(next, frames, end)
+        while frame is not end:
+            await self._write_frame(frame)
+            frame = await self._run(next, frames, end)
+
+        await self.ca_channel.send_bytes(SecureChannel.to_bytes(END_STREAM_TAG))
+
+    async def _write_frame(self, frame):
+        await self.ca_channel.send_bytes(await self._run(self.secure_channel.encrypt_frame, frame))
+
+    async def read(self):
+        return SecureChannel.to_string(await self.read_bytes())
+
+    async def read_bytes(self):
+        if not self.secure_channel.awaits_frame():
+            return self.secure_channel.read_message()
+
+        await self.flush()
+        return await self._run(self.secure_channel.read_message, await self._receive_tag())
+
+    async def read_stream(self):
+        """
+        Asynchronously yields the decrypted frames of a stream sent with write_stream.
+        """
+        await self.flush()
+        self.secure_channel.start_reading()
+        tag = await self._receive_tag()
+        while tag != END_STREAM_TAG:
+            yield await self._run(self.secure_channel.read_frame, tag)
+            tag = await self._receive_tag()
+
+    async def _receive_tag(self):
+        return SecureChannel.to_string(await self.ca_channel.receive_bytes())
+
+    async def fill_key_pool(self, size=0):
+        await self._run(self.secure_channel.fill_key_pool, size)
+
+    async def sync_key_pool(self):
+        await self._run(self.secure_channel.sync_key_pool)
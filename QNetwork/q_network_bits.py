@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def pack_bits(bits):
+    """
+    Packs a sequence of bits into bytes (eight bits per byte, most significant bit first). If the amount of bits is not
+    a multiple of eight the last byte is padded with zeros.
+    :param bits: Integer list or array of bits ([0, 1, 1])
+    :return: bytes containing the packed bits
+    """
+    return np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes()
+
+
+def unpack_bits(data, count=None):
+    """
+    Unpacks bytes into an uint8 array of bits (most significant bit first).
+    :param data: bytes-like object
+    :param count: Number of bits to unpack, defaults to all bits of data
+    :return: uint8 numpy array of bits
+    """
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count)
+
+
+def xor_bytes(data, key):
+    """
+    Applies the one-time pad by XORing data with key on whole bytes.
+    :param data: bytes-like object to encrypt or decrypt
+    :param key: bytes-like object which has to be at least as long as data
+    :return: bytes of the same length as data
+    """
+    if len(key) < len(data):
+        raise ValueError("Not enough key ({}) to pad data of length {}.".format(len(key), len(data)))
+
+    d = np.frombuffer(data, dtype=np.uint8)
+    k = np.frombuffer(key, dtype=np.uint8, count=len(d))
+    return np.bitwise_xor(d, k).tobytes()
+
+
+class BitBuffer:
+    """
+    Compact FIFO buffer of key bits. Bits are appended in arbitrary amounts (i.e.: the output of a QKD round) and stored
+    packed, eight per byte. Key is taken from the front of the buffer in whole bytes.
+    """
+    def __init__(self):
+        self._bytes = bytearray()
+        self._pending = np.empty(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._bytes) * 8 + len(self._pending)
+
+    @property
+    def byte_length(self):
+        """
+        Number of whole bytes available in the buffer.
+        """
+        return len(self._bytes)
+
+    def extend(self, bits):
+        """
+        Appends bits to the end of the buffer.
+        :param bits: Integer list or array of bits
+        """
+        bits = np.concatenate((self._pending, np.asarray(bits, dtype=np.uint8)))
+        full = len(bits) - len(bits) % 8
+        self._bytes += np.packbits(bits[:full]).tobytes()
+        self._pending = bits[full:]
+
+    def take_bytes(self, size):
+        """
+        Removes size bytes from the front of the buffer and returns them.
+        :param size: Number of bytes to take
+        :return: bytes of key
+        """
+        if size > len(self._bytes):
+            raise ValueError("Not enough key ({}) to take {} bytes.".format(len(self._bytes), size))
+
+        taken = bytes(self._bytes[:size])
+        del self._bytes[:size]
+        return taken
+
+    def pad(self, data):
+        """
+        XORs data with the key at the front of the buffer (one-time pad) and removes the key.
+        :param data: bytes-like object to encrypt or decrypt
+        :return: bytes of the same length as data
+        """
+        return xor_bytes(data, self.take_bytes(len(data)))
@@ -1,10 +1,43 @@
-import time
+import socket
+
+import numpy as np
+
+from QNetwork.q_network_wire import LEGACY_FORMAT, FORMAT_VERSION, encode_bits, decode_bits, encode_indices, \
+    decode_indices, encode_varints, decode_varints
+
+
+def connection_is_alive(connection):
+    """
+    Probes whether a connection can still be used. Connections offering an is_alive() method are asked directly,
+    socket based connections (like SimulaQron's CQCConnection keeping its socket in _s) are alive as long as their
+    socket is open and the other end did not hang up. Other connections are assumed to be alive.
+    :param connection: Quantum or classical connection of a channel
+    :return: True if the connection is alive
+    """
+    probe = getattr(connection, 'is_alive', None)
+    if probe is not None:
+        return probe()
+
+    sock = getattr(connection, '_s', None)
+    if not isinstance(sock, socket.socket):
+        return True
+    if sock.fileno() == -1:
+        return False
+    try:
+        # A readable socket without any data means the other end closed the connection
+        return len(sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)) > 0
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
 
 
 class QState:
     """
     POD class to hold value and measurement basis of a quantum state
     """
+    __slots__ = ('value', 'basis')
+
     def __init__(self, value, basis):
         self.value = value
         self.basis = basis
@@ -16,92 +49,402 @@ class QState:
         return 'Qubit(value={}, basis={})'.format(self.value, self.basis)
 
 
+class QStates:
+    """
+    Columnar container of quantum states. Values and bases are stored in two parallel uint8 arrays. Indexing with an
+    integer returns the state as QState, indexing with a slice, boolean mask or index array returns a QStates object.
+    """
+    __slots__ = ('values', 'bases')
+
+    def __init__(self, values=(), bases=()):
+        self.values = np.asarray(values, dtype=np.uint8)
+        self.bases = np.asarray(bases, dtype=np.uint8)
+
+    @classmethod
+    def from_list(cls, qstates):
+        """
+        Creates the container from a list of QStates.
+        :param qstates: List of QStates
+        :return: QStates object
+        """
+        return cls([q.value for q in qstates], [q.basis for q in qstates])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return QState(int(self.values[idx]), int(self.bases[idx]))
+        return QStates(self.values[idx], self.bases[idx])
+
+    def __iter__(self):
+        for v, b in zip(self.values.tolist(), self.bases.tolist()):
+            yield QState(v, b)
+
+    def __eq__(self, other):
+        if isinstance(other, QStates):
+            return np.array_equal(self.values, other.values) and np.array_equal(self.bases, other.bases)
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return 'QStates(values={}, bases={})'.format(self.values.tolist(), self.bases.tolist())
+
+
 class QChannel:
     """
     Object that handles quantum communication via the a quantum device interface.
+
+    Qubits are processed in batches of batch_size. If the connection supports CQC sequences (set_pending/flush) all
+    commands of a batch are submitted in one go, otherwise the batch is processed qubit by qubit. Connections of the
+    vectorized simulator (see simulation/vectorized.py) handle whole rounds as one batch of qubits instead. They have no
+    limited qubit slots, so credit flow control of EPR-pairs is skipped for them.
+
+    If metrics (see q_network_metrics) are set, the sent and received qubits are counted.
     """
-    def __init__(self, connection, qubit_factory, receiver):
+    def __init__(self, connection, qubit_factory, receiver, batch_size=256):
         self._connection = connection
         self._qubit_factory = qubit_factory
         self._receiver = receiver
+        self.batch_size = batch_size
+        self.metrics = None
+        self._closed = False
+        self.reset()
+
+    def reset(self):
+        """
+        Restores the default bases mapping, so a reused channel behaves like a freshly connected one.
+        """
         self.bases_mapping = [lambda q: None, lambda q: q.H(print_info=False)]
 
+    @property
+    def _supports_sequences(self):
+        return hasattr(self._connection, 'set_pending') and hasattr(self._connection, 'flush')
+
+    @property
+    def _supports_batches(self):
+        return hasattr(self._connection, 'allocate_qubits')
+
+    def _max_chunk_size(self, remaining):
+        return remaining if self._supports_batches else min(self.batch_size, remaining)
+
     def send_qubits(self, qstates):
         """
-        Takes a list of QStates and prepares qubits dependent on value and basis specified in the QStates. It then
-        sends them via the quantum connection to the specified receiver
-        :param qstates: List of QStates
+        Takes QStates and prepares qubits dependent on value and basis specified in the QStates. It then sends them via
+        the quantum connection to the specified receiver
+        :param qstates: QStates object or list of QState
         """
-        for qs in qstates:
+        if not isinstance(qstates, QStates):
+            qstates = QStates.from_list(qstates)
+        self.send_batch(qstates.values, qstates.bases)
+
+    def send_batch(self, values, bases):
+        """
+        Prepares qubits with the given values in the given bases and sends them to the specified receiver.
+        :param values: Integer list or array of qubit values
+        :param bases: Integer list or array of preparation bases
+        """
+        if self._supports_batches:
+            self._send_qubit_batch(np.asarray(values), np.asarray(bases))
+        else:
+            for start in range(0, len(values), self.batch_size):
+                self._in_sequence(self._send_chunk, values[start:start + self.batch_size],
+                                  bases[start:start + self.batch_size])
+        self._count('qubits_sent', len(values))
+
+    def _send_chunk(self, values, bases):
+        for v, b in zip(values, bases):
             q = self._qubit_factory(self._connection)
-            if qs.value == 1:
+            if v == 1:
                 q.X()
 
-            self.bases_mapping[qs.basis](q)
+            self.bases_mapping[b](q)
             self._connection.sendQubit(q, self._receiver)
 
-    def send_epr(self, bases):
+    def _send_qubit_batch(self, values, bases):
+        qubits = self._connection.allocate_qubits(len(values))
+        qubits.select(values == 1).X()
+        self._apply_bases(qubits, bases)
+        self._connection.send_qubits(qubits, self._receiver)
+
+    def _apply_bases(self, qubits, bases):
+        for basis, apply in enumerate(self.bases_mapping):
+            selected = bases == basis
+            if selected.any():
+                apply(qubits.select(selected))
+
+    def _in_sequence(self, process, *args):
+        if not self._supports_sequences:
+            return process(*args)
+
+        self._connection.set_pending(True)
+        try:
+            process(*args)
+        finally:
+            self._connection.set_pending(False)
+        return self._connection.flush()
+
+    def send_epr(self, bases, flow_control=None):
         """
         Takes a list of bases and prepare an EPR-pair. One qubit is sent to the specified receiver and the other is
         measured specified by the basis in the provided list.
         :param bases: Integer list representing measurement bases
-        :return: List of QStates containing the measurement outcome as value and the basis used for measurement
+        :param flow_control: Optional CreditFlowControl limiting the pairs in flight to the credit of the receiver
+        :return: QStates containing the measurement outcome as value and the basis used for measurement
         """
+        return self._to_qstates(self.send_epr_batch(bases, flow_control), bases)
+
+    def send_epr_batch(self, bases, flow_control=None):
+        """
+        Creates an EPR-pair per basis, sends one qubit to the specified receiver and measures the other one in the
+        basis.
+        :param bases: Integer list or array of measurement bases
+        :param flow_control: Optional CreditFlowControl limiting the pairs in flight to the credit of the receiver
+        :return: uint8 array of measurement outcomes
+        """
+        if self._supports_batches:
+            flow_control = None
+
         def from_created_epr_pair(idx):
-            # The recipient needs some time to catch up otherwise the sender runs out of available qubits
-            if idx % 50:
-                time.sleep(0.1)
             return self._connection.createEPR(self._receiver, print_info=False)
 
-        return self._measure_qubits_in_bases(from_created_epr_pair, bases)
+        def from_created_epr_pairs(n):
+            return self._connection.create_epr_pairs(self._receiver, n)
+
+        def credited_chunk_size(start):
+            size = self._max_chunk_size(len(bases) - start)
+            return flow_control.acquire(size) if flow_control else size
+
+        values = self._measure_qubits_in_bases((from_created_epr_pair, from_created_epr_pairs), bases,
+                                               credited_chunk_size)
+        self._count('qubits_sent', len(bases))
+        return values
+
+    def _measure_qubits_in_bases(self, take, bases, chunk_size=None, on_measured=None):
+        # take is a pair of functions, taking a single qubit by index and taking a batch of n qubits
+        take_qubit, take_qubits = take
+        if chunk_size is None:
+            def chunk_size(start):
+                return self._max_chunk_size(len(bases) - start)
+
+        values = np.empty(len(bases), dtype=np.uint8)
+        start = 0
+        while start < len(bases):
+            chunk = bases[start:start + chunk_size(start)]
+            if self._supports_batches:
+                values[start:start + len(chunk)] = self._measure_batch(take_qubits(len(chunk)), np.asarray(chunk))
+            else:
+                outcomes = self._in_sequence(self._measure_chunk, take_qubit, chunk, start)
+                values[start:start + len(chunk)] = self._measurement_outcomes(outcomes)
+            start += len(chunk)
+            if on_measured:
+                on_measured(len(chunk))
+
+        return values
 
-    def _measure_qubits_in_bases(self, take_qubit, bases):
-        qstates = []
+    def _measure_chunk(self, take_qubit, bases, offset):
+        outcomes = []
         for i, b in enumerate(bases):
-            q = take_qubit(i)
+            q = take_qubit(offset + i)
             self.bases_mapping[b](q)
-            qstates.append(QState(q.measure(print_info=False), b))
+            outcomes.append(q.measure(print_info=False))
 
-        return qstates
+        return outcomes
+
+    def _measure_batch(self, qubits, bases):
+        self._apply_bases(qubits, bases)
+        return qubits.measure(print_info=False)
+
+    @staticmethod
+    def _measurement_outcomes(results):
+        # A flushed CQC sequence also returns the qubit objects of allocations, only the integers are outcomes
+        return [r for r in results if isinstance(r, int)]
+
+    @staticmethod
+    def _to_qstates(values, bases):
+        return QStates(values, bases)
 
     def receive_qubits_in(self, bases):
         """
-        Takes a list of bases and measures the retrieved qubits in those bases. Returns a list of QStates containing
+        Takes a list of bases and measures the retrieved qubits in those bases. Returns QStates containing
         measurement outcomes and the used bases.
         :param bases: Integer list representing bases
-        :return: QState list containing the measurement outcome as value and the used basis
+        :return: QStates containing the measurement outcome as value and the used basis
+        """
+        return self._to_qstates(self.receive_batch(bases), bases)
+
+    def receive_batch(self, bases):
+        """
+        Receives a qubit per basis and measures it in that basis.
+        :param bases: Integer list or array of measurement bases
+        :return: uint8 array of measurement outcomes
         """
         def from_received_qubit(idx):
             return self._connection.recvQubit()
 
-        return self._measure_qubits_in_bases(from_received_qubit, bases)
+        def from_received_qubits(n):
+            return self._connection.receive_qubits(n)
 
-    def receive_epr_in(self, bases):
+        values = self._measure_qubits_in_bases((from_received_qubit, from_received_qubits), bases)
+        self._count('qubits_received', len(bases))
+        return values
+
+    def receive_epr_in(self, bases, flow_control=None):
         """
-        Takes a list of bases and measures the retrieved entangled qubits in those bases. Returns a list of QStates
+        Takes a list of bases and measures the retrieved entangled qubits in those bases. Returns QStates
         containing measurement outcomes and the used bases.
         :param bases: Integer list representing bases
-        :return: QState list containing the measurement outcome as value and the used basis
+        :param flow_control: Optional CreditFlowControl used to grant the sender credit for free qubit slots
+        :return: QStates containing the measurement outcome as value and the used basis
+        """
+        return self._to_qstates(self.receive_epr_batch(bases, flow_control), bases)
+
+    def receive_epr_batch(self, bases, flow_control=None):
+        """
+        Receives the qubit of an EPR-pair per basis and measures it in that basis.
+        :param bases: Integer list or array of measurement bases
+        :param flow_control: Optional CreditFlowControl used to grant the sender credit for free qubit slots
+        :return: uint8 array of measurement outcomes
         """
         def from_received_epr(idx):
             return self._connection.recvEPR(print_info=False)
 
-        return self._measure_qubits_in_bases(from_received_epr, bases)
+        def from_received_eprs(n):
+            return self._connection.receive_epr_pairs(n)
+
+        take = (from_received_epr, from_received_eprs)
+        if flow_control is None or self._supports_batches:
+            values = self._measure_qubits_in_bases(take, bases)
+        else:
+            def granted_chunk_size(start):
+                return min(flow_control.chunk_size, self._max_chunk_size(len(bases) - start))
+
+            flow_control.open(len(bases))
+            values = self._measure_qubits_in_bases(take, bases, granted_chunk_size, flow_control.release)
+
+        self._count('qubits_received', len(bases))
+        return values
+
+    def _count(self, counter, amount):
+        if self.metrics is not None:
+            self.metrics.count(counter, amount)
+
+    def is_alive(self):
+        """
+        Liveness probe used by the connection pool before handing out an idle channel.
+        :return: True if the channel is open and its connection is alive
+        """
+        return not self._closed and connection_is_alive(self._connection)
 
     def close(self):
         """
         Closes the quantum connection.
         """
+        self._closed = True
         self._connection.close()
 
+    def discard(self):
+        """
+        Closes the quantum connection after an error, so the channel is never reused.
+        """
+        self.close()
+
+
+class CreditFlowControl:
+    """
+    Credit based flow control of qubits in flight, exchanged via the classical channel. The receiver advertises how
+    many qubits it can take (its free qubit slots, at most window) and grants more credit while it drains received
+    qubits. The sender only transmits qubits it holds credit for, so it proceeds at the rate the receiver drains.
+    """
+    def __init__(self, ca_channel, window=50):
+        self.ca_channel = ca_channel
+        self.window = window
+        self._credits = 0
+        self._in_flight = 0
+        self._ungranted = 0
+
+    @property
+    def chunk_size(self):
+        """
+        Number of qubits the receiver drains before granting new credit.
+        """
+        return max(1, self.window // 2)
+
+    def acquire(self, amount):
+        """
+        Sender side: Takes credit for up to amount qubits, waiting for a grant of the receiver if no credit is left.
+        :param amount: Number of qubits the sender wants to transmit
+        :return: Number of qubits the sender may transmit now
+        """
+        while self._credits == 0:
+            self._credits = self.ca_channel.receive()[0]
+
+        granted = min(amount, self._credits)
+        self._credits -= granted
+        return granted
+
+    def open(self, amount):
+        """
+        Receiver side: Starts the reception of amount qubits by granting the initial credit.
+        :param amount: Total number of qubits that will be received
+        """
+        self._ungranted = amount
+        self._in_flight = 0
+        self._grant()
+
+    def release(self, amount):
+        """
+        Receiver side: Frees the slots of amount drained qubits and grants credit for them.
+        :param amount: Number of qubits that have been received and measured
+        """
+        self._in_flight -= amount
+        self._grant()
+
+    def _grant(self):
+        credits = min(self.window - self._in_flight, self._ungranted)
+        if credits > 0:
+            self.ca_channel.send(credits)
+            self._in_flight += credits
+            self._ungranted -= credits
+
 
 class CAChannel:
     """
     An object that handled classical authenticated communication used in quantum key distribution.
+
+    Bit vectors and index lists can be sent in a compact wire format (see q_network_wire). Which format is used is
+    agreed on with the other end via negotiate_format(), until then the legacy format of plain integer lists is used.
+
+    is_new is True for a connection used the first time. Channels handed out again by a ConnectionPool are wrapped in a
+    PooledChannel whose is_new is False, they keep the agreed format and key pools need not be compared again.
+
+    If metrics (see q_network_metrics) are set, the sent and received messages and their size in list values (bytes in
+    the compact format) are counted.
     """
     def __init__(self, connection, other):
         self._connection = connection
         self._other = other
+        self.format_version = LEGACY_FORMAT
+        self.is_new = True
+        self.metrics = None
+        self._closed = False
+
+    @property
+    def other(self):
+        """
+        Unique identifier of the other end.
+        """
+        return self._other
+
+    def negotiate_format(self, version=FORMAT_VERSION):
+        """
+        Agrees on the wire format with the other end, which has to call negotiate_format at the same time. Both ends
+        use the highest version supported by both of them.
+        :param version: Highest wire format version supported by this end
+        :return: The agreed format version
+        """
+        self.send([version])
+        self.format_version = min(version, self.receive()[0])
+        return self.format_version
 
     def send(self, data):
         """
@@ -111,12 +454,56 @@ class CAChannel:
         if not isinstance(data, list):
             data = [data]
         self._connection.sendValueList(self._other, data)
+        self._count('sent', data)
+
+    def send_bits(self, values):
+        """
+        Sends a vector of bits (or other small non-negative integers like bases), bit-packed in the agreed format.
+        :param values: Integer list or array of values
+        """
+        if self.format_version == LEGACY_FORMAT:
+            self.send(np.asarray(values).tolist())
+        else:
+            self.send(encode_bits(values))
+
+    def send_indices(self, indices):
+        """
+        Sends a sorted list of indices, delta and varint coded in the agreed format.
+        :param indices: Sorted integer list or array of indices
+        """
+        if self.format_version == LEGACY_FORMAT:
+            self.send(np.asarray(indices).tolist())
+        else:
+            self.send(encode_indices(indices))
+
+    def send_integers(self, values):
+        """
+        Sends a list of non-negative integers, varint coded in the agreed format.
+        :param values: Integer list or array of non-negative integers
+        """
+        if self.format_version == LEGACY_FORMAT:
+            self.send(np.asarray(values).tolist())
+        else:
+            self.send(encode_varints(values))
+
+    def send_bytes(self, data):
+        """
+        Sends a bytes-like object (i.e.: a ciphertext frame). In the packed format it is handed to the connection as
+        bytes instead of a list of one integer per byte.
+        :param data: bytes-like object
+        """
+        data = bytes(data)
+        if self.format_version == LEGACY_FORMAT:
+            data = list(data)
+        self._connection.sendValueList(self._other, data)
+        self._count('sent', data)
 
     def send_ack(self):
         """
         Sends an acknowledgment signal
         """
         self._connection.sendAck(self._other)
+        self._count('sent', ())
 
     def receive(self):
         """
@@ -124,13 +511,51 @@ class CAChannel:
         :return: Integer list containing binary representation of the data received
         """
         data = self._connection.getValueList(self._other)
+        self._count('received', data)
         return data
 
+    def receive_bits(self):
+        """
+        Receives a vector of bits sent via send_bits.
+        :return: Integer list of values
+        """
+        data = self.receive()
+        return data if self.format_version == LEGACY_FORMAT else decode_bits(data)
+
+    def receive_indices(self):
+        """
+        Receives a list of indices sent via send_indices.
+        :return: Integer list of indices
+        """
+        data = self.receive()
+        return data if self.format_version == LEGACY_FORMAT else decode_indices(data)
+
+    def receive_integers(self):
+        """
+        Receives a list of integers sent via send_integers.
+        :return: Integer list
+        """
+        data = self.receive()
+        return data if self.format_version == LEGACY_FORMAT else decode_varints(data).tolist()
+
+    def receive_bytes(self):
+        """
+        Receives data sent via send_bytes.
+        :return: bytes of the data
+        """
+        return bytes(self.receive())
+
     def receive_ack(self):
         """
         Receives an acknowledgement signal.
         """
         self._connection.getAck(self._other)
+        self._count('received', ())
+
+    def _count(self, direction, data):
+        if self.metrics is not None:
+            self.metrics.count('messages_' + direction)
+            self.metrics.count('bytes_' + direction, len(data))
 
     def clear(self):
         """
@@ -138,8 +563,30 @@ class CAChannel:
         """
         self._connection.clearServer()
 
+    def release(self):
+        """
+        Releases the channel after a secure channel context. The classical server is kept open, because the other end
+        may still be receiving the acknowledgement. Pooled channels are returned to their pool instead.
+        """
+        pass
+
+    def is_alive(self):
+        """
+        Liveness probe used by the connection pool before handing out an idle channel.
+        :return: True if the channel is open and its connection is alive
+        """
+        return not self._closed and connection_is_alive(self._connection)
+
     def close(self):
         """
         Closes the classical server.
         """
+        self._closed = True
         self._connection.closeChannel()
+
+    def discard(self):
+        """
+        Closes the classical server after an error. Unread messages of the failed context would otherwise be received
+        by the next user of the channel.
+        """
+        self.close()
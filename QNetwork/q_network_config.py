@@ -1,41 +1,163 @@
-import io
-import json
-
 from QNetwork.qkd.bb84_qkd import BB84ReceiverNode, BB84SenderNode
 from QNetwork.qkd.diqkd import DIQKDSenderNode, DIQKDReceiverNode
+from QNetwork.qkd.key_length import FiniteKeyEstimator
+from QNetwork.qkd.privacy_amplification import EXTRACTOR_CLASSES
+from QNetwork.qkd.randomness import RANDOM_SOURCE_CLASSES, SeededRandomSource
+from QNetwork.qkd.reconciliation import RECONCILER_CLASSES
+from QNetwork.qkd.round_size import get_round_size_policy
 from QNetwork.q_network_channels import QChannel, CAChannel
-from SimulaQron.cqc.pythonLib.cqc import CQCConnection, qubit
-from tinyIpcLib.ipcCacClient import ipcCacClient
+from QNetwork.q_network_key_pool import get_key_pool
+from QNetwork.q_network_key_store import get_key_store
+from QNetwork.q_network_metrics import get_metrics
+from QNetwork.q_network_pool import get_connection_pool
+from QNetwork.q_network_settings import NetworkConfig, load_config
+from QNetwork.simulation.local import LocalQubit
+from QNetwork.simulation.vectorized import get_local_network
 
+BACKENDS = ('SimulaQron', 'Local')
 SENDER_CLASSES = {'BB84': BB84SenderNode, 'DIQKD': DIQKDSenderNode}
 RECEIVER_CLASSES = {'BB84': BB84ReceiverNode, 'DIQKD': DIQKDReceiverNode}
 
 
+def _is_alive(channel):
+    return channel.is_alive()
+
+
 class NetworkFactory:
-    def __init__(self, config_file):
-        with io.open(config_file, 'r') as f:
-            config = json.load(f)
-            self.protocol = config['Protocol']
-            self.error = config['Error']
-            self.n = config['StateSize']
-            self.maximize_key_bits = config['MaximizeKeyBits']
-
-    @staticmethod
-    def make_q_channel(from_name, to_name):
-        connection = CQCConnection(from_name)
-        return QChannel(connection, qubit, to_name)
-
-    @staticmethod
-    def make_ca_channel(from_name, to_name):
+    def __init__(self, config):
+        """
+        :param config: NetworkConfig object or path of a configuration file (see q_network.cfg)
+        """
+        if not isinstance(config, NetworkConfig):
+            config = load_config(config)
+
+        self.config = config
+        self.error = config.error
+        self.n = config.state_size
+        self.maximize_key_bits = config.maximize_key_bits
+        self.key_pool_size = config.key_pool_size
+        self.qubit_window = config.qubit_window
+        self.pipeline_depth = config.pipeline_depth
+        self.min_state_size = config.min_state_size
+        self.max_state_size = config.max_state_size
+        self.sender_class = SENDER_CLASSES[config.protocol]
+        self.receiver_class = RECEIVER_CLASSES[config.protocol]
+        self.extractor_class = EXTRACTOR_CLASSES[config.privacy_amplification]
+        self.random_source_class = RANDOM_SOURCE_CLASSES[config.random_source]
+        self.random_seed = config.random_seed
+        self.security_parameter = config.security_parameter
+        self.reconciler_class = None if config.reconciliation is None else RECONCILER_CLASSES[config.reconciliation]
+        self.connection_pool = None
+        if config.pool_connections:
+            self.connection_pool = get_connection_pool(config.max_idle_time, is_healthy=_is_alive)
+        self.metrics = get_metrics() if config.collect_metrics else None
+        self.key_store_directory = config.key_store_directory
+        if config.backend not in BACKENDS:
+            raise ValueError("Unknown backend {}, expected one of {}.".format(config.backend, BACKENDS))
+        self.backend = config.backend
+        self.noise = config.noise
+        self.loss = config.loss
+        if self.security_parameter is not None and self.maximize_key_bits:
+            self._check_key_length()
+
+    def _check_key_length(self):
+        # Without any key from the largest round, writing to a SecureChannel would run rounds forever
+        n = self.n if self.max_state_size is None else self.max_state_size
+        if self.sender_class.max_key_length(n, FiniteKeyEstimator(self.security_parameter)) == 0:
+            raise ValueError("No key can be extracted from rounds of {} states with SecurityParameter {}, increase "
+                             "StateSize or MaxStateSize.".format(n, self.security_parameter))
+
+    def make_q_channel(self, from_name, to_name):
+        if self.connection_pool is None:
+            channel = self._connect_q_channel(from_name, to_name)
+        else:
+            channel = self.connection_pool.acquire(('quantum', from_name, to_name),
+                                                   lambda: self._connect_q_channel(from_name, to_name))
+            channel.reset()
+        channel.metrics = self.metrics
+        return channel
+
+    def make_ca_channel(self, from_name, to_name):
+        if self.connection_pool is None:
+            channel = self._connect_ca_channel(from_name, to_name)
+        else:
+            channel = self.connection_pool.acquire(('classical', from_name, to_name),
+                                                   lambda: self._connect_ca_channel(from_name, to_name))
+        channel.metrics = self.metrics
+        if channel.is_new:
+            # Reused channels keep the format agreed on when they were connected
+            channel.negotiate_format()
+        return channel
+
+    def _connect_q_channel(self, from_name, to_name):
+        if self.backend == 'Local':
+            return QChannel(self._local_network().cqc_connection(from_name), LocalQubit, to_name)
+
+        from SimulaQron.cqc.pythonLib.cqc import CQCConnection, qubit
+        return QChannel(CQCConnection(from_name), qubit, to_name)
+
+    def _connect_ca_channel(self, from_name, to_name):
+        if self.backend == 'Local':
+            return CAChannel(self._local_network().cac_client(from_name), to_name)
+
+        from tinyIpcLib.ipcCacClient import ipcCacClient
         return CAChannel(ipcCacClient(from_name), to_name)
-        pass
+
+    def _local_network(self):
+        # Both ends have to run in this process to be connected by the in-process network
+        return get_local_network(self.random_seed, self.noise, self.loss)
+
+    def _network_id(self):
+        if self.backend == 'Local':
+            return self.backend, self.random_seed, self.noise, self.loss
+        return self.backend
+
+    def get_key_pool(self, local, writer, reader):
+        """
+        Returns local's key pool of the direction, persisted in a key store if KeyStoreDirectory is configured.
+        """
+        if self.key_store_directory is None:
+            pool = get_key_pool(local, writer, reader, self._network_id())
+        else:
+            pool = get_key_store(self.key_store_directory, local, writer, reader)
+        pool.high_water_mark = self.key_pool_size
+        return pool
+
+    def get_round_size_policy(self, writer, reader):
+        """
+        Returns the round size policy of the direction if MinStateSize or MaxStateSize is configured (the missing bound
+        defaults to StateSize) and key bits are maximized. Otherwise every round uses StateSize states.
+        """
+        if (self.min_state_size is None and self.max_state_size is None) or not self.maximize_key_bits:
+            return None
+
+        policy = get_round_size_policy(writer, reader)
+        policy.min_size = self.n if self.min_state_size is None else self.min_state_size
+        policy.max_size = self.n if self.max_state_size is None else self.max_state_size
+        return policy
 
     def make_sender_node(self, q_channel, ca_channel):
-        node = SENDER_CLASSES[self.protocol](q_channel, ca_channel, self.error, self.n)
-        node.maximize_key_bits = self.maximize_key_bits
+        node = self.sender_class(q_channel, ca_channel, self.error, self.n)
+        self._configure_node(node)
         return node
 
     def make_receiver_node(self, q_channel, ca_channel):
-        node = RECEIVER_CLASSES[self.protocol](q_channel, ca_channel, self.error)
-        node.maximize_key_bits = self.maximize_key_bits
+        node = self.receiver_class(q_channel, ca_channel, self.error)
+        self._configure_node(node)
+        if hasattr(node, 'qubit_window'):
+            node.qubit_window = self.qubit_window
         return node
+
+    def _configure_node(self, node):
+        node.maximize_key_bits = self.maximize_key_bits
+        node.extractor = self.extractor_class()
+        node.random_source = self._make_random_source()
+        node.reconciler = None if self.reconciler_class is None else self.reconciler_class()
+        node.metrics = self.metrics
+        if self.security_parameter is not None:
+            node.key_length_estimator = FiniteKeyEstimator(self.security_parameter)
+
+    def _make_random_source(self):
+        if self.random_source_class is SeededRandomSource:
+            return SeededRandomSource(self.random_seed)
+        return self.random_source_class()
@@ -1,7 +1,13 @@
-from functools import reduce
+import collections
+
+from QNetwork.q_network_wire import encode_varints, read_varint
+from QNetwork.qkd.pipeline import RoundPipeline
 
 START_KEY_GENERATION_TAG = "SKey"
 END_KEY_GENERATION_TAG = "EKey"
+END_STREAM_TAG = "EStr"
+
+FRAME_SIZE = 1024
 
 IDLE = 0
 WRITING = 1
@@ -9,87 +15,346 @@ READING = 2
 
 
 class SecureChannel:
-    def __init__(self, from_name, to_name):
+    def __init__(self, from_name, to_name, session=False):
+        """
+        :param from_name: Unique identifier of this node
+        :param to_name: Unique identifier of the other node
+        :param session: If True, messages written are buffered and sent together, length-prefixed in one encrypted
+            frame, when the channel reads, flushes or exits. Both ends have to use the same mode
+        """
         self.from_name = from_name
         self.to_name = to_name
+        self.session = session
         self.network_factory = None
         self.q_channel = None
         self.ca_channel = None
 
         self._state = IDLE
+        self._outbox = []
+        self._inbox = collections.deque()
+
+    @property
+    def metrics(self):
+        """
+        Metrics collected by the channel's nodes and channels (None unless CollectMetrics is set).
+        """
+        return self.network_factory.metrics
+
+    @property
+    def state(self):
+        """
+        IDLE, WRITING or READING, depending on what the channel did last in the current context. It decides how the
+        context is closed: a writing end waits for the acknowledgement of the reading end.
+        """
+        return self._state
+
+    def start_writing(self):
+        self._state = WRITING
+
+    def start_reading(self):
+        self._state = READING
 
     def __enter__(self):
         self.q_channel = self.network_factory.make_q_channel(self.from_name, self.to_name)
         self.ca_channel = self.network_factory.make_ca_channel(self.from_name, self.to_name)
+        self._writer_pool = self.network_factory.get_key_pool(self.from_name, self.from_name, self.to_name)
+        self._reader_pool = self.network_factory.get_key_pool(self.from_name, self.to_name, self.from_name)
+        self._round_size = self.network_factory.get_round_size_policy(self.from_name, self.to_name)
+        self._synchronize_key_pools()
         return self
 
+    def _synchronize_key_pools(self):
+        # Pools kept from earlier contexts may differ, i.e.: if one end discarded its key after an error. Such an end
+        # discards its channels as well, so the cursors are only compared over new channels or if a pool moved since
+        # both ends last agreed. The other end's reader pool holds the key of this end's writer pool and vice versa
+        if not self.ca_channel.is_new and self._writer_pool.is_synchronized and self._reader_pool.is_synchronized:
+            return
+
+        self.ca_channel.send_integers(self._writer_pool.position + self._reader_pool.position)
+        other = self.ca_channel.receive_integers()
+        self._writer_pool.synchronize(*other[2:4])
+        self._reader_pool.synchronize(*other[0:2])
+
+    async def __aenter__(self):
+        # The asyncio variant builds on this module
+        from QNetwork.q_network_async import AsyncSecureChannel
+        self._async_channel = AsyncSecureChannel(self)
+        return await self._async_channel.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._async_channel.__aexit__(exc_type, exc_val, exc_tb)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is None:
-            if self._state is WRITING:
-                self.ca_channel.receive_ack()
-                self.ca_channel.clear()
-            elif self._state is READING:
-                self.ca_channel.send_ack()
-            else:
-                self.ca_channel.clear()
+        if exc_type is not None:
+            self._discard_context()
+            return
 
+        self.flush()
+        if self._state is WRITING:
+            self.ca_channel.receive_ack()
+            self.ca_channel.clear()
+        elif self._state is READING:
+            self.ca_channel.send_ack()
         else:
             self.ca_channel.clear()
+        self.release_channels()
+
+    def _discard_context(self):
+        self._outbox.clear()
+        self._writer_pool.clear()
+        self._reader_pool.clear()
+        self.ca_channel.clear()
+        # The channels may hold unread messages or qubits of the failed context, so they are not reused
+        self.q_channel.discard()
+        self.ca_channel.discard()
 
+    def release_channels(self):
+        """
+        Releases the channels after both ends completed the context (exchanged the final acknowledgement).
+        """
+        # Both ends completed the context, so their pools agree
+        self._writer_pool.mark_synchronized()
+        self._reader_pool.mark_synchronized()
         self.q_channel.close()
+        self.ca_channel.release()
 
     def write(self, data):
-        self._state = WRITING
-        msg = self.to_binary_list(data)
-        key = self.create_key(msg)
-        enc_msg = [(m + k) % 2 for m, k in zip(msg, key)]
-        self.ca_channel.send(enc_msg)
+        self.start_writing()
+        if self.session:
+            self._outbox.append(self.to_bytes(data))
+        else:
+            self._write_frame(self.to_bytes(data))
+
+    def flush(self):
+        """
+        Sends the messages buffered in session mode as one frame, each message prefixed with its length (varint).
+        """
+        frame = self.take_session_frame()
+        if frame is not None:
+            self._write_frame(frame)
+
+    def take_session_frame(self):
+        """
+        Takes the messages buffered in session mode as one frame to be sent (see flush).
+        :return: bytes of the frame, None if no messages are buffered
+        """
+        if not self._outbox:
+            return None
+
+        frame = b''.join(bytes(encode_varints([len(m)])) + m for m in self._outbox)
+        self._outbox.clear()
+        return frame
+
+    def write_stream(self, source, frame_size=FRAME_SIZE):
+        """
+        Sends data from source as a stream of encrypted frames. Key is generated frame by frame, so each frame is sent
+        as soon as its key is available and only a single frame is held in memory.
+        :param source: bytes-like object, string, file-like object (with a read method) or iterable of bytes chunks
+        :param frame_size: Maximum number of bytes encrypted and sent in one frame
+        """
+        self.flush()
+        self.start_writing()
+        for frame in self.frames_of(source, frame_size):
+            self._write_frame(frame)
+
+        self._send_tag(END_STREAM_TAG)
+
+    def _write_frame(self, frame):
+        self.ca_channel.send_bytes(self.encrypt_frame(frame))
+
+    def encrypt_frame(self, frame):
+        """
+        Encrypts a frame with key of the writer pool, generating more key with the other end first if the pool holds
+        too little. The other end reads the frame via read_frame (or read_message).
+        :param frame: bytes-like object
+        :return: bytes of the encrypted frame, to be sent via the classical channel (see CAChannel.send_bytes)
+        """
+        self._provide_key(len(frame))
+        return self._writer_pool.pad(frame)
 
     @staticmethod
-    def to_binary_list(data):
-        msg = []
-        for c in data:
-            binary_str = format(ord(c), 'b').rjust(8, '0')
-            for b in binary_str:
-                msg.append(int(b))
-        return msg
-
-    def create_key(self, msg):
-        node = self.network_factory.make_sender_node(self.q_channel, self.ca_channel)
-        key = []
-        while len(key) < len(msg):
-            self.ca_channel.send(self.to_binary_list(START_KEY_GENERATION_TAG))
-            key += node.try_generate_key()
-
-        self.ca_channel.send(self.to_binary_list(END_KEY_GENERATION_TAG))
-        return key
+    def to_bytes(data):
+        if isinstance(data, str):
+            return data.encode('latin-1')
+        return bytes(data)
+
+    @staticmethod
+    def frames_of(source, frame_size):
+        """
+        Splits source into frames of at most frame_size bytes (see write_stream).
+        :return: Generator of bytes-like frames
+        """
+        if isinstance(source, (str, bytes, bytearray, memoryview)):
+            data = memoryview(SecureChannel.to_bytes(source))
+            for i in range(0, len(data), frame_size):
+                yield data[i:i + frame_size]
+        elif hasattr(source, 'read'):
+            frame = source.read(frame_size)
+            while frame:
+                yield frame
+                frame = source.read(frame_size)
+        else:
+            buffer = bytearray()
+            for chunk in source:
+                buffer += chunk
+                while len(buffer) >= frame_size:
+                    yield bytes(buffer[:frame_size])
+                    del buffer[:frame_size]
+            if buffer:
+                yield bytes(buffer)
+
+    def create_key(self, size):
+        self._provide_key(size)
+        return self._writer_pool.take_bytes(size)
+
+    def _provide_key(self, size):
+        if self._writer_pool.byte_length < size:
+            self._fill_writer_pool(size)
+        else:
+            self._send_tag(END_KEY_GENERATION_TAG)
+
+    def fill_key_pool(self, size=0):
+        """
+        Generates key ahead of demand until the pool of this direction reaches its high water mark. The other end has
+        to call sync_key_pool() at the same point to take part in the key generation.
+        :param size: Number of bytes demanded on top of the high water mark
+        """
+        self.flush()
+        self.start_writing()
+        self._fill_writer_pool(size)
+
+    def _fill_writer_pool(self, size):
+        if self._is_pipelined():
+            self._send_tag(START_KEY_GENERATION_TAG)
+            nodes = collections.deque()
+
+            def make_node(q_channel, ca_channel):
+                nodes.append(self._size_round(self.network_factory.make_sender_node(q_channel, ca_channel), size))
+                return nodes[-1]
+
+            def on_key(key):
+                self._observe_round(nodes.popleft(), key)
+                self._writer_pool.extend(key)
+
+            self._make_pipeline(make_node).run_sender(lambda: self._writer_pool.is_below_high_water_mark(size), on_key)
+        else:
+            node = self.network_factory.make_sender_node(self.q_channel, self.ca_channel)
+            while self._writer_pool.is_below_high_water_mark(size):
+                self._send_tag(START_KEY_GENERATION_TAG)
+                key = self._size_round(node, size).try_generate_key()
+                self._observe_round(node, key)
+                self._writer_pool.extend(key)
+
+        self._send_tag(END_KEY_GENERATION_TAG)
+
+    def _size_round(self, node, size):
+        if self._round_size is not None:
+            node.n = self._round_size.next_size(self._writer_pool.missing_bits(size))
+        return node
+
+    def _observe_round(self, node, key):
+        if self._round_size is not None:
+            self._round_size.observe(node.n, len(key), node.error_rate)
+
+    def _is_pipelined(self):
+        return self.network_factory.pipeline_depth > 1
+
+    def _make_pipeline(self, make_node):
+        return RoundPipeline(self.ca_channel, lambda ca_channel: make_node(self.q_channel, ca_channel),
+                             self.network_factory.pipeline_depth)
+
+    def _send_tag(self, tag):
+        self.ca_channel.send_bytes(self.to_bytes(tag))
 
     def read(self):
-        self._state = READING
-        key = self.get_key()
-        enc_msg = self.ca_channel.receive()
+        return self.to_string(self.read_bytes())
 
-        assert len(key) >= len(enc_msg), "Not enough key ({0}) to decode message of length {1}"\
-            .format(len(key), len(enc_msg))
+    def read_bytes(self):
+        if self.awaits_frame():
+            self.flush()
+            return self.read_message(self._receive_tag())
+        return self.read_message()
 
-        msg = [(m + k) % 2 for m, k in zip(enc_msg, key)]
-        return self.to_string(msg)
+    def awaits_frame(self):
+        """
+        :return: True if the next message has to be received from the other end, False if it is buffered (session mode)
+        """
+        return not self.session or not self._inbox
+
+    def read_message(self, tag=None):
+        """
+        Reads the next message, decrypting a new frame unless messages are buffered (see awaits_frame).
+        :param tag: Tag received before the frame, only needed if awaits_frame() is True
+        :return: bytes of the message
+        """
+        self.start_reading()
+        if not self.session:
+            return self.read_frame(tag)
+
+        if not self._inbox:
+            self._inbox.extend(self._messages_of(self.read_frame(tag)))
+        return self._inbox.popleft()
+
+    @staticmethod
+    def _messages_of(frame):
+        messages = []
+        pos = 0
+        while pos < len(frame):
+            length, pos = read_varint(frame, pos)
+            messages.append(frame[pos:pos + length])
+            pos += length
+        return messages
+
+    def read_stream(self):
+        """
+        Receives a stream of encrypted frames sent via write_stream and yields them decrypted one by one.
+        :return: Generator of decrypted bytes frames
+        """
+        self.flush()
+        self.start_reading()
+        tag = self._receive_tag()
+        while tag != END_STREAM_TAG:
+            yield self.read_frame(tag)
+            tag = self._receive_tag()
+
+    def read_frame(self, tag):
+        """
+        Receives and decrypts a frame written via encrypt_frame, taking part in the key generation announced by tag.
+        :param tag: Tag received before the frame
+        :return: bytes of the decrypted frame
+        """
+        return self._decrypt_frame(self.get_key(tag), self.ca_channel.receive_bytes())
+
+    @staticmethod
+    def _decrypt_frame(key, enc_msg):
+        assert key.byte_length >= len(enc_msg), "Not enough key ({0}) to decode message of length {1}"\
+            .format(len(key), len(enc_msg) * 8)
+
+        return key.pad(enc_msg)
+
+    def sync_key_pool(self):
+        """
+        Takes part in the key generation started by fill_key_pool() on the other end.
+        """
+        self.flush()
+        self.start_reading()
+        self.get_key(self._receive_tag())
+
+    def get_key(self, tag):
+        if tag == START_KEY_GENERATION_TAG and self._is_pipelined():
+            self._make_pipeline(self.network_factory.make_receiver_node).run_receiver(self._reader_pool.extend)
+            tag = self._receive_tag()
 
-    def get_key(self):
         node = self.network_factory.make_receiver_node(self.q_channel, self.ca_channel)
-        key = []
-        tag = self.to_string(self.ca_channel.receive())
         while tag == START_KEY_GENERATION_TAG:
-            key += node.try_generate_key()
-            tag = self.to_string(self.ca_channel.receive())
+            self._reader_pool.extend(node.try_generate_key())
+            tag = self._receive_tag()
         assert tag == END_KEY_GENERATION_TAG, "Expected tag {}, but got {}".format(END_KEY_GENERATION_TAG, tag)
-        return key
+        return self._reader_pool
 
-    @staticmethod
-    def to_string(integer_array):
-        msg = ''
-        for i in range(0, len(integer_array), 8):
-            o = int(reduce(lambda s, i: s + str(i), (integer_array[i:i+8]), ''), 2)
-            msg += chr(o)
+    def _receive_tag(self):
+        return self.to_string(self.ca_channel.receive_bytes())
 
-        return msg
\ No newline at end of file
+    @staticmethod
+    def to_string(data):
+        return data.decode('latin-1')
@@ -0,0 +1,113 @@
+import numpy as np
+
+from QNetwork.q_network_bits import BitBuffer
+
+_key_pools = {}
+
+
+class KeyPool(BitBuffer):
+    """
+    Stock of shared key for one direction (writer to reader) between two nodes. Key which is not consumed by a message
+    stays in the pool and is used for the following messages. When key has to be generated the pool is filled up to
+    the configured high water mark (in bits) on top of the demand, so subsequent messages can be served from stock.
+
+    The pool counts the bits ever written to it and the bytes ever taken from it, so the two ends of a direction can
+    compare their cursors and synchronize (see synchronize).
+    """
+    def __init__(self, high_water_mark=0):
+        super().__init__()
+        self.high_water_mark = high_water_mark
+        self._consumed = 0
+        self._written = 0
+        self._synchronized_position = None
+
+    @property
+    def is_synchronized(self):
+        """
+        True if the cursors did not move since they were last known to agree with the other end's cursors.
+        """
+        return self.position == self._synchronized_position
+
+    def mark_synchronized(self):
+        """
+        Records that the cursors agree with the other end's cursors, i.e.: after both ends completed a context.
+        """
+        self._synchronized_position = self.position
+
+    @property
+    def position(self):
+        """
+        Tuple of the consumption cursor (bytes) and the write cursor (bits).
+        """
+        return self._consumed, self._written
+
+    def extend(self, bits):
+        bits = np.asarray(bits, dtype=np.uint8)
+        super().extend(bits)
+        self._written += len(bits)
+
+    def take_bytes(self, size):
+        taken = super().take_bytes(size)
+        self._consumed += size
+        return taken
+
+    def is_below_high_water_mark(self, size=0):
+        """
+        Checks if the pool holds less than size bytes plus the high water mark.
+        :param size: Number of bytes demanded on top of the high water mark
+        :return: True if more key should be generated, False otherwise
+        """
+        return self.missing_bits(size) > 0
+
+    def missing_bits(self, size=0):
+        """
+        :param size: Number of bytes demanded on top of the high water mark
+        :return: Number of key bits needed to reach size bytes plus the high water mark
+        """
+        return max(0, size * 8 + self.high_water_mark - len(self))
+
+    def synchronize(self, consumed, written):
+        """
+        Aligns the cursors with the ones of the other end of the direction: key consumed by either end is skipped and
+        key written by only one end (i.e.: if the other end stopped before storing a round) is dropped.
+        :param consumed: Consumption cursor (bytes) of the other end
+        :param written: Write cursor (bits) of the other end
+        """
+        new_consumed = max(self._consumed, consumed)
+        new_written = max(min(self._written, written), new_consumed * 8)
+        del self._bytes[:new_consumed - self._consumed]
+        kept = new_written - new_consumed * 8
+        full, rest = divmod(kept, 8)
+        if full < len(self._bytes):
+            # Only the byte cut by the write cursor is unpacked, its leading bits become the pending bits
+            cut = np.frombuffer(bytes(self._bytes[full:full + 1]), dtype=np.uint8)
+            self._pending = np.unpackbits(cut, count=rest)
+            del self._bytes[full:]
+        else:
+            self._pending = self._pending[:kept - len(self._bytes) * 8]
+        self._consumed, self._written = new_consumed, new_written
+        self.mark_synchronized()
+
+    def clear(self):
+        """
+        Discards all key in the pool. Used when both ends can not be sure anymore to hold the same key, the other end
+        discards it as well when the ends synchronize.
+        """
+        BitBuffer.__init__(self)
+        self._consumed = -(-self._written // 8)
+        self._written = self._consumed * 8
+
+
+def get_key_pool(local, writer, reader, network=None):
+    """
+    Returns the key pool of the direction from writer to reader held by the node local. Pools live as long as the
+    process, so key generated in one open_channel context can be used by the next one. Both ends of a direction have
+    their own pool, also when they run in the same process.
+    :param local: Unique identifier of the node holding the pool
+    :param writer: Unique identifier of the node encrypting with the key
+    :param reader: Unique identifier of the node decrypting with the key
+    :param network: Hashable identifier of the network the key was distributed over (see NetworkFactory). Key is only
+        shared with the other end over the same network, so every network has its own pools
+    :return: KeyPool object
+    """
+    return _key_pools.setdefault((network, local, writer, reader), KeyPool())
@@ -0,0 +1,449 @@
+"""
+Key delivery service running QKD continuously between two nodes and serving the shared key as blocks with IDs to local
+applications over HTTP, in the style of a key management API (ETSI GS QKD 014):
+
+    GET /api/v1/keys/<peer>/status
+    GET /api/v1/keys/<peer>/enc_keys?number=<blocks>&size=<bits>
+    GET /api/v1/keys/<peer>/dec_keys?key_ID=<id>[&key_ID=<id>...]
+
+The service of the key generating end (master) hands out new key blocks via enc_keys. The application on the other end
+fetches the same blocks from its own service via dec_keys with the IDs it received from its peer application. Many
+client processes share the quantum and classical connections of the service.
+
+Key IDs are random UUIDs, which the master announces to the other end over the secure channel, so they reveal nothing
+about the position of a block in the key stream and cannot be guessed. The HTTP API itself does not authenticate its
+clients though: whoever can reach a service and learns a key ID (i.e.: by observing the applications exchanging it) can
+fetch the block before the legitimate client does. Bind the services to a host only trusted applications can reach.
+
+    $ python -m QNetwork.q_network_key_service --local Alice --peer Bob --master --port 8001
+    $ python -m QNetwork.q_network_key_service --local Bob --peer Alice --port 8002
+"""
+import argparse
+import base64
+import json
+import socketserver
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from QNetwork.q_network_wire import encode_varints, read_varint
+
+CONTINUE_TAG = b'\x01'
+STOP_TAG = b'\x00'
+KEY_IDS_TAG = b'\x02'
+
+DEFAULT_KEY_SIZE = 256
+DEFAULT_TIMEOUT = 10.0
+POLL_INTERVAL = 0.2
+
+
+class KeyUnavailableError(Exception):
+    """
+    Raised if the requested key is not (yet) available.
+    """
+    pass
+
+
+def encode_key_ids(blocks):
+    """
+    :param blocks: List of tuples of key ID, offset and size (bytes) of the blocks
+    :return: bytes announcing the blocks to the other end
+    """
+    return b''.join(uuid.UUID(key_id).bytes + bytes(encode_varints([offset, size])) for key_id, offset, size in blocks)
+
+
+def decode_key_ids(data):
+    """
+    :param data: bytes created by encode_key_ids
+    :return: List of tuples of key ID, offset and size (bytes) of the blocks
+    """
+    blocks = []
+    pos = 0
+    while pos < len(data):
+        key_id = str(uuid.UUID(bytes=bytes(data[pos:pos + 16])))
+        offset, pos = read_varint(data, pos + 16)
+        size, pos = read_varint(data, pos)
+        blocks.append((key_id, offset, size))
+    return blocks
+
+
+class KeyBlockBuffer:
+    """
+    Stream of shared key addressed by offsets counted from the start of the service. Both ends append the same key in
+    the same order, so an offset denotes the same key on both ends. The master allocates blocks from the front of the
+    stream, the other end fetches allocated blocks by offset in any order. Key is discarded once it was handed out.
+    """
+    def __init__(self):
+        self._data = bytearray()
+        self._base = 0
+        self._allocated = 0
+        self._demanded = 0
+        self._fetched = {}
+        self._condition = threading.Condition()
+
+    @property
+    def end(self):
+        """
+        Offset of the end of the stream.
+        """
+        return self._base + len(self._data)
+
+    @property
+    def stored(self):
+        """
+        Number of bytes held which have not been handed out yet.
+        """
+        with self._condition:
+            return len(self._data)
+
+    @property
+    def available(self):
+        """
+        Number of bytes which can still be allocated.
+        """
+        with self._condition:
+            return self._available()
+
+    def _available(self):
+        return self.end - max(self._allocated, self._base)
+
+    def extend(self, data):
+        """
+        Appends key to the stream.
+        :param data: bytes of key
+        """
+        with self._condition:
+            self._data += data
+            self._condition.notify_all()
+
+    def wait_below(self, amount, timeout=None):
+        """
+        Waits until less than amount bytes (plus the bytes pending allocations wait for) can be allocated.
+        :param amount: Number of bytes
+        :param timeout: Seconds to wait
+        :return: True if less than amount bytes can be allocated, False if the timeout expired
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._available() < amount + self._demanded, timeout)
+
+    def allocate(self, size, timeout=None):
+        """
+        Master side: Hands out the next size bytes of the stream.
+        :param size: Number of bytes
+        :param timeout: Seconds to wait for enough key
+        :return: Tuple of offset and key of the block
+        """
+        with self._condition:
+            self._demanded += size
+            self._condition.notify_all()
+            try:
+                if not self._condition.wait_for(lambda: self._available() >= size, timeout):
+                    raise KeyUnavailableError("Not enough key to allocate {} bytes.".format(size))
+            finally:
+                self._demanded -= size
+
+            offset = self._allocated
+            self._allocated += size
+            key = self._slice(offset, size)
+            self._release(offset, size)
+            return offset, key
+
+    def fetch(self, offset, size, timeout=None):
+        """
+        Other side: Hands out the block at offset, waiting until its key has been generated.
+        :param offset: Offset of the block
+        :param size: Number of bytes of the block
+        :param timeout: Seconds to wait for the key
+        :return: Key of the block
+        """
+        return self.fetch_blocks([(offset, size)], timeout)[0]
+
+    def fetch_blocks(self, blocks, timeout=None):
+        """
+        Other side: Hands out all blocks or none of them, waiting until their key has been generated.
+        :param blocks: List of tuples of offset and size (bytes) of the blocks
+        :param timeout: Seconds to wait for the key
+        :return: List of the keys of the blocks
+        """
+        end = max((offset + size for offset, size in blocks), default=0)
+        with self._condition:
+            for offset, _ in blocks:
+                if offset < self._base or offset in self._fetched:
+                    raise KeyUnavailableError("Key block at {} has already been handed out.".format(offset))
+            if not self._condition.wait_for(lambda: self.end >= end, timeout):
+                missing = [offset for offset, size in blocks if offset + size > self.end]
+                raise KeyUnavailableError("Key blocks at {} have not been generated yet.".format(missing))
+
+            keys = [self._slice(offset, size) for offset, size in blocks]
+            for offset, size in blocks:
+                self._release(offset, size)
+            return keys
+
+    def _slice(self, offset, size):
+        start = offset - self._base
+        return bytes(self._data[start:start + size])
+
+    def _release(self, offset, size):
+        self._fetched[offset] = offset + size
+        while self._base in self._fetched:
+            end = self._fetched.pop(self._base)
+            del self._data[:end - self._base]
+            self._base = end
+        self._condition.notify_all()
+
+
+class KeyService:
+    """
+    Runs key generation with the peer on a background thread and serves the key via HTTP. The master keeps at least
+    low_water_mark bytes of unallocated key and generates refill_size bytes at a time, the other end follows.
+    """
+    def __init__(self, local, peer, master, config=None, low_water_mark=4096, refill_size=4096,
+                 host='127.0.0.1', port=0, timeout=DEFAULT_TIMEOUT, open_channel=None):
+        """
+        :param local: Unique identifier of the local node
+        :param peer: Unique identifier of the peer node
+        :param master: True if this end generates the key and serves enc_keys
+        :param config: NetworkConfig object or path of a configuration file (see open_channel)
+        :param low_water_mark: Number of unallocated bytes below which the master generates more key
+        :param refill_size: Number of bytes generated at a time
+        :param host: Host of the HTTP server
+        :param port: Port of the HTTP server (0 picks a free port)
+        :param timeout: Seconds a request waits for key
+        :param open_channel: Callable opening the secure channel, defaults to QNetwork.q_network.open_channel
+        """
+        self.local = local
+        self.peer = peer
+        self.master = master
+        self.config = config
+        self.low_water_mark = low_water_mark
+        self.refill_size = refill_size
+        self.timeout = timeout
+        self.buffer = KeyBlockBuffer()
+        self.server = _KeyServiceHTTPServer((host, port), self)
+        self._open_channel = open_channel
+        self._running = threading.Event()
+        self._threads = []
+        self._key_ids = {}
+        self._unannounced = []
+        self._key_ids_condition = threading.Condition()
+        self.error = None
+
+    @property
+    def address(self):
+        """
+        Tuple of host and port of the HTTP server.
+        """
+        return self.server.server_address[:2]
+
+    def start(self):
+        """
+        Starts key generation and the HTTP server on background threads.
+        """
+        self._running.set()
+        self._threads = [threading.Thread(target=self._generate, daemon=True),
+                         threading.Thread(target=self.server.serve_forever, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops the HTTP server and key generation. The master ends the session with the peer, the other end stops
+        generating when its master did. Waits at most timeout seconds for each background thread.
+        """
+        self._running.clear()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self._threads:
+            thread.join(self.timeout)
+
+    def _generate(self):
+        try:
+            with self._make_channel() as channel:
+                if self.master:
+                    self._generate_as_master(channel)
+                else:
+                    self._generate_as_follower(channel)
+        except Exception as e:
+            self.error = e
+
+    def _make_channel(self):
+        if self._open_channel is None:
+            from QNetwork.q_network import open_channel
+            self._open_channel = open_channel
+        return self._open_channel(self.local, self.peer, self.config)
+
+    def _generate_as_master(self, channel):
+        pool = channel.network_factory.get_key_pool(self.local, self.local, self.peer)
+        while self._running.is_set():
+            self._announce_key_ids(channel)
+            if not self.buffer.wait_below(self.low_water_mark, POLL_INTERVAL):
+                continue
+
+            channel.write(CONTINUE_TAG)
+            channel.fill_key_pool(self.refill_size)
+            self.buffer.extend(pool.take_bytes(pool.byte_length))
+
+        self._announce_key_ids(channel)
+        channel.write(STOP_TAG)
+
+    def _announce_key_ids(self, channel):
+        with self._key_ids_condition:
+            blocks, self._unannounced = self._unannounced, []
+        if blocks:
+            channel.write(KEY_IDS_TAG + encode_key_ids(blocks))
+
+    def _generate_as_follower(self, channel):
+        pool = channel.network_factory.get_key_pool(self.local, self.peer, self.local)
+        message = channel.read_bytes()
+        while message != STOP_TAG:
+            if message[:1] == KEY_IDS_TAG:
+                with self._key_ids_condition:
+                    for key_id, offset, size in decode_key_ids(message[1:]):
+                        self._key_ids[key_id] = offset, size
+                    self._key_ids_condition.notify_all()
+            else:
+                channel.sync_key_pool()
+                self.buffer.extend(pool.take_bytes(pool.byte_length))
+            message = channel.read_bytes()
+
+    def _check_generation(self):
+        if self.error is not None:
+            raise KeyUnavailableError("Key generation with {} failed: {}".format(self.peer, self.error))
+
+    def status(self):
+        """
+        :return: Dictionary of the status of the key stream, error holds the reason key generation failed (if it did)
+        """
+        return {'source_KME_ID': self.local, 'target_KME_ID': self.peer, 'master': self.master,
+                'key_size': DEFAULT_KEY_SIZE,
+                'stored_key_bytes': self.buffer.available if self.master else self.buffer.stored,
+                'error': None if self.error is None else str(self.error)}
+
+    def enc_keys(self, number=1, size=DEFAULT_KEY_SIZE):
+        """
+        Master side: Hands out new key blocks. All blocks are allocated at once, so either all or none are handed out.
+        :param number: Number of blocks
+        :param size: Size of each block in bits (multiple of 8)
+        :return: List of tuples of key ID and key (bytes)
+        """
+        if not self.master:
+            raise ValueError("Only the master of {} and {} hands out new keys.".format(self.local, self.peer))
+        if size <= 0 or size % 8 != 0 or number <= 0:
+            raise ValueError("Invalid number {} or size {} of keys.".format(number, size))
+
+        self._check_generation()
+        block_size = size // 8
+        try:
+            offset, key = self.buffer.allocate(number * block_size, self.timeout)
+        except KeyUnavailableError:
+            self._check_generation()
+            raise
+
+        blocks = [(str(uuid.uuid4()), offset + i * block_size, block_size) for i in range(number)]
+        with self._key_ids_condition:
+            self._unannounced += blocks
+        return [(key_id, key[i * block_size:(i + 1) * block_size]) for i, (key_id, _, _) in enumerate(blocks)]
+
+    def dec_keys(self, key_ids):
+        """
+        Hands out the key blocks allocated by the master, waiting until the master announced their IDs.
+        :param key_ids: List of key IDs
+        :return: List of tuples of key ID and key (bytes)
+        """
+        if self.master:
+            raise ValueError("The master of {} and {} hands out new keys only.".format(self.local, self.peer))
+        try:
+            key_ids = [str(uuid.UUID(key_id)) for key_id in key_ids]
+        except ValueError:
+            raise ValueError("Invalid key IDs {}.".format(key_ids))
+
+        self._check_generation()
+        with self._key_ids_condition:
+            if not self._key_ids_condition.wait_for(lambda: all(k in self._key_ids for k in key_ids), self.timeout):
+                self._check_generation()
+                unknown = [k for k in key_ids if k not in self._key_ids]
+                raise KeyUnavailableError("Unknown key IDs {}.".format(unknown))
+            blocks = [self._key_ids[key_id] for key_id in key_ids]
+
+        try:
+            keys = self.buffer.fetch_blocks(blocks, self.timeout)
+        except KeyUnavailableError:
+            self._check_generation()
+            raise
+
+        # The IDs are kept until the keys are handed out, so a failed request can be repeated
+        with self._key_ids_condition:
+            for key_id in key_ids:
+                self._key_ids.pop(key_id, None)
+        return list(zip(key_ids, keys))
+
+
+class _KeyServiceHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, _KeyRequestHandler)
+        self.service = service
+
+
+class _KeyRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        query = parse_qs(url.query)
+        if len(parts) != 5 or parts[:3] != ['api', 'v1', 'keys'] or parts[3] != service.peer:
+            return self._reply(404, {'message': "Unknown resource {}.".format(url.path)})
+
+        try:
+            if parts[4] == 'status':
+                return self._reply(200, service.status())
+            elif parts[4] == 'enc_keys':
+                blocks = service.enc_keys(int(query.get('number', ['1'])[0]),
+                                          int(query.get('size', [str(DEFAULT_KEY_SIZE)])[0]))
+            elif parts[4] == 'dec_keys':
+                blocks = service.dec_keys(query.get('key_ID', []))
+            else:
+                return self._reply(404, {'message': "Unknown resource {}.".format(url.path)})
+        except ValueError as e:
+            return self._reply(400, {'message': str(e)})
+        except KeyUnavailableError as e:
+            return self._reply(503, {'message': str(e)})
+
+        self._reply(200, {'keys': [{'key_ID': key_id, 'key': base64.b64encode(key).decode('ascii')}
+                                   for key_id, key in blocks]})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve QKD key to local applications over HTTP.")
+    parser.add_argument('--local', required=True, help="Unique identifier of the local node")
+    parser.add_argument('--peer', required=True, help="Unique identifier of the peer node")
+    parser.add_argument('--master', action='store_true', help="Generate the key and serve enc_keys")
+    parser.add_argument('--config', default=None, help="Configuration file, defaults to q_network.cfg")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    service = KeyService(args.local, args.peer, args.master, args.config, host=args.host, port=args.port)
+    service.start()
+    print("Serving key of {} and {} on http://{}:{}".format(args.local, args.peer, *service.address))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from QNetwork.q_network_key_pool import KeyPool
+
+MAGIC = b'QKEY'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQQ')
+INITIAL_CAPACITY = 1 << 16
+
+_key_stores = {}
+_key_stores_lock = threading.Lock()
+
+
+class KeyStore(KeyPool):
+    """
+    Key pool persisted in a memory-mapped file, so key generated off-peak survives the process and can serve later
+    bursts of messages. Bits are stored packed, eight per byte, behind a small header holding the cursors:
+
+        - written: Number of bits ever appended to the store
+        - consumed: Number of bytes ever taken from the store
+
+    Both cursors count from the creation of the store, so the two ends of a direction can compare them to synchronize
+    (see synchronize). Consumed key at the front of the file is reclaimed by moving the remaining key to the front when
+    the file is full, the file grows if that is not enough.
+
+    Key is padded onto messages directly from the mapped file (see pad), without copying it first.
+    """
+    def __init__(self, path, high_water_mark=0, capacity=INITIAL_CAPACITY):
+        """
+        :param path: Path of the store file, created if it does not exist
+        :param high_water_mark: See KeyPool
+        :param capacity: Initial number of key bytes the file can hold
+        """
+        super().__init__(high_water_mark)
+        self.path = path
+        exists = os.path.exists(path)
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            self._read_header()
+        else:
+            self._capacity, self._base, self._consumed, self._written = capacity, 0, 0, 0
+            self._file.truncate(HEADER.size + capacity)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            self._write_header()
+
+    def _read_header(self):
+        magic, version, self._capacity, self._base, self._consumed, self._written = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a key store of version {}.".format(self.path, VERSION))
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self._capacity, self._base, self._consumed, self._written)
+
+    def __len__(self):
+        return self._written - self._consumed * 8
+
+    @property
+    def byte_length(self):
+        """
+        Number of whole bytes available in the store.
+        """
+        return self._written // 8 - self._consumed
+
+    @property
+    def position(self):
+        """
+        Tuple of the consumption cursor (bytes) and the write cursor (bits).
+        """
+        return self._consumed, self._written
+
+    def extend(self, bits):
+        """
+        Appends bits to the end of the store.
+        :param bits: Integer list or array of bits
+        """
+        bits = np.asarray(bits, dtype=np.uint8)
+        if len(bits) == 0:
+            return
+
+        start = self._written // 8
+        pending = self._written % 8
+        if pending:
+            last = self._map[self._offset(start)]
+            bits = np.concatenate((np.unpackbits(np.array([last], dtype=np.uint8), count=pending), bits))
+
+        data = np.packbits(bits).tobytes()
+        self._reserve(start + len(data))
+        offset = self._offset(start)
+        self._map[offset:offset + len(data)] = data
+        self._written = start * 8 + len(bits)
+        self._write_header()
+
+    def take_bytes(self, size):
+        """
+        Removes size bytes from the front of the store and returns them.
+        :param size: Number of bytes to take
+        :return: bytes of key
+        """
+        self._check_available(size)
+        offset = self._offset(self._consumed)
+        taken = self._map[offset:offset + size]
+        self._consume(size)
+        return taken
+
+    def pad(self, data):
+        """
+        XORs data with the key at the front of the store, read directly from the mapped file, and consumes the key.
+        :param data: bytes-like object to encrypt or decrypt
+        :return: bytes of the same length as data
+        """
+        d = np.frombuffer(data, dtype=np.uint8)
+        self._check_available(len(d))
+        k = np.frombuffer(self._map, dtype=np.uint8, count=len(d), offset=self._offset(self._consumed))
+        padded = np.bitwise_xor(d, k).tobytes()
+        del k
+        self._consume(len(d))
+        return padded
+
+    def synchronize(self, consumed, written):
+        """
+        Aligns the cursors with the ones of the other end of the direction: key consumed by either end is skipped and
+        key written by only one end (i.e.: if the other end stopped before storing a round) is dropped.
+        :param consumed: Consumption cursor (bytes) of the other end
+        :param written: Write cursor (bits) of the other end
+        """
+        self._consumed = max(self._consumed, consumed)
+        self._written = max(min(self._written, written), self._consumed * 8)
+        self._write_header()
+        self.mark_synchronized()
+
+    def clear(self):
+        """
+        Discards all key in the store.
+        """
+        self._consumed = -(-self._written // 8)
+        self._written = self._consumed * 8
+        self._write_header()
+
+    def flush(self):
+        """
+        Writes the mapped file to disk.
+        """
+        self._map.flush()
+
+    def close(self):
+        """
+        Flushes and closes the store.
+        """
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+    def _check_available(self, size):
+        if size > self.byte_length:
+            raise ValueError("Not enough key ({}) to take {} bytes.".format(self.byte_length, size))
+
+    def _consume(self, size):
+        self._consumed += size
+        self._write_header()
+
+    def _offset(self, position):
+        return HEADER.size + position - self._base
+
+    def _reserve(self, end):
+        if end - self._base <= self._capacity:
+            return
+
+        used = -(-self._written // 8) - self._consumed
+        if used > 0:
+            self._map.move(HEADER.size, self._offset(self._consumed), used)
+        self._base = self._consumed
+        if end - self._base > self._capacity:
+            self._grow(max(2 * self._capacity, end - self._base))
+        self._write_header()
+
+    def _grow(self, capacity):
+        self._map.close()
+        self._file.truncate(HEADER.size + capacity)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._capacity = capacity
+
+
+def get_key_store(directory, local, writer, reader):
+    """
+    Returns the key store of the direction from writer to reader held by the node local, kept in the file
+    local/writer-reader.key of directory. Stores are opened once per process.
+    :param directory: Directory of the key store files, created if it does not exist
+    :param local: Unique identifier of the node holding the store
+    :param writer: Unique identifier of the node encrypting with the key
+    :param reader: Unique identifier of the node decrypting with the key
+    :return: KeyStore object
+    """
+    node_directory = os.path.join(directory, local)
+    path = os.path.abspath(os.path.join(node_directory, '{}-{}.key'.format(writer, reader)))
+    with _key_stores_lock:
+        store = _key_stores.get(path)
+        if store is None:
+            os.makedirs(node_directory, exist_ok=True)
+            store = _key_stores[path] = KeyStore(path)
+        return store
@@ -0,0 +1,169 @@
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+COUNTERS = ('bytes_sent', 'bytes_received', 'messages_sent', 'messages_received', 'qubits_sent', 'qubits_received')
+
+_metrics = None
+
+
+class PhaseRecord:
+    """
+    Measurements of one protocol phase of a QKD round. Counters of nested phases are included in the enclosing phase,
+    like their durations.
+    """
+    __slots__ = ('round_id', 'node', 'peer', 'phase', 'start', 'duration', 'counters')
+
+    def __init__(self, round_id, node, peer, phase, start):
+        self.round_id = round_id
+        self.node = node
+        self.peer = peer
+        self.phase = phase
+        self.start = start
+        self.duration = 0.0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def to_dict(self):
+        """
+        :return: Dictionary of the record (round_id, node, peer, phase, start, duration and the counters)
+        """
+        record = {'round_id': self.round_id, 'node': self.node, 'peer': self.peer, 'phase': self.phase,
+                  'start': self.start, 'duration': self.duration}
+        record.update(self.counters)
+        return record
+
+
+class Metrics:
+    """
+    Collects the duration, bytes and message counts of the protocol phases of QKD rounds. Nodes record their phases via
+    the measured decorator, channels count their traffic into the phases open on the calling thread (pipelined rounds
+    run phases on worker threads). Traffic outside of any phase (i.e.: message tags) only shows up in the totals.
+    Pipelined rounds share one classical channel, so a received message is counted in the phases of the thread reading
+    it from the channel, which may be another round's.
+
+    Records are kept up to max_records, older records are dropped first.
+    """
+    def __init__(self, max_records=10000, clock=time.perf_counter):
+        self._records = collections.deque(maxlen=max_records)
+        self._totals = dict.fromkeys(COUNTERS, 0)
+        self._clock = clock
+        self._round_id = 0
+        self._open = threading.local()
+        self._lock = threading.Lock()
+
+    def next_round(self):
+        """
+        :return: Unique ID of a new round
+        """
+        with self._lock:
+            self._round_id += 1
+            return self._round_id
+
+    @contextlib.contextmanager
+    def phase(self, name, round_id=None, node=None, peer=None):
+        """
+        Context manager measuring a phase.
+        :param name: Name of the phase
+        :param round_id: ID of the round the phase belongs to
+        :param node: Name of the node (i.e.: its class name)
+        :param peer: Name of the other end
+        """
+        record = PhaseRecord(round_id, node, peer, name, self._clock())
+        stack = self._stack()
+        stack.append(record)
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record.duration = self._clock() - record.start
+            with self._lock:
+                self._records.append(record)
+
+    def count(self, counter, amount=1):
+        """
+        Adds amount to counter of all phases open on this thread and to the totals.
+        :param counter: Name of the counter (see COUNTERS)
+        :param amount: Amount to add
+        """
+        for record in self._stack():
+            record.counters[counter] += amount
+        with self._lock:
+            self._totals[counter] += amount
+
+    def records(self):
+        """
+        :return: List of dictionaries, one per recorded phase in the order the phases finished
+        """
+        with self._lock:
+            return [r.to_dict() for r in self._records]
+
+    def totals(self):
+        """
+        :return: Dictionary of the counters summed over all traffic
+        """
+        with self._lock:
+            return dict(self._totals)
+
+    def summary(self):
+        """
+        Aggregates the records per phase.
+        :return: Dictionary of phase name to a dictionary of count (number of records), duration and counters, summed
+                 over the records of the phase
+        """
+        summary = {}
+        for record in self.records():
+            entry = summary.setdefault(record['phase'], dict(count=0, duration=0.0, **dict.fromkeys(COUNTERS, 0)))
+            entry['count'] += 1
+            entry['duration'] += record['duration']
+            for c in COUNTERS:
+                entry[c] += record[c]
+        return summary
+
+    def clear(self):
+        """
+        Discards all records and resets the totals.
+        """
+        with self._lock:
+            self._records.clear()
+            self._totals = dict.fromkeys(COUNTERS, 0)
+
+    def _stack(self):
+        stack = getattr(self._open, 'stack', None)
+        if stack is None:
+            stack = self._open.stack = []
+        return stack
+
+
+def measured(name, new_round=False):
+    """
+    Decorator recording a method of a QKD node as phase name in the metrics of the node (if it has any).
+    :param name: Name of the phase
+    :param new_round: True if the method starts a new round (i.e.: share_q_states)
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(node, *args, **kwargs):
+            metrics = node.metrics
+            if metrics is None:
+                return method(node, *args, **kwargs)
+
+            if new_round:
+                node.round_id = metrics.next_round()
+            with metrics.phase(name, node.round_id, type(node).__name__, node.ca_channel.other):
+                return method(node, *args, **kwargs)
+
+        return wrapper
+    return decorate
+
+
+def get_metrics():
+    """
+    Returns the metrics of the process, shared by all channels with CollectMetrics set.
+    :return: Metrics object
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
@@ -0,0 +1,145 @@
+import threading
+import time
+
+_connection_pool = None
+
+
+class PooledChannel:
+    """
+    Proxy of a channel handed out by a ConnectionPool. Attribute access is forwarded to the channel, while closing or
+    releasing the proxy returns the channel to the pool instead of closing its connection. is_new is True if the channel
+    was connected for this proxy and False if it is reused.
+    """
+    def __init__(self, pool, key, channel, is_new=True):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, 'channel', channel)
+        object.__setattr__(self, 'is_new', is_new)
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.channel, name, value)
+
+    def close(self):
+        """
+        Returns the channel to the pool.
+        """
+        self._pool.release(self._key, self.channel)
+
+    def release(self):
+        """
+        Returns the channel to the pool.
+        """
+        self.close()
+
+    def discard(self):
+        """
+        Closes the channel (i.e.: after an error) instead of returning it to the pool.
+        """
+        self._pool.discard(self.channel)
+
+
+class ConnectionPool:
+    """
+    Keeps warm channels per key (i.e.: connection type and peer pair) and hands them out to successive users. Idle
+    channels failing the health check or being idle longer than max_idle seconds are closed instead of reused.
+    """
+    def __init__(self, max_idle=60.0, is_healthy=None, clock=time.monotonic):
+        self.max_idle = max_idle
+        self.is_healthy = is_healthy or (lambda channel: True)
+        self._clock = clock
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, connect):
+        """
+        Hands out an idle channel of key or connects a new one.
+        :param key: Hashable identifier of the kind of channel
+        :param connect: Callable creating a new channel if no healthy idle channel is available
+        :return: PooledChannel proxy of the channel
+        """
+        self.evict_idle()
+        channel = self._take_healthy(key)
+        if channel is None:
+            return PooledChannel(self, key, connect())
+        return PooledChannel(self, key, channel, is_new=False)
+
+    def _take_healthy(self, key):
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                channel, _ = idle.pop()
+
+            if self.is_healthy(channel):
+                return channel
+            channel.close()
+
+    def release(self, key, channel):
+        """
+        Returns a channel to the pool.
+        :param key: Identifier the channel was acquired with
+        :param channel: The released channel
+        """
+        with self._lock:
+            self._idle.setdefault(key, []).append((channel, self._clock()))
+
+    @staticmethod
+    def discard(channel):
+        """
+        Closes a channel acquired from the pool instead of returning it.
+        :param channel: The discarded channel
+        """
+        channel.discard()
+
+    def evict_idle(self):
+        """
+        Closes all channels which have been idle for longer than max_idle seconds.
+        """
+        now = self._clock()
+        evicted = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                evicted += [c for c, released in idle if now - released > self.max_idle]
+                idle[:] = [(c, released) for c, released in idle if now - released <= self.max_idle]
+
+        for channel in evicted:
+            channel.close()
+
+    def idle_count(self, key):
+        """
+        :param key: Identifier of the kind of channel
+        :return: Number of idle channels of key
+        """
+        with self._lock:
+            return len(self._idle.get(key, []))
+
+    def close(self):
+        """
+        Closes all idle channels.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for entries in idle.values():
+            for channel, _ in entries:
+                channel.close()
+
+
+def get_connection_pool(max_idle=60.0, is_healthy=None):
+    """
+    Returns the connection pool shared by all NetworkFactory objects of the process.
+    :param max_idle: Seconds an idle channel is kept open
+    :param is_healthy: Callable probing whether an idle channel can be reused, all channels are reused if None
+    :return: ConnectionPool object
+    """
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = ConnectionPool(max_idle, is_healthy)
+    _connection_pool.max_idle = max_idle
+    if is_healthy is not None:
+        _connection_pool.is_healthy = is_healthy
+    return _connection_pool
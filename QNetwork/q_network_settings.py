@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import threading
+
+_config_cache = {}
+_cache_lock = threading.Lock()
+
+
+class NetworkConfig:
+    """
+    Parsed configuration of the secure quantum communication (see q_network.cfg). It can be created directly to
+    configure a NetworkFactory without a configuration file.
+    """
+    def __init__(self, protocol='BB84', error=0, state_size=200, maximize_key_bits=True, key_pool_size=0,
+                 privacy_amplification='Chunked', qubit_window=50, pool_connections=False, max_idle_time=60,
+                 pipeline_depth=1, min_state_size=None, max_state_size=None, random_source='System',
+                 random_seed=None, reconciliation=None, security_parameter=None, collect_metrics=False,
+                 key_store_directory=None, backend='SimulaQron', noise=0, loss=0):
+        self.protocol = protocol
+        self.error = error
+        self.state_size = state_size
+        self.maximize_key_bits = maximize_key_bits
+        self.key_pool_size = key_pool_size
+        self.privacy_amplification = privacy_amplification
+        self.qubit_window = qubit_window
+        self.pool_connections = pool_connections
+        self.max_idle_time = max_idle_time
+        self.pipeline_depth = pipeline_depth
+        self.min_state_size = min_state_size
+        self.max_state_size = max_state_size
+        self.random_source = random_source
+        self.random_seed = random_seed
+        self.reconciliation = reconciliation
+        self.security_parameter = security_parameter
+        self.collect_metrics = collect_metrics
+        self.key_store_directory = key_store_directory
+        self.backend = backend
+        self.noise = noise
+        self.loss = loss
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        Creates the configuration from the dictionary of a parsed configuration file.
+        :param config: Dictionary with the keys of q_network.cfg
+        :return: NetworkConfig object
+        """
+        return cls(protocol=config['Protocol'],
+                   error=config['Error'],
+                   state_size=config['StateSize'],
+                   maximize_key_bits=config['MaximizeKeyBits'],
+                   key_pool_size=config.get('KeyPoolSize', 0),
+                   privacy_amplification=config.get('PrivacyAmplification', 'Chunked'),
+                   qubit_window=config.get('QubitWindow', 50),
+                   pool_connections=config.get('PoolConnections', False),
+                   max_idle_time=config.get('MaxIdleTime', 60),
+                   pipeline_depth=config.get('PipelineDepth', 1),
+                   min_state_size=config.get('MinStateSize'),
+                   max_state_size=config.get('MaxStateSize'),
+                   random_source=config.get('RandomSource', 'System'),
+                   random_seed=config.get('RandomSeed'),
+                   reconciliation=config.get('Reconciliation'),
+                   security_parameter=config.get('SecurityParameter'),
+                   collect_metrics=config.get('CollectMetrics', False),
+                   key_store_directory=config.get('KeyStoreDirectory'),
+                   backend=config.get('Backend', 'SimulaQron'),
+                   noise=config.get('Noise', 0),
+                   loss=config.get('Loss', 0))
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+    def __repr__(self):
+        return 'NetworkConfig({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in sorted(vars(self).items())))
+
+
+def load_config(config_file):
+    """
+    Loads the configuration file. Parsed configurations are cached by path and only parsed again when the modification
+    time of the file changes, so editing the file reconfigures subsequently opened channels.
+    :param config_file: Path of the configuration file
+    :return: NetworkConfig object
+    """
+    path = os.path.abspath(config_file)
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _config_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    with io.open(path, 'r') as f:
+        config = NetworkConfig.from_dict(json.load(f))
+
+    with _cache_lock:
+        _config_cache[path] = (mtime, config)
+    return config
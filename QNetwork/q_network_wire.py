@@ -0,0 +1,102 @@
+import numpy as np
+
+LEGACY_FORMAT = 0
+PACKED_FORMAT = 1
+FORMAT_VERSION = PACKED_FORMAT
+
+
+def encode_bits(values):
+    """
+    Encodes a list of small non-negative integers (bits, bases, ...) as byte values. The frame starts with the bit width
+    of a single value and the amount of values (varint), followed by the values packed with that width.
+    :param values: Integer list or array of values
+    :return: Integer list of byte values
+    """
+    values = np.asarray(values, dtype=np.uint8)
+    width = max(1, int(values.max()).bit_length()) if len(values) else 1
+    bits = np.unpackbits(values[:, np.newaxis], axis=1)[:, 8 - width:]
+    return [width] + encode_varints([len(values)]) + np.packbits(bits).tolist()
+
+
+def decode_bits(data):
+    """
+    Decodes a frame produced by encode_bits.
+    :param data: Integer list of byte values
+    :return: Integer list of values
+    """
+    width = data[0]
+    count, pos = read_varint(data, 1)
+    bits = np.unpackbits(np.asarray(data[pos:], dtype=np.uint8), count=count * width).reshape(count, width)
+    weights = np.left_shift(1, np.arange(width - 1, -1, -1))
+    return (bits.astype(np.int64) @ weights).tolist()
+
+
+def encode_indices(indices):
+    """
+    Encodes a sorted list of indices as varints of the differences between consecutive indices.
+    :param indices: Sorted integer list or array of non-negative indices
+    :return: Integer list of byte values
+    """
+    return encode_varints(np.diff(np.asarray(indices, dtype=np.int64), prepend=0))
+
+
+def decode_indices(data):
+    """
+    Decodes a frame produced by encode_indices.
+    :param data: Integer list of byte values
+    :return: Integer list of indices
+    """
+    return np.cumsum(decode_varints(data)).tolist()
+
+
+def encode_varints(values):
+    """
+    Encodes non-negative integers as LEB128 varints (seven bits per byte, the high bit marks a following byte).
+    :param values: Integer list or array of non-negative integers below 2^53
+    :return: Integer list of byte values
+    """
+    values = np.asarray(values, dtype=np.int64)
+    bit_lengths = np.where(values > 0, np.frexp(values.astype(np.float64))[1], 0)
+    sizes = np.maximum(1, (bit_lengths + 6) // 7)
+    offsets = np.cumsum(sizes) - sizes
+    data = np.zeros(int(sizes.sum()), dtype=np.uint8)
+    for group in range(int(sizes.max()) if len(values) else 0):
+        selected = sizes > group
+        continued = np.where(sizes[selected] > group + 1, 0x80, 0)
+        data[offsets[selected] + group] = ((values[selected] >> (7 * group)) & 0x7f) | continued
+
+    return data.tolist()
+
+
+def decode_varints(data):
+    """
+    Decodes a sequence of LEB128 varints.
+    :param data: Integer list of byte values
+    :return: int64 array of decoded integers
+    """
+    data = np.asarray(data, dtype=np.int64)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    groups = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    return np.add.reduceat((data & 0x7f) << (7 * groups), starts)
+
+
+def read_varint(data, pos=0):
+    """
+    Reads a single LEB128 varint.
+    :param data: Integer list of byte values
+    :param pos: Position of the first byte of the varint
+    :return: Tuple of the decoded integer and the position after the varint
+    """
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        value |= (b & 0x7f) << shift
+        pos += 1
+        shift += 7
+        if b < 0x80:
+            return value, pos
@@ -1,4 +1,7 @@
-from QNetwork.q_network_channels import QState
+import numpy as np
+
+from QNetwork.q_network_channels import QStates
+from QNetwork.q_network_metrics import measured
 from QNetwork.qkd.qkd import QKDNode
 
 
@@ -12,28 +15,40 @@ class BB84Node(QKDNode):
         self._seed = []
         self.matching_error = 0
 
+    @property
+    def error_rate(self):
+        return self.matching_error
+
+    @staticmethod
+    def max_key_length(n, key_length_estimator):
+        """
+        :param n: Number of states of a round
+        :param key_length_estimator: FiniteKeyEstimator object
+        :return: Estimated key length of a round of n states without errors and reconciliation (about half of the
+                 states are sifted, half of the rest is tested)
+        """
+        sifted = n // 2
+        return key_length_estimator.bb84_key_length(sifted - sifted // 2, sifted // 2, 0.0, leaked_bits=0)
+
     def _send_q_states(self, amount):
         super()._send_q_states(amount)
-        self._qstates = [QState(value, basis) for value, basis in zip(self._gen_random_string(amount),
-                                                                      self._gen_random_string(amount))]
+        self._qstates = QStates(self._gen_random_string(amount), self._gen_random_string(amount))
         self.q_channel.send_qubits(self._qstates)
 
     def _send_test_values(self):
-        self._test_values = [self._qstates[i].value for i in self._test_set]
-        self.ca_channel.send(self._test_values)
+        self._test_values = self._qstates.values[self._index_array(self._test_set)].tolist()
+        self.ca_channel.send_bits(self._test_values)
 
     def _measure_qstates(self, amount):
         self._qstates = self.q_channel.receive_qubits_in(self._gen_random_string(amount))
 
     def _receive_test_values(self):
-        self._other_test_values = self.ca_channel.receive()
+        self._other_test_values = self.ca_channel.receive_bits()
 
     def _discard_states(self):
-        def has_same_basis(pair):
-            q, b = pair
-            return q.basis == b
-
-        self._qstates = [q for q, _ in filter(has_same_basis, zip(self._qstates, self._other_bases))]
+        other_bases = self._other_bases_array()
+        n = min(len(self._qstates), len(other_bases))
+        self._qstates = self._qstates[:n][self._qstates.bases[:n] == other_bases[:n]]
 
     def _calculate_error(self):
         return self._calculate_matching_error_of_values(self._test_values, self._other_test_values)
@@ -41,9 +56,16 @@ class BB84Node(QKDNode):
     def _is_outside_error_bound(self, matching_error):
         return matching_error > self.error
 
+    def _raw_key_indices(self):
+        return np.flatnonzero(~self._test_mask())
+
+    def _estimate_key_length(self, raw_length):
+        return self.key_length_estimator.bb84_key_length(raw_length, len(self._test_set), self.matching_error,
+                                                         self._leaked_bits)
+
+    @measured('_privacy_amplification')
     def _privacy_amplification(self):
-        indices = set(range(len(self._qstates))) - self._test_set
-        return self._calc_privacy_amplification_of(indices)
+        return self._calc_privacy_amplification_of(self._raw_key_indices())
 
 
 class BB84SenderNode(BB84Node):
@@ -54,6 +76,11 @@ class BB84SenderNode(BB84Node):
         super().__init__(q_channel, ca_channel, error)
         self.n = n
 
+    @property
+    def _is_reconciliation_reference(self):
+        return True
+
+    @measured('share_q_states', new_round=True)
     def share_q_states(self):
         """
         The sender implementation of BB84 state sharing.
@@ -65,6 +92,7 @@ class BB84SenderNode(BB84Node):
         self._receive_ack()
         self._share_bases()
 
+    @measured('should_abort')
     def should_abort(self):
         """
         Calculates the matching error in the channel and decides whether to abort or not, dependent on the configured
@@ -78,6 +106,7 @@ class BB84SenderNode(BB84Node):
         self.matching_error = self._calculate_error()
         return self._is_outside_error_bound(self.matching_error)
 
+    @measured('generate_key')
     def generate_key(self):
         """
         Generates key bits based on the produced raw key of QKD.
@@ -95,6 +124,7 @@ class BB84ReceiverNode(BB84Node):
     def __init__(self, q_channel, ca_channel, error):
         super().__init__(q_channel, ca_channel, error)
 
+    @measured('share_q_states', new_round=True)
     def share_q_states(self):
         """
         The receiver implementation of BB84 state sharing.
@@ -106,6 +136,7 @@ class BB84ReceiverNode(BB84Node):
         self._send_ack()
         self._share_bases()
 
+    @measured('should_abort')
     def should_abort(self):
         """
         Calculates the matching error in the channel and decides whether to abort or not, dependent on the configured
@@ -119,6 +150,7 @@ class BB84ReceiverNode(BB84Node):
         self.matching_error = self._calculate_error()
         return self._is_outside_error_bound(self.matching_error)
 
+    @measured('generate_key')
     def generate_key(self):
         """
         Generates key bits based on the produced raw key of QKD.
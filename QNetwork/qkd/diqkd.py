@@ -1,7 +1,9 @@
-import operator
-
 import math
 
+import numpy as np
+
+from QNetwork.q_network_channels import CreditFlowControl
+from QNetwork.q_network_metrics import measured
 from QNetwork.qkd.qkd import QKDNode
 
 
@@ -9,24 +11,42 @@ class DIQKDNode(QKDNode):
     def __init__(self, q_channel, ca_channel, error):
         super().__init__(ca_channel, error)
         self.q_channel = q_channel
-        self._chsh_test_set = set()
-        self._match_test_set = set()
-        self._raw_key_set = set()
+        self.qubit_window = 50
+        self._chsh_test_set = np.empty(0, dtype=np.intp)
+        self._match_test_set = np.empty(0, dtype=np.intp)
+        self._raw_key_set = np.empty(0, dtype=np.intp)
         self._chsh_test_values = []
         self._other_chsh_test_values = []
         self._match_test_values = []
         self._other_match_test_values = []
+        self.matching_error = 1.0
+
+    @property
+    def error_rate(self):
+        return 1.0 - self.matching_error
+
+    @staticmethod
+    def max_key_length(n, key_length_estimator):
+        """
+        :param n: Number of states of a round
+        :param key_length_estimator: FiniteKeyEstimator object
+        :return: Estimated key length of a round of n states with the maximal CHSH winning probability, without errors
+                 and reconciliation (half of the states are tested, a sixth of the rest has matching bases and two
+                 thirds of the tested states play the CHSH game)
+        """
+        win_probability = 0.5 + 1 / (2 * math.sqrt(2))
+        return key_length_estimator.diqkd_key_length(n // 12, n // 3, win_probability, 0.0, leaked_bits=0)
 
     def _send_q_states(self, amount):
         super()._send_q_states(amount)
-        self._qstates = self.q_channel.send_epr(self._gen_random_string(amount))
+        self._qstates = self.q_channel.send_epr(self._gen_random_string(amount), CreditFlowControl(self.ca_channel))
 
     def _send_chsh_test_values(self):
         self._chsh_test_values = self._get_and_send_values_from_test_set(self._chsh_test_set)
 
     def _get_and_send_values_from_test_set(self, test_set):
-        values = [self._qstates[i].value for i in test_set]
-        self.ca_channel.send(values)
+        values = self._qstates.values[self._index_array(test_set)].tolist()
+        self.ca_channel.send_bits(values)
         return values
 
     def _send_match_test_values(self):
@@ -34,43 +54,52 @@ class DIQKDNode(QKDNode):
 
     def _measure_qstates(self, amount):
         print('Bob amount', amount)
-        self._qstates = self.q_channel.receive_epr_in(self._gen_random_string(amount, up_to=2))
+        self._qstates = self.q_channel.receive_epr_in(self._gen_random_string(amount, up_to=2),
+                                                      CreditFlowControl(self.ca_channel, self.qubit_window))
 
     def _receive_chsh_test_values(self):
-        self._other_chsh_test_values = self.ca_channel.receive()
+        self._other_chsh_test_values = self.ca_channel.receive_bits()
 
     def _receive_match_test_values(self):
-        self._other_match_test_values = self.ca_channel.receive()
+        self._other_match_test_values = self.ca_channel.receive_bits()
 
     def _separate_test_subsets(self):
-        self._chsh_test_set = set(filter(self._is_chsh_test, self._test_set))
-
-        self._match_test_set = set(filter(self._is_matching_basis, self._test_set))
+        test_mask = self._test_mask()
+        matching_basis = self._matching_basis_mask()
 
-        remaining = set(range(len(self._qstates))) - self._test_set
-        self._raw_key_set = set(filter(self._is_matching_basis, remaining))
+        self._chsh_test_set = np.flatnonzero(test_mask & self._chsh_test_mask())
+        self._match_test_set = np.flatnonzero(test_mask & matching_basis)
+        self._raw_key_set = np.flatnonzero(~test_mask & matching_basis)
 
-    def _is_chsh_test(self, index):
+    def _chsh_test_mask(self):
         pass
 
-    def _is_matching_basis(self, index):
+    def _matching_basis_mask(self):
         pass
 
     def _calculate_winning_probability(self):
-        test_bases = [self._qstates[i].basis for i in self._chsh_test_set]
-        other_test_bases = [self._other_bases[i] for i in self._chsh_test_set]
-        and_bases = map(operator.mul, test_bases, other_test_bases)
-        xor_values = map(operator.xor, self._chsh_test_values, self._other_chsh_test_values)
+        indices = self._index_array(self._chsh_test_set)
+        and_bases = self._qstates.bases[indices] & np.asarray(self._other_bases, dtype=np.uint8)[indices]
+        xor_values = np.bitwise_xor(np.asarray(self._chsh_test_values, dtype=np.uint8),
+                                    np.asarray(self._other_chsh_test_values, dtype=np.uint8))
 
         t = len(self._chsh_test_values)
-        w = sum(a == b for a, b in zip(and_bases, xor_values))
+        w = np.count_nonzero(and_bases == xor_values)
         return w / t
 
     def _calculate_match_error(self):
         return self._calculate_matching_error_of_values(self._match_test_values, self._other_match_test_values)
 
+    def _raw_key_indices(self):
+        return self._raw_key_set
+
+    def _estimate_key_length(self, raw_length):
+        return self.key_length_estimator.diqkd_key_length(raw_length, len(self._chsh_test_set), self.win_prob,
+                                                          self.error_rate, self._leaked_bits)
+
+    @measured('_privacy_amplification')
     def _privacy_amplification(self):
-        return self._calc_privacy_amplification_of(self._raw_key_set)
+        return self._calc_privacy_amplification_of(self._raw_key_indices())
 
     def _perform_abort_test(self):
         self._separate_test_subsets()
@@ -95,12 +124,17 @@ class DIQKDSenderNode(DIQKDNode):
         super().__init__(q_channel, ca_channel, error)
         self.n = n
 
-    def _is_chsh_test(self, index):
-        return self._other_bases[index] < 2
+    @property
+    def _is_reconciliation_reference(self):
+        return True
+
+    def _chsh_test_mask(self):
+        return self._other_bases_array() < 2
 
-    def _is_matching_basis(self, index):
-        return self._other_bases[index] == 2 and self._qstates[index].basis == 0
+    def _matching_basis_mask(self):
+        return (self._other_bases_array() == 2) & (self._qstates.bases == 0)
 
+    @measured('share_q_states', new_round=True)
     def share_q_states(self):
         """
         The sender implementation of DIQKD state sharing.
@@ -112,6 +146,7 @@ class DIQKDSenderNode(DIQKDNode):
         self._receive_ack()
         self._share_bases()
 
+    @measured('should_abort')
     def should_abort(self):
         """
         Calculates the winning probability of the CHSH game and the matching error in the channel. It then decides
@@ -121,6 +156,7 @@ class DIQKDSenderNode(DIQKDNode):
         self._send_test_set()
         return self._perform_abort_test()
 
+    @measured('generate_key')
     def generate_key(self):
         """
         Generates key bits based on the produced raw key of QKD.
@@ -147,12 +183,13 @@ class DIQKDReceiverNode(DIQKDNode):
         q_channel.bases_mapping = [basis_zero, basis_one, lambda q: None]
         super().__init__(q_channel, ca_channel, error)
 
-    def _is_chsh_test(self, index):
-        return self._qstates[index].basis < 2
+    def _chsh_test_mask(self):
+        return self._qstates.bases < 2
 
-    def _is_matching_basis(self, index):
-        return self._other_bases[index] == 0 and self._qstates[index].basis == 2
+    def _matching_basis_mask(self):
+        return (self._other_bases_array() == 0) & (self._qstates.bases == 2)
 
+    @measured('share_q_states', new_round=True)
     def share_q_states(self):
         """
         The receiver implementation of DIQKD state sharing.
@@ -164,6 +201,7 @@ class DIQKDReceiverNode(DIQKDNode):
         self._send_ack()
         self._share_bases()
 
+    @measured('should_abort')
     def should_abort(self):
         """
         Calculates the winning probability of the CHSH game and the matching error in the channel. It then decides
@@ -173,6 +211,7 @@ class DIQKDReceiverNode(DIQKDNode):
         self._receive_test_set()
         return self._perform_abort_test()
 
+    @measured('generate_key')
     def generate_key(self):
         """
         Generates key bits based on the produced raw key of QKD.
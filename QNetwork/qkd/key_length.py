@@ -0,0 +1,76 @@
+import math
+
+
+def binary_entropy(p):
+    """
+    :param p: Probability
+    :return: Binary Shannon entropy h(p) in bits
+    """
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+class FiniteKeyEstimator:
+    """
+    Estimates the length of secure key which can be extracted from a raw key of finite size. The error statistics
+    measured on the test set are corrected by a statistical fluctuation term, so they bound the statistics of the raw
+    key except with probability security_parameter. The bits leaked during reconciliation (or, without reconciliation,
+    the cost of error correction at the Shannon limit raw_length * h(error_rate)) and the cost of privacy amplification
+    (2 * log2(1 / security_parameter)) are subtracted.
+    """
+    def __init__(self, security_parameter=1e-10):
+        self.security_parameter = security_parameter
+
+    def bb84_key_length(self, raw_length, test_length, error_rate, leaked_bits=None):
+        """
+        Key length of BB84 from the smooth min-entropy bound raw_length * (1 - h(e + mu)), where mu is the deviation
+        of the raw key's error rate from the measured one (sampling without replacement).
+        :param raw_length: Number of raw key bits
+        :param test_length: Number of bits used to estimate the error rate
+        :param error_rate: Error rate (QBER) measured on the test set
+        :param leaked_bits: Number of bits revealed during reconciliation, None if the raw key was not reconciled
+        :return: Number of secure key bits (0 if no key can be extracted)
+        """
+        if raw_length == 0 or test_length == 0:
+            return 0
+
+        e = min(0.5, error_rate + self.sampling_deviation(raw_length, test_length))
+        return self._finalize(raw_length * (1 - binary_entropy(e)), raw_length, error_rate, leaked_bits)
+
+    def diqkd_key_length(self, raw_length, test_length, win_probability, error_rate, leaked_bits=None):
+        """
+        Key length of DIQKD from the bound for collective attacks raw_length * (1 - h((1 + sqrt((S/2)^2 - 1)) / 2)),
+        where S is the CHSH value of the lower confidence bound of the winning probability (Hoeffding).
+        :param raw_length: Number of raw key bits
+        :param test_length: Number of rounds of the CHSH game
+        :param win_probability: Measured winning probability of the CHSH game
+        :param error_rate: Error rate of the raw key
+        :param leaked_bits: Number of bits revealed during reconciliation, None if the raw key was not reconciled
+        :return: Number of secure key bits (0 if no key can be extracted)
+        """
+        if raw_length == 0 or test_length == 0:
+            return 0
+
+        p = win_probability - math.sqrt(math.log(1 / self.security_parameter) / (2 * test_length))
+        s = 4 * (2 * p - 1)
+        if s <= 2:
+            return 0
+
+        eve_information = binary_entropy((1 + math.sqrt(min(1.0, (s / 2) ** 2 - 1))) / 2)
+        return self._finalize(raw_length * (1 - eve_information), raw_length, error_rate, leaked_bits)
+
+    def sampling_deviation(self, raw_length, test_length):
+        """
+        :param raw_length: Number of raw key bits
+        :param test_length: Number of test bits
+        :return: Deviation of the error rate of the raw key from the one of the test set
+        """
+        n, k = raw_length, test_length
+        return math.sqrt((n + k) / (n * k) * (k + 1) / k * math.log(1 / self.security_parameter))
+
+    def _finalize(self, entropy, raw_length, error_rate, leaked_bits):
+        if leaked_bits is None:
+            leaked_bits = raw_length * binary_entropy(error_rate)
+        length = entropy - leaked_bits - 2 * math.log2(1 / self.security_parameter)
+        return max(0, int(math.floor(length)))
@@ -0,0 +1,149 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from QNetwork.q_network_channels import CAChannel
+from QNetwork.q_network_wire import encode_varints, read_varint
+
+CONTROL_ROUND = 0
+START_ROUND_TAG = 1
+END_ROUNDS_TAG = 0
+
+
+class RoundDemultiplexer:
+    """
+    Multiplexes the classical messages of several concurrent QKD rounds over one classical channel. Every message is
+    prefixed with its round ID (varint). Messages received for another round than the requested one are buffered until
+    that round asks for them.
+    """
+    def __init__(self, ca_channel):
+        self.ca_channel = ca_channel
+        self._send_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._buffers = collections.defaultdict(collections.deque)
+        self._receiving = False
+
+    def send(self, round_id, data):
+        """
+        Sends data tagged with the round ID.
+        :param round_id: Non-negative integer ID of the round
+        :param data: Integer list of the message
+        """
+        with self._send_lock:
+            self.ca_channel.send(encode_varints([round_id]) + list(data))
+
+    def receive(self, round_id):
+        """
+        Receives the next message of a round. Only one thread reads from the classical channel at a time, the others
+        wait for their messages to be buffered.
+        :param round_id: Non-negative integer ID of the round
+        :return: Integer list of the message
+        """
+        buffer = self._buffers[round_id]
+        while True:
+            with self._condition:
+                while not buffer and self._receiving:
+                    self._condition.wait()
+                if buffer:
+                    return buffer.popleft()
+                self._receiving = True
+
+            message = None
+            try:
+                message = self.ca_channel.receive()
+            finally:
+                with self._condition:
+                    self._receiving = False
+                    if message is not None:
+                        other_id, pos = read_varint(message)
+                        self._buffers[other_id].append(message[pos:])
+                    self._condition.notify_all()
+
+
+class _RoundConnection:
+    """
+    Classical connection (as used by CAChannel) of a single round on top of a RoundDemultiplexer
+    """
+    def __init__(self, demultiplexer, round_id):
+        self._demultiplexer = demultiplexer
+        self._round_id = round_id
+
+    def sendValueList(self, other, data):
+        self._demultiplexer.send(self._round_id, data)
+
+    def getValueList(self, other):
+        return self._demultiplexer.receive(self._round_id)
+
+    def sendAck(self, other):
+        self._demultiplexer.send(self._round_id, [])
+
+    def getAck(self, other):
+        self._demultiplexer.receive(self._round_id)
+
+
+class RoundPipeline:
+    """
+    Runs QKD rounds pipelined: while the classical post-processing (sifting, error estimation and privacy
+    amplification) of round N runs on a worker thread, the states of round N+1 are shared. Each round gets its own
+    node and classical channel, whose messages are tagged with the round ID. Key of the rounds is handed on in round
+    order, so both ends assemble the same key.
+
+    The sender decides how many rounds are run and announces each round on the control stream (round ID 0), the
+    receiver follows these announcements. Both ends have to use the same depth.
+    """
+    def __init__(self, ca_channel, make_node, depth=2):
+        """
+        :param ca_channel: CAChannel object shared by all rounds
+        :param make_node: Callable creating the QKDNode of a round from the round's CAChannel
+        :param depth: Maximum number of rounds in flight
+        """
+        self.ca_channel = ca_channel
+        self.make_node = make_node
+        self.depth = depth
+        self._demultiplexer = RoundDemultiplexer(ca_channel)
+        self._round_id = CONTROL_ROUND
+
+    def run_sender(self, should_continue, on_key):
+        """
+        Runs rounds as long as should_continue returns True. It is checked after each finished round, so up to depth - 1
+        rounds more than necessary may finish.
+        :param should_continue: Callable returning whether another round is needed
+        :param on_key: Callable receiving the key of each round in round order
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            in_flight = collections.deque()
+            while should_continue():
+                self._demultiplexer.send(CONTROL_ROUND, [START_ROUND_TAG])
+                in_flight.append(self._start_round(executor))
+                if len(in_flight) == self.depth:
+                    on_key(in_flight.popleft().result())
+
+            self._demultiplexer.send(CONTROL_ROUND, [END_ROUNDS_TAG])
+            self._finish(in_flight, on_key)
+
+    def run_receiver(self, on_key):
+        """
+        Takes part in the rounds announced by the sender.
+        :param on_key: Callable receiving the key of each round in round order
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            in_flight = collections.deque()
+            while self._demultiplexer.receive(CONTROL_ROUND)[0] == START_ROUND_TAG:
+                in_flight.append(self._start_round(executor))
+                if len(in_flight) == self.depth:
+                    on_key(in_flight.popleft().result())
+
+            self._finish(in_flight, on_key)
+
+    def _start_round(self, executor):
+        self._round_id += 1
+        ca_channel = CAChannel(_RoundConnection(self._demultiplexer, self._round_id), self.ca_channel.other)
+        ca_channel.format_version = self.ca_channel.format_version
+        node = self.make_node(ca_channel)
+        node.share_q_states()
+        return executor.submit(node.distill_key)
+
+    @staticmethod
+    def _finish(in_flight, on_key):
+        while in_flight:
+            on_key(in_flight.popleft().result())
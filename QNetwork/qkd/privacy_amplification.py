@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class ChunkedParityExtractor:
+    """
+    Extracts k key bits by splitting the raw key and the seed into chunks and taking the parity of their bitwise product
+    (the inner product modulo 2) for each chunk. Raw key bits after the k-th chunk are dropped.
+    """
+    @staticmethod
+    def seed_length(raw_length):
+        """
+        :param raw_length: Length of the raw key
+        :return: Number of seed bits needed to extract key from a raw key of raw_length
+        """
+        return raw_length
+
+    @staticmethod
+    def extract(x, seed, k):
+        """
+        Extracts key bits from the raw key x.
+        :param x: Integer list or array of raw key bits
+        :param seed: Integer list or array of random seed bits
+        :param k: Requested key length
+        :return: Integer list of at most k extracted key bits ([0, 1, 1]), fewer if the seed is shorter than the raw key
+        """
+        chunk_size = len(x) // k
+        if chunk_size == 0:
+            raise ValueError("The requested key ({}) is too long for the raw key ({}).".format(k, len(x)))
+
+        size = min(k * chunk_size, len(x), len(seed))
+        products = np.zeros(size + (-size) % chunk_size, dtype=np.uint8)
+        products[:size] = np.bitwise_and(np.asarray(x[:size], dtype=np.uint8), np.asarray(seed[:size], dtype=np.uint8))
+        return np.bitwise_xor.reduce(products.reshape(-1, chunk_size), axis=1).tolist()
+
+
+class ToeplitzExtractor:
+    """
+    Extracts k key bits by multiplying the raw key with a random k x n Toeplitz matrix (a 2-universal hash family). The
+    matrix is defined by the seed and the product is computed as a convolution via FFT.
+    """
+    @staticmethod
+    def seed_length(raw_length):
+        """
+        :param raw_length: Length of the raw key
+        :return: Number of seed bits needed to extract up to raw_length key bits from a raw key of raw_length
+        """
+        return max(2 * raw_length - 1, 0)
+
+    @staticmethod
+    def extract(x, seed, k):
+        """
+        Extracts key bits from the raw key x. Entry (i, j) of the Toeplitz matrix is seed[i - j + len(x) - 1].
+        :param x: Integer list or array of raw key bits
+        :param seed: Integer list or array of random seed bits, at least len(x) + k - 1 long
+        :param k: Requested key length
+        :return: Integer list of extracted key bits ([0, 1, 1])
+        """
+        n = len(x)
+        if k > n:
+            raise ValueError("The requested key ({}) is too long for the raw key ({}).".format(k, n))
+        if len(seed) < n + k - 1:
+            raise ValueError("The seed ({}) is too short for a {} x {} Toeplitz matrix.".format(len(seed), k, n))
+        if k == 0:
+            return []
+
+        s = np.asarray(seed[:n + k - 1], dtype=np.float64)
+        xs = np.asarray(x, dtype=np.float64)
+        size = 1 << (len(s) + n - 2).bit_length()
+        convolution = np.fft.irfft(np.fft.rfft(s, size) * np.fft.rfft(xs, size), size)
+        return (np.rint(convolution[n - 1:n - 1 + k]).astype(np.int64) % 2).tolist()
+
+
+EXTRACTOR_CLASSES = {'Chunked': ChunkedParityExtractor, 'Toeplitz': ToeplitzExtractor}
@@ -1,8 +1,11 @@
-import operator
-import random
 from abc import ABC, abstractmethod
 
-import math
+import numpy as np
+
+from QNetwork.q_network_channels import QStates
+from QNetwork.q_network_metrics import measured
+from QNetwork.qkd.privacy_amplification import ChunkedParityExtractor
+from QNetwork.qkd.randomness import SystemRandomSource
 
 
 class QKDNode(ABC):
@@ -10,9 +13,16 @@ class QKDNode(ABC):
         self.ca_channel = ca_channel
         self.error = error
         self.maximize_key_bits = False
-        self._qstates = []
+        self.extractor = ChunkedParityExtractor()
+        self.random_source = SystemRandomSource()
+        self.reconciler = None
+        self.key_length_estimator = None
+        self.metrics = None
+        self.round_id = None
+        self._leaked_bits = None
+        self._qstates = QStates()
         self._other_bases = []
-        self._test_set = set()
+        self._test_set = np.empty(0, dtype=np.intp)
         self._mismatching_states = 0
 
     def try_generate_key(self):
@@ -22,11 +32,47 @@ class QKDNode(ABC):
                  An integer list (i.e.: [0, 1, 1]) of shared key
         """
         self.share_q_states()
-        if self.should_abort():
+        return self.distill_key()
+
+    def distill_key(self):
+        """
+        Performs the classical post-processing (error estimation, reconciliation and privacy amplification) of the
+        shared states
+        :return: An empty list [] if the protocol was unsuccessful or an integer list (i.e.: [0, 1, 1]) of shared key
+        """
+        if self.should_abort() or not self.reconcile():
             return []
 
         return self.generate_key()
 
+    @measured('reconcile')
+    def reconcile(self):
+        """
+        Corrects the errors of the raw key with the configured reconciler (if any). The sender's raw key is the
+        reference, the receiver corrects its raw key to match it.
+        :return: False if the reconciler could not confirm that both raw keys are equal, True otherwise
+        """
+        if self.reconciler is None:
+            return True
+
+        indices = self._index_array(self._raw_key_indices())
+        x = self._qstates.values[indices]
+        if self._is_reconciliation_reference:
+            self._leaked_bits, confirmed = self.reconciler.answer(x, self.ca_channel, self.error_rate,
+                                                                  self.random_source)
+        else:
+            x, self._leaked_bits, confirmed = self.reconciler.correct(x, self.ca_channel, self.error_rate)
+            self._qstates.values[indices] = x
+        return confirmed
+
+    @property
+    def _is_reconciliation_reference(self):
+        return False
+
+    @abstractmethod
+    def _raw_key_indices(self):
+        pass
+
     @abstractmethod
     def share_q_states(self):
         pass
@@ -42,23 +88,25 @@ class QKDNode(ABC):
     def _send_q_states(self, amount):
         self.ca_channel.send(amount)
 
+    @measured('_share_bases')
     def _share_bases(self):
         self._send_bases()
         self._receive_bases()
 
     def _send_bases(self):
-        self.ca_channel.send([q.basis for q in self._qstates])
+        self.ca_channel.send_bits(self._qstates.bases)
 
     def _send_test_set(self):
         s = len(self._qstates)
         t = s // 2
-        self._test_set = set(random.sample(range(0, s), t))
-        self.ca_channel.send(list(self._test_set))
+        self._test_set = np.sort(self.random_source.sample(s, t))
+        self.ca_channel.send_indices(self._test_set)
 
+    @measured('_send_seed')
     def _send_seed(self):
         m = len(self._qstates) - len(self._test_set)
-        self._seed = self._gen_random_string(m)
-        self.ca_channel.send(self._seed)
+        self._seed = self._gen_random_string(self.extractor.seed_length(m))
+        self.ca_channel.send_bits(self._seed)
 
     def _send_ack(self):
         self.ca_channel.send_ack()
@@ -72,20 +120,22 @@ class QKDNode(ABC):
         pass
 
     def _receive_bases(self):
-        self._other_bases = self.ca_channel.receive()
+        self._other_bases = self.ca_channel.receive_bits()
 
+    @measured('_receive_seed')
     def _receive_seed(self):
-        self._seed = self.ca_channel.receive()
+        self._seed = self.ca_channel.receive_bits()
 
     def _receive_test_set(self):
-        self._test_set = set(self.ca_channel.receive())
+        self._test_set = self._index_array(self.ca_channel.receive_indices())
 
     def _receive_ack(self):
         self.ca_channel.receive_ack()
 
-    @staticmethod
-    def _gen_random_string(size, up_to=1):
-        return [random.randint(0, up_to) for _ in range(size)]
+    def _gen_random_string(self, size, up_to=1):
+        if up_to == 1:
+            return self.random_source.bits(size)
+        return self.random_source.integers(size, up_to)
 
     def _calculate_matching_error_of_values(self, lhs, rhs):
         t = len(lhs)
@@ -93,20 +143,35 @@ class QKDNode(ABC):
         return self._mismatching_states / t
 
     def _calc_privacy_amplification_of(self, indices):
-        x = [self._qstates[i].value for i in indices]
-        k = len(x) - self._mismatching_states if self.maximize_key_bits else 1
+        x = self._qstates.values[self._index_array(indices)]
+        k = self._key_length(len(x))
+        if k <= 0:
+            return []
         return self._extract_key(x, self._seed, k)
 
-    @staticmethod
-    def _extract_key(x, seed, k):
-        chunk_size = math.floor(len(x) / k)
-        if chunk_size == 0:
-            raise ValueError("The requested key ({}) is too long for the raw key ({}).".format(k, len(x)))
+    def _key_length(self, raw_length):
+        if not self.maximize_key_bits:
+            return 1
+        if self.key_length_estimator is None:
+            leaked_bits = 0 if self._leaked_bits is None else self._leaked_bits
+            return raw_length - self._mismatching_states - leaked_bits
+        return self._estimate_key_length(raw_length)
 
-        return [sum(map(operator.mul, xp, sp)) % 2 for xp, sp in zip(QKDNode._split_list(x, chunk_size),
-                                                                     QKDNode._split_list(seed, chunk_size))]
+    @abstractmethod
+    def _estimate_key_length(self, raw_length):
+        pass
 
     @staticmethod
-    def _split_list(list, size):
-        for i in range(0, len(list), size):
-            yield list[i:i+size]
\ No newline at end of file
+    def _index_array(indices):
+        return np.asarray(indices, dtype=np.intp)
+
+    def _test_mask(self):
+        mask = np.zeros(len(self._qstates), dtype=bool)
+        mask[self._index_array(self._test_set)] = True
+        return mask
+
+    def _other_bases_array(self):
+        return np.asarray(self._other_bases, dtype=np.uint8)
+
+    def _extract_key(self, x, seed, k):
+        return self.extractor.extract(x, seed, k)
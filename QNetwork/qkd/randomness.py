@@ -0,0 +1,78 @@
+import secrets
+
+import numpy as np
+
+
+class SystemRandomSource:
+    """
+    Cryptographically secure randomness of the operating system (os.urandom via secrets), drawn in bulk and unpacked
+    into bit arrays with numpy. This is the source to use for bases, values and seeds of real key material.
+    """
+    def bits(self, size):
+        """
+        :param size: Number of random bits
+        :return: uint8 array of random bits
+        """
+        data = np.frombuffer(secrets.token_bytes((size + 7) // 8), dtype=np.uint8)
+        return np.unpackbits(data, count=size)
+
+    def integers(self, size, up_to):
+        """
+        Draws uniformly distributed integers by rejection sampling of up_to.bit_length() random bits per integer.
+        :param size: Number of random integers
+        :param up_to: Largest possible integer (inclusive)
+        :return: uint8 array of random integers in [0, up_to]
+        """
+        width = max(1, up_to.bit_length())
+        weights = np.left_shift(1, np.arange(width - 1, -1, -1)).astype(np.uint8)
+        values = np.empty(0, dtype=np.uint8)
+        while len(values) < size:
+            missing = size - len(values)
+            candidates = self.bits((missing + missing // 2 + 8) * width).reshape(-1, width) @ weights
+            values = np.concatenate((values, candidates[candidates <= up_to].astype(np.uint8)))
+
+        return values[:size]
+
+    def sample(self, population, k):
+        """
+        :param population: Size of the population (range(population))
+        :param k: Number of drawn elements
+        :return: intp array of k distinct random elements in random order
+        """
+        keys = np.frombuffer(secrets.token_bytes(8 * population), dtype=np.uint64)
+        return np.argsort(keys, kind='stable')[:k].astype(np.intp)
+
+
+class SeededRandomSource:
+    """
+    Fast and reproducible pseudo randomness of numpy's default generator (PCG64). Meant for tests and simulations, not
+    for key material.
+    """
+    def __init__(self, seed=None):
+        self._generator = np.random.default_rng(seed)
+
+    def bits(self, size):
+        """
+        :param size: Number of random bits
+        :return: uint8 array of random bits
+        """
+        return self._generator.integers(0, 2, size, dtype=np.uint8)
+
+    def integers(self, size, up_to):
+        """
+        :param size: Number of random integers
+        :param up_to: Largest possible integer (inclusive)
+        :return: uint8 array of random integers in [0, up_to]
+        """
+        return self._generator.integers(0, up_to + 1, size, dtype=np.uint8)
+
+    def sample(self, population, k):
+        """
+        :param population: Size of the population (range(population))
+        :param k: Number of drawn elements
+        :return: intp array of k distinct random elements in random order
+        """
+        return self._generator.choice(population, k, replace=False).astype(np.intp)
+
+
+RANDOM_SOURCE_CLASSES = {'System': SystemRandomSource, 'Seeded': SeededRandomSource}
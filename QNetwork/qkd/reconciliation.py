@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+
+class CascadeReconciler:
+    """
+    Corrects the errors of the raw key with the Cascade protocol. The sender's raw key is the reference: the receiver
+    asks for parities of blocks of the reference key and flips bits of its own key until all parities match.
+
+    Each pass splits a (pass specific) permutation of the raw key into blocks. Blocks with mismatching parity are
+    narrowed down to a single erroneous bit by bisection. Fixing a bit toggles the parity of the blocks of earlier
+    passes containing it, which are bisected in turn (the cascade). All blocks of a pass are bisected together, so the
+    number of message exchanges grows with the number of bisection levels instead of the number of errors.
+
+    Cascade can miss errors (an even number of them in every block containing them). After the last pass both ends
+    therefore compare the parities of confirmation_bits random subsets of the key, the round has to be dropped if any of
+    them differs.
+
+    Every parity answered reveals one bit of information about the key, which is reported as leaked bits and has to be
+    removed by privacy amplification.
+    """
+    def __init__(self, passes=4, confirmation_bits=32):
+        self.passes = passes
+        self.confirmation_bits = confirmation_bits
+
+    def answer(self, x, ca_channel, error_rate, random_source):
+        """
+        Reference side of Cascade. Answers parity queries of the other end until it finished its correction.
+        :param x: Integer list or array of raw key bits
+        :param ca_channel: CAChannel object to the correcting end
+        :param error_rate: Estimated error rate of the raw key, has to be the same on both ends
+        :param random_source: Random source of the node, used to draw the seed of the permutations and subsets
+        :return: Tuple of the number of leaked bits and whether both keys were confirmed to be equal
+        """
+        seed = int(np.asarray(random_source.bits(31), dtype=np.int64) @ (1 << np.arange(31, dtype=np.int64)))
+        ca_channel.send_integers([seed])
+        x = np.asarray(x, dtype=np.uint8)
+        prefixes = [self._prefix_parities(x, p) for p in self._permutations(len(x), seed)]
+
+        leaked = 0
+        query = ca_channel.receive_integers()
+        while query[0] != 0:
+            ranges = np.asarray(query[2:], dtype=np.intp).reshape(query[0], 2)
+            prefix = prefixes[query[1]]
+            ca_channel.send_bits(prefix[ranges[:, 1]] ^ prefix[ranges[:, 0]])
+            leaked += query[0]
+            query = ca_channel.receive_integers()
+
+        ca_channel.send_bits(self._confirmation_parities(x, seed))
+        confirmed = ca_channel.receive_integers()[0] == 1
+        return leaked + self.confirmation_bits, confirmed
+
+    def correct(self, x, ca_channel, error_rate):
+        """
+        Correcting side of Cascade.
+        :param x: Integer list or array of raw key bits
+        :param ca_channel: CAChannel object to the reference end
+        :param error_rate: Estimated error rate of the raw key, has to be the same on both ends
+        :return: Tuple of the corrected raw key (uint8 array), the number of leaked bits and whether both keys were
+                 confirmed to be equal
+        """
+        seed = ca_channel.receive_integers()[0]
+        x = np.array(x, dtype=np.uint8)
+        leaked = self._correct_passes(x, ca_channel, error_rate, seed) if len(x) > 0 else 0
+        ca_channel.send_integers([0])
+
+        parities = np.asarray(ca_channel.receive_bits(), dtype=np.uint8)
+        confirmed = np.array_equal(parities, self._confirmation_parities(x, seed))
+        ca_channel.send_integers([int(confirmed)])
+        return x, leaked + self.confirmation_bits, confirmed
+
+    def _correct_passes(self, x, ca_channel, error_rate, seed):
+        n = len(x)
+        permutations = self._permutations(n, seed)
+        size = self.first_block_size(n, error_rate)
+
+        blocks = []
+        leaked = 0
+        for p in range(len(permutations)):
+            starts = np.arange(0, n, size, dtype=np.intp)
+            ends = np.minimum(starts + size, n)
+            blocks.append((starts, ends, self._query(ca_channel, p, starts, ends)))
+            leaked += len(starts)
+            leaked += self._cascade(x, ca_channel, permutations, blocks)
+            size = min(2 * size, max(n, 1))
+
+        return leaked
+
+    @staticmethod
+    def first_block_size(n, error_rate):
+        """
+        :param n: Length of the raw key
+        :param error_rate: Estimated error rate of the raw key
+        :return: Block size of the first pass, chosen to hold about 0.73 errors
+        """
+        size = math.ceil(0.73 / error_rate) if error_rate > 0 else n
+        return max(1, min(size, n))
+
+    def _permutations(self, n, seed):
+        generator = np.random.default_rng(seed)
+        return [np.arange(n, dtype=np.intp)] + [generator.permutation(n) for _ in range(self.passes - 1)]
+
+    def _confirmation_parities(self, x, seed):
+        generator = np.random.default_rng([seed, 1])
+        subsets = (generator.integers(0, 2, len(x), dtype=np.uint8) for _ in range(self.confirmation_bits))
+        return np.array([np.count_nonzero(subset & x) & 1 for subset in subsets], dtype=np.uint8)
+
+    @staticmethod
+    def _prefix_parities(x, permutation):
+        return np.concatenate(([0], np.bitwise_xor.accumulate(x[permutation]))).astype(np.uint8)
+
+    @staticmethod
+    def _query(ca_channel, p, starts, ends):
+        ca_channel.send_integers([len(starts), p] + np.column_stack((starts, ends)).ravel().tolist())
+        return np.asarray(ca_channel.receive_bits(), dtype=np.uint8)
+
+    def _cascade(self, x, ca_channel, permutations, blocks):
+        leaked = 0
+        odd_pass = self._find_odd_pass(x, permutations, blocks)
+        while odd_pass is not None:
+            p, starts, ends = odd_pass
+            leaked += self._bisect(x, ca_channel, p, permutations[p], starts, ends)
+            odd_pass = self._find_odd_pass(x, permutations, blocks)
+
+        return leaked
+
+    def _find_odd_pass(self, x, permutations, blocks):
+        for p, (starts, ends, parities) in enumerate(blocks):
+            prefix = self._prefix_parities(x, permutations[p])
+            odd = (prefix[ends] ^ prefix[starts]) != parities
+            if np.any(odd):
+                return p, starts[odd], ends[odd]
+
+        return None
+
+    def _bisect(self, x, ca_channel, p, permutation, starts, ends):
+        leaked = 0
+        starts, ends = starts.copy(), ends.copy()
+        prefix = self._prefix_parities(x, permutation)
+        active = ends - starts > 1
+        while np.any(active):
+            mids = (starts[active] + ends[active]) // 2
+            parities = self._query(ca_channel, p, starts[active], mids)
+            leaked += len(mids)
+            in_first_half = (prefix[mids] ^ prefix[starts[active]]) != parities
+            ends[active] = np.where(in_first_half, mids, ends[active])
+            starts[active] = np.where(in_first_half, starts[active], mids)
+            active = ends - starts > 1
+
+        x[permutation[starts]] ^= 1
+        return leaked
+
+
+RECONCILER_CLASSES = {'Cascade': CascadeReconciler}
@@ -0,0 +1,67 @@
+import math
+
+_policies = {}
+
+
+class RoundSizePolicy:
+    """
+    Picks the number of states of the next QKD round from the key bits still missing. The key of a round is modelled as
+    n * raw_fraction * (1 - error_rate) * success_rate, where the fraction of states ending up in the raw key, the error
+    rate (matching_error) and the share of rounds which were not aborted are moving averages over the observed rounds.
+    The model assumes that the key grows with the round (i.e.: MaximizeKeyBits is set).
+    """
+    def __init__(self, min_size, max_size, raw_fraction=0.25, smoothing=0.3):
+        """
+        :param min_size: Smallest number of states of a round
+        :param max_size: Largest number of states of a round
+        :param raw_fraction: Initial estimate of the fraction of states in the raw key (BB84 sifts half of the states
+            and uses half of the remaining ones for testing)
+        :param smoothing: Weight of the latest observation in the moving averages
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.raw_fraction = raw_fraction
+        self.error_rate = 0.0
+        self.success_rate = 1.0
+        self.smoothing = smoothing
+
+    def expected_yield(self):
+        """
+        :return: Expected number of key bits per state
+        """
+        return self.raw_fraction * (1.0 - self.error_rate) * self.success_rate
+
+    def next_size(self, missing_bits):
+        """
+        :param missing_bits: Number of key bits still needed
+        :return: Number of states of the next round
+        """
+        expected_yield = self.expected_yield()
+        n = self.max_size if expected_yield <= 0 else math.ceil(missing_bits / expected_yield)
+        return min(self.max_size, max(self.min_size, n))
+
+    def observe(self, n, key_bits, error_rate):
+        """
+        Updates the estimates with the outcome of a round.
+        :param n: Number of states of the round
+        :param key_bits: Number of key bits the round produced (0 if aborted)
+        :param error_rate: Error rate measured in the round
+        """
+        self.error_rate = self._average(self.error_rate, error_rate)
+        self.success_rate = self._average(self.success_rate, 1.0 if key_bits else 0.0)
+        if key_bits and error_rate < 1:
+            self.raw_fraction = self._average(self.raw_fraction, key_bits / (n * (1.0 - error_rate)))
+
+    def _average(self, estimate, observation):
+        return (1 - self.smoothing) * estimate + self.smoothing * observation
+
+
+def get_round_size_policy(writer, reader):
+    """
+    Returns the round size policy of the direction from writer to reader. Like key pools, policies live as long as the
+    process, so estimates carry over between open_channel contexts.
+    :param writer: Unique identifier of the node sending the states
+    :param reader: Unique identifier of the node receiving the states
+    :return: RoundSizePolicy object
+    """
+    return _policies.setdefault((writer, reader), RoundSizePolicy(0, 0))
@@ -0,0 +1,94 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class KeyBlock:
+    """
+    POD class to hold the key generated by one successful QKD round of a node
+    """
+    def __init__(self, name, round_idx, bits):
+        self.name = name
+        self.round_idx = round_idx
+        self.bits = bits
+
+    def __eq__(self, other):
+        return self.name == other.name and self.round_idx == other.round_idx and self.bits == other.bits
+
+    def __repr__(self):
+        return 'KeyBlock(name={}, round_idx={}, bits={})'.format(self.name, self.round_idx, self.bits)
+
+
+class KeyGenerationScheduler:
+    """
+    Runs QKD rounds of several nodes concurrently on a pool of worker threads. Each node has to own its quantum and
+    classical channels (i.e.: a separate CQC connection per node pair) and its rounds run sequentially in one worker,
+    while rounds of different nodes overlap. Key of successful rounds is put into a shared queue of KeyBlocks.
+
+    The other end of each node pair has to run the same amount of rounds, so use the rounds parameter to end key
+    generation in a coordinated way. stop() is meant for shutting down.
+
+    The scheduler is meant for generating key of many node pairs in bulk with a fixed amount of rounds known to both
+    ends, i.e.: simulations or scripts filling key stores ahead of use. SecureChannel does not use it: its key pools
+    are refilled on demand, the writing end decides round by round whether more key is needed and announces each round
+    to the other end (see SecureChannel.fill_key_pool), rounds of one channel overlap via RoundPipeline
+    (PipelineDepth in q_network.cfg) instead.
+
+    >>> with KeyGenerationScheduler() as scheduler:
+    >>>     for peer in ('Bob', 'Charlie'):
+    >>>         scheduler.add('Alice-' + peer, make_sender_node(peer), rounds=10)
+    >>>     scheduler.wait()
+    >>>     block = scheduler.get_block(timeout=0)
+    """
+    def __init__(self, max_workers=None):
+        self.blocks = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._stopped = threading.Event()
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop(wait=exc_type is None)
+
+    def add(self, name, node, rounds=None):
+        """
+        Schedules key generation for a node.
+        :param name: Identifier of the node pair, used to tag the generated key blocks
+        :param node: QKDNode object with its own channels
+        :param rounds: Number of rounds to run or None to run until stopped
+        """
+        self._futures.append(self._executor.submit(self._run, name, node, rounds))
+
+    def _run(self, name, node, rounds):
+        idx = 0
+        while not self._stopped.is_set() and (rounds is None or idx < rounds):
+            key = node.try_generate_key()
+            if len(key) != 0:
+                self.blocks.put(KeyBlock(name, idx, key))
+            idx += 1
+
+    def get_block(self, timeout=None):
+        """
+        Takes the next finished key block from the shared queue, blocking until one is available.
+        :param timeout: Seconds to wait or None to wait indefinitely
+        :return: KeyBlock object
+        :raises queue.Empty: If no block is finished within timeout
+        """
+        return self.blocks.get(timeout=timeout)
+
+    def wait(self):
+        """
+        Waits until all scheduled nodes finished their rounds. Exceptions raised by a node are re-raised.
+        """
+        for f in self._futures:
+            f.result()
+
+    def stop(self, wait=True):
+        """
+        Stops all nodes after their current round and shuts down the worker threads.
+        :param wait: Whether to wait for the running rounds to finish
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,198 @@
+"""
+Benchmark of the QKD protocols over the in-process LocalNetwork. Runs sender and receiver nodes end to end for a sweep
+of state sizes and reports key bits per second, rounds per second, time per protocol phase and peak memory.
+
+    $ python -m QNetwork.simulation.benchmark --protocol BB84 --sizes 100 200 400 --rounds 5 --reconciliation Cascade
+"""
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+import warnings
+
+from QNetwork.q_network_channels import QChannel, CAChannel
+from QNetwork.q_network_metrics import Metrics
+from QNetwork.qkd.bb84_qkd import BB84SenderNode, BB84ReceiverNode
+from QNetwork.qkd.diqkd import DIQKDSenderNode, DIQKDReceiverNode
+from QNetwork.qkd.reconciliation import RECONCILER_CLASSES
+from QNetwork.simulation.local import LocalNetwork, LocalQubit
+
+PHASES = ('share_q_states', 'should_abort', 'reconcile', 'generate_key')
+DEFAULT_ERRORS = {'BB84': 0.0, 'DIQKD': 0.1}
+DIQKD_WARNING = "Simulated DIQKD rounds abort every time: the receiver's CHSH bases 0 and 1 measure along the same " \
+                "axis (the Z of basis 1 does not change the outcome), so the CHSH winning probability (about 0.68) " \
+                "is below the bound 0.5 + 1 / (2 sqrt(2)) minus the tolerated error. Besides, the abort test takes " \
+                "the share of mismatching test values for the share of matching ones. Results show the cost of the " \
+                "rounds, not a key rate."
+
+
+def warn_about_protocol(protocol):
+    """
+    Warns if the protocol cannot produce key in the simulation, so its results are not mistaken for a key rate.
+    :param protocol: 'BB84' or 'DIQKD'
+    """
+    if protocol == 'DIQKD':
+        warnings.warn(DIQKD_WARNING, RuntimeWarning, stacklevel=3)
+
+
+def make_nodes(protocol, network, n, error, reconciliation=None):
+    """
+    Creates a sender (Alice) and receiver (Bob) node pair connected via the local network.
+    :param protocol: 'BB84' or 'DIQKD'
+    :param network: LocalNetwork object
+    :param n: Number of states per round
+    :param error: Tolerated error of the protocol
+    :param reconciliation: Name of the error reconciliation (see RECONCILER_CLASSES), None to skip it
+    :return: Tuple of sender and receiver node
+    """
+    def channels(name, other):
+        return QChannel(network.cqc_connection(name), LocalQubit, other), CAChannel(network.cac_client(name), other)
+
+    if protocol == 'BB84':
+        sender = BB84SenderNode(*channels('Alice', 'Bob'), error, n)
+        receiver = BB84ReceiverNode(*channels('Bob', 'Alice'), error)
+    elif protocol == 'DIQKD':
+        sender = DIQKDSenderNode(*channels('Alice', 'Bob'), error, n)
+        receiver = DIQKDReceiverNode(*channels('Bob', 'Alice'), error)
+    else:
+        raise ValueError("Unknown protocol {}.".format(protocol))
+
+    sender.maximize_key_bits = receiver.maximize_key_bits = True
+    if reconciliation is not None:
+        sender.reconciler = RECONCILER_CLASSES[reconciliation]()
+        receiver.reconciler = RECONCILER_CLASSES[reconciliation]()
+    return sender, receiver
+
+
+def run_round(node, timings, outcomes=None):
+    """
+    Runs a single QKD round like try_generate_key and adds the time of each phase to timings. The phases are timed by
+    fresh metrics the node records into during the round.
+    :param outcomes: List the abort decision and the error rate of the round are appended to (as a tuple), if given
+    :return: Key of the round ([] if aborted or the reconciliation failed)
+    """
+    metrics, node.metrics = node.metrics, Metrics()
+    try:
+        node.share_q_states()
+        key = node.distill_key()
+        phases = node.metrics.summary()
+    finally:
+        node.metrics = metrics
+
+    for phase in PHASES:
+        if phase in phases:
+            timings[phase] += phases[phase]['duration']
+    if outcomes is not None:
+        # Only rounds passing the abort test are reconciled
+        outcomes.append(('reconcile' not in phases, node.error_rate))
+    return key
+
+
+def run_rounds(sender, receiver, rounds):
+    """
+    Runs rounds QKD rounds, the receiver on a separate thread.
+    :return: Tuple of the sender's keys, the receiver's keys, the phase timings of the sender and the sender's outcome
+             of each round (tuple of whether it aborted and the measured error rate)
+    """
+    sender_timings = dict.fromkeys(PHASES, 0.0)
+    sender_outcomes = []
+    receiver_timings = dict.fromkeys(PHASES, 0.0)
+    receiver_keys = []
+    failures = []
+
+    def run_receiver():
+        try:
+            for _ in range(rounds):
+                receiver_keys.append(run_round(receiver, receiver_timings))
+        except Exception as e:
+            failures.append(e)
+
+    thread = threading.Thread(target=run_receiver)
+    thread.start()
+    sender_keys = [run_round(sender, sender_timings, sender_outcomes) for _ in range(rounds)]
+    thread.join()
+    if failures:
+        raise failures[0]
+
+    return sender_keys, receiver_keys, sender_timings, sender_outcomes
+
+
+def benchmark(protocol, n, rounds, error=None, seed=None, reconciliation=None):
+    """
+    Runs rounds QKD rounds with n states each and one more round with memory tracing (tracing slows down the
+    simulation, so it is kept out of the timed rounds).
+    :param reconciliation: Name of the error reconciliation (see RECONCILER_CLASSES), None to skip it
+    :return: Dictionary of the results (key_bits_per_s, rounds_per_s, phase times of the sender and peak memory)
+    """
+    warn_about_protocol(protocol)
+    error = DEFAULT_ERRORS[protocol] if error is None else error
+    sender, receiver = make_nodes(protocol, LocalNetwork(seed), n, error, reconciliation)
+
+    start = time.perf_counter()
+    sender_keys, receiver_keys, timings, outcomes = run_rounds(sender, receiver, rounds)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    run_rounds(sender, receiver, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    key_bits = sum(len(k) for k in sender_keys)
+    return {
+        'protocol': protocol,
+        'reconciliation': reconciliation,
+        'state_size': n,
+        'rounds': rounds,
+        'aborted_rounds': sum(1 for aborted, _ in outcomes if aborted),
+        'key_bits': key_bits,
+        'keys_match': [list(k) for k in sender_keys] == [list(k) for k in receiver_keys],
+        'seconds': elapsed,
+        'key_bits_per_s': key_bits / elapsed,
+        'rounds_per_s': rounds / elapsed,
+        'phase_seconds': {p: timings[p] / rounds for p in PHASES},
+        'peak_memory_bytes': peak,
+    }
+
+
+def sweep(protocol, sizes, rounds, error=None, seed=None, reconciliation=None):
+    """
+    :return: List of benchmark results, one per state size
+    """
+    return [benchmark(protocol, n, rounds, error, seed, reconciliation) for n in sizes]
+
+
+def format_table(results):
+    header = '{:>8} {:>7} {:>10} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+        'states', 'rounds', 'bits/s', 'rounds/s', 'share', 'abort', 'reconcile', 'key', 'aborted', 'peak KiB')
+    lines = [header]
+    for r in results:
+        phases = r['phase_seconds']
+        lines.append('{:>8} {:>7} {:>10.1f} {:>10.2f} {:>8.1f}m {:>8.1f}m {:>8.1f}m {:>8.1f}m {:>9} {:>10.0f}'.format(
+            r['state_size'], r['rounds'], r['key_bits_per_s'], r['rounds_per_s'], phases['share_q_states'] * 1e3,
+            phases['should_abort'] * 1e3, phases['reconcile'] * 1e3, phases['generate_key'] * 1e3,
+            r['aborted_rounds'], r['peak_memory_bytes'] / 1024))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark QKD protocols over in-process simulated channels.")
+    parser.add_argument('--protocol', choices=sorted(DEFAULT_ERRORS), default='BB84')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--error', type=float, default=None, help="Tolerated error of the protocol")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the simulated measurements")
+    parser.add_argument('--reconciliation', choices=sorted(RECONCILER_CLASSES), default=None,
+                        help="Error reconciliation of the raw keys")
+    parser.add_argument('--json', help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = sweep(args.protocol, args.sizes, args.rounds, args.error, args.seed, args.reconciliation)
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Eavesdropper simulation on the vectorized network. Eve attacks the qubits Alice sends to Bob (BB84 states or the halves
+of DIQKD's EPR-pairs) batch by batch, and the unchanged BB84 and DIQKD nodes decide whether to abort. Sweeps over
+interception rate, state size and tolerated error run on the sweep core of sweep.py, which computes the points on a
+process pool and shares its result cache, and report how often the attack is detected and how much key survives.
+
+    $ python -m QNetwork.simulation.eve --protocol BB84 --attack InterceptResend --rates 0 0.1 0.2 0.5 --sizes 1000
+"""
+import argparse
+import json
+import math
+
+import numpy as np
+
+from QNetwork.simulation.benchmark import warn_about_protocol, DEFAULT_ERRORS
+from QNetwork.simulation.sweep import DEFAULT_CACHE_DIRECTORY, ResultCache, make_grid, run_point
+from QNetwork.simulation.sweep import sweep as sweep_points
+
+
+class InterceptResendAttack:
+    """
+    Eve intercepts a fraction rate of the qubits (all of them if rate is 1, partial interception otherwise), measures
+    each in a random basis (computational or Hadamard) and resends the state she measured.
+    """
+    def __init__(self, rate=1.0, seed=None):
+        self.rate = rate
+        self.random = np.random.default_rng(seed)
+        self.intercepted = 0
+
+    def __call__(self, qubits):
+        intercepted = qubits.select(self.random.random(len(qubits)) < self.rate)
+        hadamard = intercepted.select(self.random.random(len(intercepted)) < 0.5)
+        hadamard.H()
+        intercepted.measure()
+        hadamard.H()
+        self.intercepted += len(intercepted)
+
+
+class EntanglingAttack:
+    """
+    Eve entangles a probe qubit with a fraction rate of the qubits via a controlled rotation (angle strength * pi) in a
+    random basis and keeps the probe. Tracing out the probe, the attacked qubit is dephased in Eve's basis: it suffers a
+    Z (computational basis) or X (Hadamard basis) error with probability (1 - cos(strength * pi / 2)) / 2, which is what
+    is simulated. Strength 1 is a CNOT, as disturbing as intercept-resend, weaker probes trade information for less
+    disturbance.
+    """
+    def __init__(self, rate=1.0, strength=1.0, seed=None):
+        self.rate = rate
+        self.strength = strength
+        self.random = np.random.default_rng(seed)
+        self.intercepted = 0
+
+    @property
+    def flip_probability(self):
+        return (1 - math.cos(self.strength * math.pi / 2)) / 2
+
+    def __call__(self, qubits):
+        intercepted = qubits.select(self.random.random(len(qubits)) < self.rate)
+        n = len(intercepted)
+        flipped = self.random.random(n) < self.flip_probability
+        hadamard = self.random.random(n) < 0.5
+        intercepted.select(flipped & ~hadamard).Z()
+        intercepted.select(flipped & hadamard).X()
+        self.intercepted += n
+
+
+ATTACK_CLASSES = {'InterceptResend': InterceptResendAttack, 'Entangling': EntanglingAttack}
+
+
+def make_attack(attack, rate, strength=1.0, seed=None):
+    """
+    :param attack: Name of the attack (see ATTACK_CLASSES)
+    :param rate: Fraction of the qubits Eve attacks
+    :param strength: Strength of the entangling attack
+    :param seed: Seed of Eve's random choices
+    :return: Attack object
+    """
+    if attack == 'Entangling':
+        return EntanglingAttack(rate, strength, seed)
+    return ATTACK_CLASSES[attack](rate, seed)
+
+
+def make_attack_grid(protocol, attack, rates, sizes, errors, rounds, strength=1.0, noise=0.0, seed=0):
+    """
+    :return: List of parameter dictionaries of the sweep core (see sweep.make_grid) naming the attack, one per
+             combination of interception rate, tolerated error and state size
+    """
+    points = make_grid(protocol, errors, sizes, noises=(noise,), rounds=rounds, seed=seed)
+    return [dict(point, attack=attack, rate=rate, strength=strength) for rate in rates for point in points]
+
+
+def simulate(protocol, attack, rate, n, error, rounds, strength=1.0, noise=0.0, seed=0):
+    """
+    Runs rounds QKD rounds of n states with Eve attacking the channel.
+    :return: Dictionary of the results (see sweep.run_point), abort_rate is the probability of detecting the attack
+    """
+    warn_about_protocol(protocol)
+    return run_point(make_attack_grid(protocol, attack, [rate], [n], [error], rounds, strength, noise, seed)[0])
+
+
+def sweep(protocol, attack, rates, sizes, errors, rounds, strength=1.0, noise=0.0, workers=None, seed=0, cache=None):
+    """
+    Simulates every combination of interception rate, state size and tolerated error on a pool of worker processes.
+    :param workers: Number of worker processes (defaults to the number of CPUs), 1 runs the simulations in this process
+    :param seed: Seed of the whole sweep, every simulation gets its own seed derived from it (see sweep.point_seed)
+    :param cache: ResultCache object, None computes every simulation
+    :return: List of simulation results in the order of the combinations
+    """
+    points = make_attack_grid(protocol, attack, rates, sizes, errors, rounds, strength, noise, seed)
+    return sweep_points(points, cache, workers)
+
+
+def format_table(results):
+    header = '{:>16} {:>6} {:>8} {:>6} {:>7} {:>9} {:>11} {:>11}'.format(
+        'attack', 'rate', 'states', 'error', 'rounds', 'detected', 'bits/state', 'error rate')
+    lines = [header]
+    for r in results:
+        lines.append('{:>16} {:>6.2f} {:>8} {:>6.2f} {:>7} {:>9.2f} {:>11.4f} {:>11.4f}'.format(
+            r['attack'], r['rate'], r['state_size'], r['error'], r['rounds'], r['abort_rate'],
+            r['key_bits_per_state'], r['error_rate']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate eavesdropping attacks on QKD protocols.")
+    parser.add_argument('--protocol', choices=sorted(DEFAULT_ERRORS), default='BB84')
+    parser.add_argument('--attack', choices=sorted(ATTACK_CLASSES), default='InterceptResend')
+    parser.add_argument('--rates', type=float, nargs='+', default=[0.0, 0.1, 0.2, 0.5, 1.0],
+                        help="Fractions of the qubits Eve attacks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help="States per round")
+    parser.add_argument('--errors', type=float, nargs='+', default=None, help="Tolerated errors of the protocol")
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--strength', type=float, default=1.0, help="Strength of the entangling attack (0 to 1)")
+    parser.add_argument('--noise', type=float, default=0.0, help="Depolarizing noise of the channel")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIRECTORY, help="Directory of the result cache")
+    parser.add_argument('--no-cache', action='store_true', help="Compute every simulation")
+    parser.add_argument('--json', help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    errors = [DEFAULT_ERRORS[args.protocol]] if args.errors is None else args.errors
+    results = sweep(args.protocol, args.attack, args.rates, args.sizes, errors, args.rounds, args.strength,
+                    args.noise, args.workers, args.seed, None if args.no_cache else ResultCache(args.cache))
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import collections
+import math
+import queue
+import threading
+
+import numpy as np
+
+TIMEOUT = 30
+
+_X = np.array([[0, 1], [1, 0]], dtype=np.float64)
+_Z = np.array([[1, 0], [0, -1]], dtype=np.float64)
+_H = np.array([[1, 1], [1, -1]], dtype=np.float64) / math.sqrt(2)
+
+
+def _rot_y(step):
+    # Like SimulaQron, step is in units of 2 pi / 256
+    theta = step * 2 * math.pi / 256
+    c, s = math.cos(theta / 2), math.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=np.float64)
+
+
+class LocalNetwork:
+    """
+    In-process stand-in of SimulaQron and the ipcServer. It hands out CQC compatible quantum connections and
+    ipcCacClient compatible classical connections between named nodes, so the QKD nodes run end to end without any
+    external process. Qubits are simulated as real state vectors of up to two qubits (the gates used by the protocols
+    have real matrices), so EPR-pairs show the correlations of the Bell state Phi+.
+    """
+    def __init__(self, seed=None, timeout=TIMEOUT):
+        self.random = np.random.default_rng(seed)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self._queues = collections.defaultdict(queue.Queue)
+        self._queues_lock = threading.Lock()
+
+    def cqc_connection(self, name):
+        """
+        :param name: Name of the node
+        :return: LocalCQCConnection object of the node
+        """
+        return LocalCQCConnection(self, name)
+
+    def cac_client(self, name):
+        """
+        :param name: Name of the node
+        :return: LocalCACClient object of the node
+        """
+        return LocalCACClient(self, name)
+
+    def put(self, key, item):
+        self._queue(key).put(item)
+
+    def get(self, key):
+        try:
+            return self._queue(key).get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Nothing received on {} within {} seconds.".format(key, self.timeout))
+
+    def _queue(self, key):
+        with self._queues_lock:
+            return self._queues[key]
+
+
+class _Register:
+    """
+    State vector of one or two qubits. Axis i of the reshaped state belongs to qubit ids[i].
+    """
+    def __init__(self, state, ids):
+        self.state = state
+        self.ids = ids
+
+
+class LocalQubit:
+    """
+    Simulated qubit offering the operations of SimulaQron's qubit used by the protocols.
+    """
+    def __init__(self, connection, register=None):
+        self._network = connection.network
+        self._register = register or _Register(np.array([1.0, 0.0]), [self])
+
+    def X(self, print_info=False):
+        self._apply(_X)
+
+    def Z(self, print_info=False):
+        self._apply(_Z)
+
+    def H(self, print_info=False):
+        self._apply(_H)
+
+    def rot_Y(self, step, print_info=False):
+        self._apply(_rot_y(step))
+
+    def measure(self, print_info=False):
+        """
+        Measures the qubit in the computational basis, collapsing the state of an entangled partner.
+        :return: Measurement outcome (0 or 1)
+        """
+        with self._network.lock:
+            register = self._register
+            axis = register.ids.index(self)
+            state = np.moveaxis(register.state.reshape((2,) * len(register.ids)), axis, 0)
+            p_one = float(np.sum(state[1] ** 2))
+            outcome = int(self._network.random.random() < p_one)
+            rest = state[outcome].reshape(-1)
+            register.state = rest / np.linalg.norm(rest)
+            register.ids = register.ids[:axis] + register.ids[axis + 1:]
+            self._register = _Register(np.array([1.0 - outcome, float(outcome)]), [self])
+            return outcome
+
+    def _apply(self, gate):
+        with self._network.lock:
+            register = self._register
+            axis = register.ids.index(self)
+            state = register.state.reshape((2,) * len(register.ids))
+            state = np.moveaxis(np.tensordot(gate, state, axes=([1], [axis])), 0, axis)
+            register.state = state.reshape(-1)
+
+
+class LocalCQCConnection:
+    """
+    CQC compatible quantum connection of a node in a LocalNetwork.
+    """
+    def __init__(self, network, name):
+        self.network = network
+        self.name = name
+        self.closed = False
+
+    def sendQubit(self, q, name, print_info=False):
+        self.network.put(('qubit', name), q)
+
+    def recvQubit(self, print_info=False):
+        return self.network.get(('qubit', self.name))
+
+    def createEPR(self, name, print_info=False):
+        register = _Register(np.array([1.0, 0.0, 0.0, 1.0]) / math.sqrt(2), [])
+        local, remote = LocalQubit(self, register), LocalQubit(self, register)
+        register.ids = [local, remote]
+        self.network.put(('epr', name), remote)
+        return local
+
+    def recvEPR(self, print_info=False):
+        return self.network.get(('epr', self.name))
+
+    def is_alive(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class LocalCACClient:
+    """
+    ipcCacClient compatible classical connection of a node in a LocalNetwork.
+    """
+    def __init__(self, network, name):
+        self.network = network
+        self.name = name
+        self.closed = False
+
+    def sendValueList(self, receiver, data):
+        # Packed byte messages are passed on as they are, lists are copied like a real connection would
+        self.network.put(('values', self.name, receiver), data if isinstance(data, bytes) else list(data))
+
+    def getValueList(self, sender):
+        return self.network.get(('values', sender, self.name))
+
+    def sendAck(self, receiver):
+        self.network.put(('ack', self.name, receiver), True)
+
+    def getAck(self, sender):
+        self.network.get(('ack', sender, self.name))
+
+    def clearServer(self):
+        pass
+
+    def is_alive(self):
+        return not self.closed
+
+    def closeChannel(self):
+        self.closed = True
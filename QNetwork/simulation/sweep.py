@@ -0,0 +1,192 @@
+"""
+Parameter sweep of the QKD protocols over the vectorized network. Every point of a grid over Error, StateSize and
+MaximizeKeyBits (and the noise of the channel) runs sender and receiver nodes for a number of rounds, the points run on
+a pool of worker processes. Results are cached on disk keyed by the parameters of the point, so a repeated sweep only
+computes the points not seen before. Points may also name an eavesdropping attack (see eve.py, which sweeps its attacks
+with the same core and cache).
+
+    $ python -m QNetwork.simulation.sweep --protocol BB84 --errors 0 0.05 0.1 --sizes 200 1000 --noise 0 0.02
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from QNetwork.qkd.randomness import SeededRandomSource
+from QNetwork.simulation.benchmark import make_nodes, run_rounds, warn_about_protocol, DEFAULT_ERRORS
+from QNetwork.simulation.vectorized import VectorizedNetwork
+
+DEFAULT_CACHE_DIRECTORY = '.sweep_cache'
+
+
+def make_grid(protocol, errors, sizes, maximize_key_bits=(True,), noises=(0.0,), loss=0.0, rounds=10, seed=0):
+    """
+    :return: List of parameter dictionaries, one per combination of error, state size, maximize_key_bits and noise
+    """
+    return [{'protocol': protocol, 'error': error, 'state_size': n, 'maximize_key_bits': maximize, 'noise': noise,
+             'loss': loss, 'rounds': rounds, 'seed': seed}
+            for error, n, maximize, noise in itertools.product(errors, sizes, maximize_key_bits, noises)]
+
+
+def point_seed(params):
+    """
+    Derives the seed of a point from all of its parameters, including the seed of the sweep. A point gets the same seed
+    in every sweep it is part of, so its cached result stays valid however the grid around it changes.
+    :param params: Parameter dictionary (see make_grid)
+    :return: numpy SeedSequence of the point
+    """
+    return np.random.SeedSequence(int(ResultCache.key(params), 16))
+
+
+def run_point(params):
+    """
+    Runs the QKD rounds of one point of the grid. If the point names an attack (keys attack, rate and strength, see
+    eve.make_attack) Eve attacks the qubits sent from Alice to Bob.
+    :param params: Parameter dictionary (see make_grid)
+    :return: Dictionary of the parameters and the results (key_bits_per_state, abort_rate, error_rate, ...)
+    """
+    network_seed, eve_seed, sender_seed, receiver_seed = point_seed(params).spawn(4)
+    eavesdropper = None
+    if params.get('attack') is not None:
+        # eve.py builds on this module, so its attacks are only imported when needed
+        from QNetwork.simulation.eve import make_attack
+        eavesdropper = make_attack(params['attack'], params['rate'], params.get('strength', 1.0), eve_seed)
+    network = VectorizedNetwork(network_seed, params['noise'], params['loss'], eavesdropper=eavesdropper)
+    sender, receiver = make_nodes(params['protocol'], network, params['state_size'], params['error'])
+    sender.maximize_key_bits = receiver.maximize_key_bits = params['maximize_key_bits']
+    sender.random_source = SeededRandomSource(sender_seed)
+    receiver.random_source = SeededRandomSource(receiver_seed)
+    if hasattr(receiver, 'qubit_window'):
+        receiver.qubit_window = params['state_size']
+
+    rounds = params['rounds']
+    start = time.perf_counter()
+    sender_keys, receiver_keys, _, outcomes = run_rounds(sender, receiver, rounds)
+    elapsed = time.perf_counter() - start
+
+    key_bits = sum(len(k) for k in sender_keys)
+    result = dict(params)
+    result.update({
+        'key_bits_per_state': key_bits / (rounds * params['state_size']),
+        'key_bits_per_round': key_bits / rounds,
+        'abort_rate': sum(1 for aborted, _ in outcomes if aborted) / rounds,
+        'error_rate': float(np.mean([error_rate for _, error_rate in outcomes])),
+        'seconds_per_round': elapsed / rounds,
+        'keys_match': [list(k) for k in sender_keys] == [list(k) for k in receiver_keys],
+    })
+    if eavesdropper is not None:
+        result['intercepted'] = eavesdropper.intercepted
+    return result
+
+
+class ResultCache:
+    """
+    Results of sweep points stored as one JSON file per point in directory, named by a hash of the parameters.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY):
+        self.directory = directory
+
+    @staticmethod
+    def key(params):
+        """
+        :return: Hex digest identifying the parameters
+        """
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, params):
+        return os.path.join(self.directory, self.key(params) + '.json')
+
+    def get(self, params):
+        """
+        :return: Cached result of the parameters or None
+        """
+        try:
+            with open(self._path(params)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, params, result):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(params)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(result, f)
+        os.replace(path + '.tmp', path)
+
+
+def sweep(points, cache=None, workers=None):
+    """
+    Runs the points not in the cache on a pool of worker processes and stores their results in the cache.
+    :param points: List of parameter dictionaries (see make_grid)
+    :param cache: ResultCache object, None computes every point
+    :param workers: Number of worker processes (defaults to the number of CPUs), 1 runs the points in this process
+    :return: List of results in the order of the points
+    """
+    for protocol in sorted({p['protocol'] for p in points}):
+        warn_about_protocol(protocol)
+
+    results = [None if cache is None else cache.get(p) for p in points]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if workers == 1 or not missing:
+        computed = [run_point(points[i]) for i in missing]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            computed = list(executor.map(run_point, [points[i] for i in missing]))
+
+    for i, result in zip(missing, computed):
+        results[i] = result
+        if cache is not None:
+            cache.put(points[i], result)
+    return results
+
+
+def format_table(results):
+    header = '{:>6} {:>8} {:>8} {:>6} {:>7} {:>11} {:>10} {:>11}'.format(
+        'error', 'states', 'maximize', 'noise', 'rounds', 'bits/state', 'abort', 'ms/round')
+    lines = [header]
+    for r in results:
+        lines.append('{:>6.3f} {:>8} {:>8} {:>6.3f} {:>7} {:>11.4f} {:>10.2f} {:>11.2f}'.format(
+            r['error'], r['state_size'], str(r['maximize_key_bits']), r['noise'], r['rounds'], r['key_bits_per_state'],
+            r['abort_rate'], r['seconds_per_round'] * 1e3))
+    return '\n'.join(lines)
+
+
+def _boolean(value):
+    if value.lower() not in ('true', 'false'):
+        raise argparse.ArgumentTypeError("Expected true or false, got {}.".format(value))
+    return value.lower() == 'true'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep QKD parameters over the vectorized local network.")
+    parser.add_argument('--protocol', choices=sorted(DEFAULT_ERRORS), default='BB84')
+    parser.add_argument('--errors', type=float, nargs='+', default=None, help="Tolerated errors of the protocol")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 1000], help="States per round")
+    parser.add_argument('--maximize-key-bits', type=_boolean, nargs='+', default=[True])
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0], help="Depolarizing noise of the channel")
+    parser.add_argument('--loss', type=float, default=0.0, help="Loss of the channel")
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIRECTORY, help="Directory of the result cache")
+    parser.add_argument('--no-cache', action='store_true', help="Compute every point")
+    parser.add_argument('--json', help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    errors = [DEFAULT_ERRORS[args.protocol]] if args.errors is None else args.errors
+    points = make_grid(args.protocol, errors, args.sizes, args.maximize_key_bits, args.noise, args.loss, args.rounds,
+                       args.seed)
+    results = sweep(points, None if args.no_cache else ResultCache(args.cache), args.workers)
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Vectorized in-process quantum backend. Qubits are handled in batches of numpy arrays instead of one Python object per
+qubit, which makes rounds of millions of qubits feasible. QChannel uses the batch interface of the connection (see
+QChannel._supports_batches), the single qubit interface of LocalCQCConnection stays available.
+
+The protocols only use gates with real matrices (X, Z, H, rot_Y), so single qubits are real 2-vectors. An EPR-pair is
+kept as the real local operations applied to each half of |Phi+>: measuring one half gives a uniform outcome a and
+leaves the other half in the state U_other U_self^T |a>, which is then tracked as a single qubit.
+
+Transmission is noisy if configured: with probability noise a qubit suffers a random Pauli error (depolarizing
+channel) and with probability loss it is lost. The protocols have no notion of loss, so a lost qubit is replaced by a
+maximally mixed one (a random basis state), which shows as random outcomes. An eavesdropper (see simulation/eve.py)
+can be placed on the network to attack each transmitted batch before the channel errors apply.
+"""
+import threading
+
+import numpy as np
+
+from QNetwork.simulation.local import LocalNetwork, LocalCQCConnection, _X, _Z, _H, _rot_y
+
+_networks = {}
+_networks_lock = threading.Lock()
+
+_PAULIS = np.array([_X, _Z, _X @ _Z])
+
+
+class _Register:
+    """
+    Qubits created together (fresh qubits or both halves of EPR-pairs). Slots of entangled qubits hold the local
+    operation applied to them and the slot of their partner, other slots hold the state vector.
+    """
+    def __init__(self, vectors, unitaries=None, partners=None):
+        n = len(vectors)
+        self.vectors = vectors
+        self.unitaries = np.broadcast_to(np.eye(2), (n, 2, 2)).copy() if unitaries is None else unitaries
+        self.partners = np.full(n, -1, dtype=np.intp) if partners is None else partners
+        self.entangled = self.partners >= 0
+
+    @classmethod
+    def fresh(cls, n):
+        vectors = np.zeros((n, 2))
+        vectors[:, 0] = 1.0
+        return cls(vectors)
+
+    @classmethod
+    def epr_pairs(cls, n):
+        partners = np.concatenate((np.arange(n, 2 * n), np.arange(n)))
+        return cls(np.zeros((2 * n, 2)), partners=partners)
+
+    def apply(self, gates, slots):
+        """
+        Applies gates (one 2x2 matrix or one per slot) to the qubits in slots.
+        """
+        gates = np.broadcast_to(gates, (len(slots), 2, 2))
+        entangled = self.entangled[slots]
+        s = slots[entangled]
+        self.unitaries[s] = gates[entangled] @ self.unitaries[s]
+        s = slots[~entangled]
+        self.vectors[s] = np.einsum('nij,nj->ni', gates[~entangled], self.vectors[s])
+
+    def measure(self, slots, random):
+        """
+        Measures the qubits in slots in the computational basis.
+        :return: uint8 array of outcomes
+        """
+        outcomes = np.empty(len(slots), dtype=np.uint8)
+        # Both halves of a pair may be measured in one call, the first half collapses the second
+        first = self.entangled[slots] & ~self._partner_precedes(slots)
+        outcomes[first] = self._measure_entangled(slots[first], random)
+        rest = ~first
+        outcomes[rest] = self._measure_single(slots[rest], random)
+        return outcomes
+
+    def _partner_precedes(self, slots):
+        position = np.full(len(self.partners), len(slots), dtype=np.intp)
+        position[slots] = np.arange(len(slots))
+        return position[self.partners[slots]] < np.arange(len(slots))
+
+    def _measure_entangled(self, slots, random):
+        outcomes = (random.random(len(slots)) < 0.5).astype(np.uint8)
+        partners = self.partners[slots]
+        rows = self.unitaries[slots, outcomes]
+        self.vectors[partners] = np.einsum('nij,nj->ni', self.unitaries[partners], rows)
+        self.entangled[slots] = self.entangled[partners] = False
+        self._collapse(slots, outcomes)
+        return outcomes
+
+    def _measure_single(self, slots, random):
+        outcomes = (random.random(len(slots)) < self.vectors[slots, 1] ** 2).astype(np.uint8)
+        self._collapse(slots, outcomes)
+        return outcomes
+
+    def _collapse(self, slots, outcomes):
+        self.vectors[slots] = 0.0
+        self.vectors[slots, outcomes] = 1.0
+
+    def lose(self, slots, random):
+        """
+        Replaces the qubits in slots by random basis states. Partners of lost halves of EPR-pairs become random basis
+        states as well.
+        """
+        partners = self.partners[slots][self.entangled[slots]]
+        affected = np.concatenate((slots, partners))
+        self.entangled[affected] = False
+        self._collapse(affected, (random.random(len(affected)) < 0.5).astype(np.uint8))
+
+
+class QubitBatch:
+    """
+    Batch of qubits offering the single qubit operations of SimulaQron's qubit, applied to every qubit of the batch.
+    The qubits of a batch may belong to several registers (segments).
+    """
+    def __init__(self, network, segments):
+        self._network = network
+        self._segments = [(r, s) for r, s in segments if len(s)]
+
+    def __len__(self):
+        return sum(len(s) for _, s in self._segments)
+
+    def select(self, mask):
+        """
+        :param mask: Boolean array with an entry per qubit of the batch
+        :return: QubitBatch of the selected qubits, operations on it apply to the qubits of this batch
+        """
+        mask = np.asarray(mask, dtype=bool)
+        segments, start = [], 0
+        for register, slots in self._segments:
+            segments.append((register, slots[mask[start:start + len(slots)]]))
+            start += len(slots)
+        return QubitBatch(self._network, segments)
+
+    def split(self, count):
+        """
+        :return: Tuple of QubitBatches of the first count qubits and the remaining ones
+        """
+        head, tail, left = [], [], count
+        for register, slots in self._segments:
+            head.append((register, slots[:left]))
+            tail.append((register, slots[left:]))
+            left = max(0, left - len(slots))
+        return QubitBatch(self._network, head), QubitBatch(self._network, tail)
+
+    def X(self, print_info=False):
+        self._apply(_X)
+
+    def Z(self, print_info=False):
+        self._apply(_Z)
+
+    def H(self, print_info=False):
+        self._apply(_H)
+
+    def rot_Y(self, step, print_info=False):
+        self._apply(_rot_y(step))
+
+    def measure(self, print_info=False):
+        """
+        :return: uint8 array of the outcomes in the order of the batch
+        """
+        with self._network.lock:
+            if not self._segments:
+                return np.empty(0, dtype=np.uint8)
+            return np.concatenate([r.measure(s, self._network.random) for r, s in self._segments])
+
+    def _apply(self, gate):
+        with self._network.lock:
+            for register, slots in self._segments:
+                register.apply(gate, slots)
+
+    def transmit(self, noise, loss):
+        """
+        Applies the errors of a noisy and lossy transmission.
+        """
+        random = self._network.random
+        with self._network.lock:
+            for register, slots in self._segments:
+                if noise > 0:
+                    hit = random.random(len(slots)) < noise
+                    register.apply(_PAULIS[random.integers(0, 3, int(hit.sum()))], slots[hit])
+                if loss > 0:
+                    register.lose(slots[random.random(len(slots)) < loss], random)
+
+
+class VectorizedNetwork(LocalNetwork):
+    """
+    LocalNetwork whose quantum connections also offer the batch interface used by QChannel. If eavesdropper is set, it
+    is called with every transmitted QubitBatch.
+    """
+    def __init__(self, seed=None, noise=0.0, loss=0.0, timeout=30, eavesdropper=None):
+        super().__init__(seed, timeout)
+        self.noise = noise
+        self.loss = loss
+        self.eavesdropper = eavesdropper
+
+    def cqc_connection(self, name):
+        return VectorizedCQCConnection(self, name)
+
+
+class VectorizedCQCConnection(LocalCQCConnection):
+    """
+    Quantum connection of a node in a VectorizedNetwork.
+    """
+    def __init__(self, network, name):
+        super().__init__(network, name)
+        self._pending = None
+
+    def allocate_qubits(self, n):
+        """
+        :return: QubitBatch of n fresh qubits in state |0>
+        """
+        return QubitBatch(self.network, [(_Register.fresh(n), np.arange(n))])
+
+    def send_qubits(self, qubits, name):
+        if self.network.eavesdropper is not None:
+            self.network.eavesdropper(qubits)
+        qubits.transmit(self.network.noise, self.network.loss)
+        self.network.put(('qubits', name), qubits)
+
+    def receive_qubits(self, n):
+        """
+        :return: QubitBatch of the next n qubits sent to this node
+        """
+        return self._receive(n)
+
+    def create_epr_pairs(self, name, n):
+        """
+        Creates n EPR-pairs and sends one half of each pair to name.
+        :return: QubitBatch of the other halves
+        """
+        register = _Register.epr_pairs(n)
+        self.send_qubits(QubitBatch(self.network, [(register, np.arange(n, 2 * n))]), name)
+        return QubitBatch(self.network, [(register, np.arange(n))])
+
+    def receive_epr_pairs(self, n):
+        """
+        :return: QubitBatch of the next n halves of EPR-pairs sent to this node
+        """
+        return self._receive(n)
+
+    def _receive(self, n):
+        # Batches arrive as sent, a receiver may take them in chunks of a different size
+        batches = []
+        pending, self._pending = self._pending, None
+        while True:
+            if pending is None:
+                pending = self.network.get(('qubits', self.name))
+            if len(pending) >= n:
+                head, tail = pending.split(n)
+                if len(tail):
+                    self._pending = tail
+                batches.append(head)
+                return QubitBatch(self.network, [seg for b in batches for seg in b._segments])
+            batches.append(pending)
+            n -= len(pending)
+            pending = None
+
+
+def get_local_network(seed=None, noise=0.0, loss=0.0):
+    """
+    Returns the vectorized network of the process with the given parameters, created once per combination of them.
+    Nodes of a channel have to run in the same process and use the same parameters to be connected by it (i.e.: on
+    separate threads).
+    :param seed: Seed of the simulated measurements, noise and loss
+    :param noise: Depolarizing noise of the channel
+    :param loss: Loss of the channel
+    :return: VectorizedNetwork object
+    """
+    key = (seed, noise, loss)
+    with _networks_lock:
+        network = _networks.get(key)
+        if network is None:
+            network = _networks[key] = VectorizedNetwork(seed, noise, loss)
+        return network
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import unittest
+
+from QNetwork.q_network_async import AsyncCAChannel
+from QNetwork.q_network_impl import START_KEY_GENERATION_TAG, END_KEY_GENERATION_TAG, END_STREAM_TAG, SecureChannel
+from QNetwork.q_network_key_pool import KeyPool
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class QChannelSpy:
+    def __init__(self):
+        self.received_close = False
+        self.received_discard = False
+
+    def close(self):
+        self.received_close = True
+
+    def discard(self):
+        self.received_discard = True
+
+
+class CAChannelFake:
+    def __init__(self, *received_data):
+        self.received_data = list(received_data)
+        self.record = []
+        self.is_new = True
+        self.received_receive_ack = False
+        self.received_send_ack = False
+        self.received_clear = False
+        self.received_release = False
+        self.received_discard = False
+
+    def send(self, data):
+        self.record.append(data)
+
+    def send_bytes(self, data):
+        self.send(data)
+
+    def send_integers(self, values):
+        self.positions_sent = list(values)
+
+    def receive_integers(self):
+        # The other end holds the same key as this end
+        return self.positions_sent[2:4] + self.positions_sent[0:2]
+
+    def receive(self):
+        return self.received_data.pop(0)
+
+    def receive_bytes(self):
+        return bytes(self.receive())
+
+    def send_ack(self):
+        self.received_send_ack = True
+
+    def receive_ack(self):
+        self.received_receive_ack = True
+
+    def clear(self):
+        self.received_clear = True
+
+    def release(self):
+        self.received_release = True
+
+    def discard(self):
+        self.received_discard = True
+
+
+class NetworkFactoryStub:
+    pipeline_depth = 1
+
+    def __init__(self, q_channel, ca_channel):
+        self.q_channel = q_channel
+        self.ca_channel = ca_channel
+
+    def make_q_channel(self, from_name, to_name):
+        return self.q_channel
+
+    def make_ca_channel(self, from_name, to_name):
+        return self.ca_channel
+
+    def get_round_size_policy(self, writer, reader):
+        return None
+
+    def get_key_pool(self, local, writer, reader):
+        return KeyPool()
+
+    def make_sender_node(self, q_channel, ca_channel):
+        return NodeStub()
+
+    def make_receiver_node(self, q_channel, ca_channel):
+        return NodeStub()
+
+
+class NodeStub:
+    def try_generate_key(self):
+        return [1] * 8
+
+
+class BlockingConnection:
+    def __init__(self, data):
+        self.data = data
+        self.release = threading.Event()
+
+    def receive(self):
+        self.release.wait()
+        return self.data
+
+
+def to_bytes(tag):
+    return SecureChannel.to_bytes(tag)
+
+
+class TestAsyncSecureChannel(unittest.TestCase):
+    def setUp(self):
+        self.q_channel = QChannelSpy()
+        self.sc = SecureChannel('Alice', 'Bob')
+
+    def test_write_in_async_context(self):
+        cac = CAChannelFake()
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def write():
+            async with self.sc as channel:
+                await channel.write("H")
+
+        run(write())
+        self.assertEqual([to_bytes(START_KEY_GENERATION_TAG), to_bytes(END_KEY_GENERATION_TAG), bytes([0b10110111])],
+                         cac.record)
+        self.assertTrue(cac.received_receive_ack)
+        self.assertTrue(self.q_channel.received_close)
+
+    def test_read_in_async_context(self):
+        cac = CAChannelFake(to_bytes(START_KEY_GENERATION_TAG), to_bytes(END_KEY_GENERATION_TAG), [0b10110111])
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def read():
+            async with self.sc as channel:
+                return await channel.read()
+
+        self.assertEqual('H', run(read()))
+        self.assertTrue(cac.received_send_ack)
+
+    def test_read_stream_asynchronously(self):
+        start, end = to_bytes(START_KEY_GENERATION_TAG), to_bytes(END_KEY_GENERATION_TAG)
+        cac = CAChannelFake(start, end, [0xff], start, end, [0xf0], to_bytes(END_STREAM_TAG))
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def read():
+            async with self.sc as channel:
+                return [frame async for frame in channel.read_stream()]
+
+        self.assertEqual([b'\x00', b'\x0f'], run(read()))
+
+    def test_session_messages_are_sent_via_async_ca_channel(self):
+        cac = CAChannelFake()
+        self.sc.session = True
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def write():
+            async with self.sc as channel:
+                self.assertIsInstance(channel.ca_channel, AsyncCAChannel)
+                await channel.write("H")
+                await channel.write("i")
+                self.assertEqual([], cac.record)
+
+        run(write())
+        self.assertEqual(4, len(cac.record[-1]))
+        self.assertTrue(cac.received_receive_ack)
+
+    def test_write_stream_asynchronously(self):
+        cac = CAChannelFake()
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def write():
+            async with self.sc as channel:
+                await channel.write_stream(b'\x00\x0f', frame_size=1)
+
+        run(write())
+        frames = [r for r in cac.record if len(r) == 1]
+        self.assertEqual([b'\xff', b'\xf0'], frames)
+        self.assertEqual(to_bytes(END_STREAM_TAG), cac.record[-1])
+
+    def test_exception_in_async_context_clears_channel(self):
+        cac = CAChannelFake()
+        self.sc.network_factory = NetworkFactoryStub(self.q_channel, cac)
+
+        async def fail():
+            async with self.sc:
+                raise ValueError("Some Error")
+
+        with self.assertRaises(ValueError):
+            run(fail())
+        self.assertTrue(cac.received_clear)
+        self.assertTrue(cac.received_discard)
+
+
+class TestAsyncCAChannel(unittest.TestCase):
+    def test_receive_on_many_channels_concurrently(self):
+        connections = [BlockingConnection([i]) for i in range(20)]
+        channels = [AsyncCAChannel(c) for c in connections]
+
+        async def receive_all():
+            pending = [asyncio.ensure_future(c.receive()) for c in channels]
+            await asyncio.sleep(0.05)
+            self.assertFalse(any(p.done() for p in pending))
+            for c in connections:
+                c.release.set()
+            return await asyncio.gather(*pending)
+
+        self.assertEqual([[i] for i in range(20)], run(receive_all()))
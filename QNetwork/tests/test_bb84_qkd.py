@@ -1,7 +1,7 @@
 import unittest
 
 from QNetwork.qkd.bb84_qkd import BB84Node, BB84SenderNode, BB84ReceiverNode
-from QNetwork.q_network_channels import QState
+from QNetwork.q_network_channels import QState, QStates
 
 
 class QChannelSpy:
@@ -19,6 +19,12 @@ class CACSpy:
     def send(self, data):
         self.data_sent = data
 
+    def send_bits(self, data):
+        self.send(list(data))
+
+    def send_indices(self, indices):
+        self.send(list(indices))
+
 
 class QChannelStub:
     def __init__(self):
@@ -37,6 +43,21 @@ class CACStub:
     def receive(self):
         return self.received
 
+    def receive_bits(self):
+        return self.receive()
+
+    def receive_indices(self):
+        return self.receive()
+
+
+class KeyLengthEstimatorSpy:
+    def __init__(self):
+        self.received_args = None
+
+    def bb84_key_length(self, raw_length, test_length, error_rate, leaked_bits):
+        self.received_args = (raw_length, test_length, error_rate, leaked_bits)
+        return 1
+
 
 class BB84NodeSUT(BB84Node):
     def share_q_states(self):
@@ -60,8 +81,8 @@ class TestBB84Sending(unittest.TestCase):
         self.assertSequenceEqual(self.node._qstates, self.qc.qubits_sent)
 
     def test_send_test_values(self):
-        self.node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0)]
-        self.node._test_set = {0, 2}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0)])
+        self.node._test_set = [0, 2]
         self.node._send_test_values()
         self.assertSequenceEqual([1, 0], self.cac.data_sent)
 
@@ -72,10 +93,16 @@ class TestBB84Operations(unittest.TestCase):
 
     def test_discard_invalid_states(self):
         self.node._other_bases = [1, 1, 0, 0]
-        self.node._qstates = [QState(1, 0)] * 4
+        self.node._qstates = QStates.from_list([QState(1, 0)] * 4)
         self.node._discard_states()
         self.assertSequenceEqual([QState(1, 0)] * 2, self.node._qstates)
 
+    def test_discard_states_with_mismatching_bases(self):
+        self.node._other_bases = [1, 0, 0, 1]
+        self.node._qstates = QStates([1, 0, 1, 0], [1, 1, 0, 0])
+        self.node._discard_states()
+        self.assertEqual(QStates([1, 1], [1, 0]), self.node._qstates)
+
     def test_calculate_error_success(self):
         self.node._test_values = [1, 0, 0, 1]
         self.node._other_test_values = [1, 0, 0, 1]
@@ -87,16 +114,26 @@ class TestBB84Operations(unittest.TestCase):
         self.assertEqual(0.25, self.node._calculate_error())
 
     def test_privacy_amplification_even(self):
-        self.node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)]
-        self.node._test_set = {0, 2}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)])
+        self.node._test_set = [0, 2]
         self.node._seed = [1, 1, 0]
         self.assertEqual([0], self.node._privacy_amplification())
 
     def test_privacy_amplification_odd(self):
-        self.node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)]
-        self.node._test_set = {0, 2}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)])
+        self.node._test_set = [0, 2]
+        self.node._seed = [1, 1, 1]
+        self.assertEqual([1], self.node._privacy_amplification())
+
+    def test_estimate_key_length_from_test_statistics(self):
+        self.node.maximize_key_bits = True
+        self.node.key_length_estimator = KeyLengthEstimatorSpy()
+        self.node._qstates = QStates.from_list([QState(1, 0)] * 5)
+        self.node._test_set = [0, 2]
+        self.node.matching_error = 0.5
         self.node._seed = [1, 1, 1]
         self.assertEqual([1], self.node._privacy_amplification())
+        self.assertEqual((3, 2, 0.5, None), self.node.key_length_estimator.received_args)
 
 
 class TestBB84Receiving(unittest.TestCase):
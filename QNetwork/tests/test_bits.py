@@ -0,0 +1,61 @@
+import unittest
+
+from QNetwork.q_network_bits import pack_bits, unpack_bits, xor_bytes, BitBuffer
+
+
+class TestBitPacking(unittest.TestCase):
+    def test_pack_whole_bytes(self):
+        self.assertEqual(b'\x48\xff', pack_bits([0, 1, 0, 0, 1, 0, 0, 0] + [1] * 8))
+
+    def test_pack_pads_last_byte_with_zeros(self):
+        self.assertEqual(b'\xa0', pack_bits([1, 0, 1]))
+
+    def test_unpack_bits(self):
+        self.assertSequenceEqual([0, 1, 0, 0, 1, 0, 0, 0], unpack_bits(b'\x48').tolist())
+
+    def test_unpack_limited_amount_of_bits(self):
+        self.assertSequenceEqual([1, 0, 1], unpack_bits(b'\xa0', 3).tolist())
+
+
+class TestXor(unittest.TestCase):
+    def test_xor_with_key(self):
+        self.assertEqual(b'\xb7', xor_bytes(b'H', b'\xff'))
+
+    def test_surplus_key_is_ignored(self):
+        self.assertEqual(b'\xb7', xor_bytes(b'H', b'\xff\x00\x01'))
+
+    def test_not_enough_key_raises_value_error(self):
+        with self.assertRaises(ValueError) as cm:
+            xor_bytes(b'He', b'\xff')
+
+        self.assertEqual("Not enough key (1) to pad data of length 2.", cm.exception.args[0])
+
+
+class TestBitBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = BitBuffer()
+
+    def test_empty_buffer(self):
+        self.assertEqual(0, len(self.buffer))
+        self.assertEqual(0, self.buffer.byte_length)
+
+    def test_collects_bits_across_extensions(self):
+        self.buffer.extend([1, 1, 1])
+        self.buffer.extend([1, 1, 1])
+        self.assertEqual(0, self.buffer.byte_length)
+        self.buffer.extend([1, 1, 1])
+        self.assertEqual(9, len(self.buffer))
+        self.assertEqual(1, self.buffer.byte_length)
+
+    def test_take_bytes_from_front(self):
+        self.buffer.extend([0, 1, 0, 0, 1, 0, 0, 0] + [1] * 8 + [1])
+        self.assertEqual(b'\x48', self.buffer.take_bytes(1))
+        self.assertEqual(b'\xff', self.buffer.take_bytes(1))
+        self.assertEqual(1, len(self.buffer))
+
+    def test_taking_too_many_bytes_raises_value_error(self):
+        self.buffer.extend([1] * 12)
+        with self.assertRaises(ValueError) as cm:
+            self.buffer.take_bytes(2)
+
+        self.assertEqual("Not enough key (1) to take 2 bytes.", cm.exception.args[0])
@@ -1,7 +1,10 @@
+import socket
 import unittest
 from collections import deque
 
-from QNetwork.q_network_channels import QState, QChannel, CAChannel
+import numpy as np
+
+from QNetwork.q_network_channels import QState, QStates, QChannel, CAChannel, CreditFlowControl, connection_is_alive
 
 
 class QConnectionSpy:
@@ -29,6 +32,7 @@ class CACConnectionSpy:
         self.receiver = ''
         self.sender = ''
         self.sent_data = None
+        self.received_data = None
         self.received_get_call = False
         self.received_clear_call = False
         self.received_close_call = False
@@ -42,6 +46,7 @@ class CACConnectionSpy:
     def getValueList(self, sender):
         self.sender = sender
         self.received_get_call = True
+        return self.received_data
 
     def sendAck(self, receiver):
         self.receiver = receiver
@@ -106,6 +111,34 @@ class ConnectionStub:
         return self.qubits[self.idx - 1]
 
 
+class TestQStates(unittest.TestCase):
+    def setUp(self):
+        self.qstates = QStates([1, 0, 1], [0, 1, 1])
+
+    def test_columns_are_uint8_arrays(self):
+        self.assertEqual(np.uint8, self.qstates.values.dtype)
+        self.assertEqual(np.uint8, self.qstates.bases.dtype)
+
+    def test_from_list(self):
+        self.assertEqual(self.qstates, QStates.from_list([QState(1, 0), QState(0, 1), QState(1, 1)]))
+
+    def test_integer_index_returns_qstate(self):
+        self.assertEqual(QState(0, 1), self.qstates[1])
+
+    def test_mask_returns_qstates(self):
+        self.assertEqual(QStates([1, 1], [0, 1]), self.qstates[np.array([True, False, True])])
+
+    def test_index_array_returns_qstates(self):
+        self.assertEqual(QStates([1, 1], [1, 0]), self.qstates[np.array([2, 0])])
+
+    def test_compare_with_list_of_qstate(self):
+        self.assertEqual([QState(1, 0), QState(0, 1), QState(1, 1)], self.qstates)
+        self.assertNotEqual([QState(1, 0), QState(0, 1)], self.qstates)
+
+    def test_qstate_has_no_instance_dict(self):
+        self.assertFalse(hasattr(QState(0, 0), '__dict__'))
+
+
 class TestQChannelBase(unittest.TestCase):
     def setUp(self):
         self.con = self.make_connection_double()
@@ -191,6 +224,123 @@ class TestQChannelReceiving(TestQChannelBase):
         self.assert_qubit_operations(['Y'], ['Z'], ['H'])
 
 
+class SequenceConnectionStub(ConnectionStub):
+    def __init__(self):
+        super().__init__()
+        self.pending = False
+        self.flushed = []
+        self.measured = []
+        self.qubits_sent = []
+
+    def set_pending(self, pending):
+        self.pending = pending
+
+    def sendQubit(self, qubit, receiver, print_info=True):
+        self.qubits_sent.append(qubit)
+
+    def flush(self):
+        self.flushed.append(len(self.measured) + len(self.qubits_sent))
+        results = [QubitSpy()] + self.measured
+        self.measured = []
+        return results
+
+
+class PendingQubitSpy(QubitSpy):
+    def __init__(self, connection, value=0):
+        super().__init__(value)
+        self.connection = connection
+
+    def measure(self, print_info=True):
+        assert self.connection.pending, "Qubit was measured outside of a sequence"
+        self.connection.measured.append(self.value)
+
+
+class TestQChannelBatches(unittest.TestCase):
+    def setUp(self):
+        self.con = SequenceConnectionStub()
+        self.qc = QChannel(self.con, lambda c: QubitSpy(), 'Bob', batch_size=2)
+
+    def test_receive_batch_returns_outcome_array(self):
+        self.con.received_qubits = [PendingQubitSpy(self.con, v) for v in [0, 1, 1]]
+        values = self.qc.receive_batch([0, 1, 0])
+        self.assertSequenceEqual([0, 1, 1], values.tolist())
+        self.assertEqual(np.uint8, values.dtype)
+
+    def test_measure_in_sequences_of_batch_size(self):
+        self.con.received_qubits = [PendingQubitSpy(self.con, v) for v in [0, 1, 1]]
+        self.qc.receive_epr_batch([0, 1, 0])
+        self.assertSequenceEqual([2, 1], self.con.flushed)
+        self.assertFalse(self.con.pending)
+
+    def test_send_batch_in_sequences_of_batch_size(self):
+        self.qc.send_batch([0, 1, 1], [1, 1, 0])
+        self.assertSequenceEqual([2, 3], self.con.flushed)
+        self.assertSequenceEqual([['H'], ['X', 'H'], ['X']], [q.operations for q in self.con.qubits_sent])
+
+    def test_chunked_loop_without_sequence_support(self):
+        con = ConnectionStub()
+        con.received_qubits = [QubitSpy(0), QubitSpy(1), QubitSpy(1)]
+        qc = QChannel(con, make_qubit_spy, 'Bob', batch_size=2)
+        self.assertSequenceEqual([0, 1, 1], qc.receive_batch([0, 1, 0]).tolist())
+
+
+class CreditChannelFake:
+    def __init__(self, *grants):
+        self.grants = deque([g] for g in grants)
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def receive(self):
+        return self.grants.popleft()
+
+
+class TestCreditFlowControl(unittest.TestCase):
+    def test_receiver_grants_window_initially(self):
+        cac = CreditChannelFake()
+        CreditFlowControl(cac, window=50).open(120)
+        self.assertSequenceEqual([50], cac.sent)
+
+    def test_receiver_grants_no_more_than_expected_qubits(self):
+        fc = CreditFlowControl(CreditChannelFake(), window=50)
+        fc.open(20)
+        self.assertSequenceEqual([20], fc.ca_channel.sent)
+
+    def test_receiver_grants_credit_for_drained_qubits(self):
+        cac = CreditChannelFake()
+        fc = CreditFlowControl(cac, window=50)
+        fc.open(120)
+        fc.release(25)
+        fc.release(25)
+        fc.release(25)
+        fc.release(25)
+        self.assertSequenceEqual([50, 25, 25, 20], cac.sent)
+
+    def test_sender_waits_for_credit(self):
+        fc = CreditFlowControl(CreditChannelFake(2, 3))
+        self.assertEqual(2, fc.acquire(4))
+        self.assertEqual(1, fc.acquire(1))
+        self.assertEqual(2, fc.acquire(4))
+
+    def test_sending_epr_pairs_is_limited_by_credit(self):
+        con = QConnectionSpy(make_qubit_spy)
+        qc = QChannel(con, make_qubit_spy, 'Bob')
+        fc = CreditFlowControl(CreditChannelFake(2, 1))
+        qc.send_epr([0, 1, 0], fc)
+        self.assertEqual(3, len(con.qubits))
+        self.assertEqual(0, len(fc.ca_channel.grants))
+
+    def test_receiving_epr_pairs_grants_credit_per_chunk(self):
+        con = ConnectionStub()
+        con.received_qubits = [QubitSpy(0), QubitSpy(1), QubitSpy(1), QubitSpy(0), QubitSpy(1)]
+        qc = QChannel(con, make_qubit_spy, 'Alice')
+        cac = CreditChannelFake()
+        values = qc.receive_epr_batch([0, 1, 0, 1, 0], CreditFlowControl(cac, window=4))
+        self.assertSequenceEqual([0, 1, 1, 0, 1], values.tolist())
+        self.assertSequenceEqual([4, 1], cac.sent)
+
+
 class TestCAC(unittest.TestCase):
     def test_sending_list_data(self):
         connection = CACConnectionSpy()
@@ -238,3 +388,98 @@ class TestCAC(unittest.TestCase):
         ca = CAChannel(connection, 'Alice')
         ca.close()
         self.assertTrue(connection.received_close_call)
+
+    def test_closed_channel_is_not_alive(self):
+        ca = CAChannel(CACConnectionSpy(), 'Alice')
+        self.assertTrue(ca.is_alive())
+        ca.close()
+        self.assertFalse(ca.is_alive())
+
+    def test_discard_closes_the_channel(self):
+        connection = CACConnectionSpy()
+        CAChannel(connection, 'Alice').discard()
+        self.assertTrue(connection.received_close_call)
+
+
+class SocketConnection:
+    def __init__(self, sock):
+        self._s = sock
+
+
+class TestConnectionLiveness(unittest.TestCase):
+    def setUp(self):
+        self.local, self.remote = socket.socketpair()
+
+    def tearDown(self):
+        self.local.close()
+        self.remote.close()
+
+    def test_open_socket_is_alive(self):
+        self.assertTrue(connection_is_alive(SocketConnection(self.local)))
+
+    def test_socket_with_pending_data_is_alive(self):
+        self.remote.sendall(b'\x00')
+        self.assertTrue(connection_is_alive(SocketConnection(self.local)))
+
+    def test_socket_closed_by_other_end_is_not_alive(self):
+        self.remote.close()
+        self.assertFalse(connection_is_alive(SocketConnection(self.local)))
+
+    def test_closed_socket_is_not_alive(self):
+        self.local.close()
+        self.assertFalse(connection_is_alive(SocketConnection(self.local)))
+
+    def test_ask_connection_with_probe(self):
+        connection = CACConnectionSpy()
+        connection.is_alive = lambda: False
+        self.assertFalse(CAChannel(connection, 'Bob').is_alive())
+
+    def test_legacy_format_before_negotiation(self):
+        connection = CACConnectionSpy()
+        ca = CAChannel(connection, 'Bob')
+        ca.send_bits([1, 0, 1])
+        self.assertSequenceEqual([1, 0, 1], connection.sent_data)
+
+    def test_negotiate_highest_common_format(self):
+        connection = CACConnectionSpy()
+        connection.received_data = [0]
+        ca = CAChannel(connection, 'Bob')
+        self.assertEqual(0, ca.negotiate_format(1))
+        self.assertSequenceEqual([1], connection.sent_data)
+
+    def test_send_packed_bits(self):
+        connection = CACConnectionSpy()
+        ca = CAChannel(connection, 'Bob')
+        ca.format_version = 1
+        ca.send_bits([1, 0, 1])
+        self.assertSequenceEqual([1, 3, 0b10100000], connection.sent_data)
+
+    def test_receive_packed_bits(self):
+        connection = CACConnectionSpy()
+        connection.received_data = [1, 3, 0b10100000]
+        ca = CAChannel(connection, 'Alice')
+        ca.format_version = 1
+        self.assertSequenceEqual([1, 0, 1], ca.receive_bits())
+
+    def test_send_and_receive_coded_indices(self):
+        connection = CACConnectionSpy()
+        ca = CAChannel(connection, 'Bob')
+        ca.format_version = 1
+        ca.send_indices([3, 4, 10])
+        self.assertSequenceEqual([3, 1, 6], connection.sent_data)
+        connection.received_data = connection.sent_data
+        self.assertSequenceEqual([3, 4, 10], ca.receive_indices())
+
+    def test_send_bytes_as_list_in_legacy_format(self):
+        connection = CACConnectionSpy()
+        CAChannel(connection, 'Bob').send_bytes(b'\x01\xff')
+        self.assertEqual([1, 255], connection.sent_data)
+
+    def test_send_and_receive_packed_bytes(self):
+        connection = CACConnectionSpy()
+        ca = CAChannel(connection, 'Bob')
+        ca.format_version = 1
+        ca.send_bytes(bytearray(b'\x01\xff'))
+        self.assertEqual(b'\x01\xff', connection.sent_data)
+        connection.received_data = [1, 255]
+        self.assertEqual(b'\x01\xff', ca.receive_bytes())
@@ -1,8 +1,8 @@
-import random
 import unittest
 
 from QNetwork.qkd.diqkd import DIQKDNode, DIQKDSenderNode, DIQKDReceiverNode
-from QNetwork.q_network_channels import QState
+from QNetwork.q_network_channels import QState, QStates
+from QNetwork.qkd.randomness import SeededRandomSource
 
 
 class QChannelDummy:
@@ -13,11 +13,15 @@ class QChannelSpy:
     def __init__(self):
         self.received_bases = []
 
-    def send_epr(self, bases):
+        self.flow_control = None
+
+    def send_epr(self, bases, flow_control=None):
         self.received_bases = bases
+        self.flow_control = flow_control
 
-    def receive_epr_in(self, bases):
+    def receive_epr_in(self, bases, flow_control=None):
         self.received_bases = bases
+        self.flow_control = flow_control
 
 
 class CACStub:
@@ -27,6 +31,12 @@ class CACStub:
     def receive(self):
         return self.received
 
+    def receive_bits(self):
+        return self.receive()
+
+    def receive_indices(self):
+        return self.receive()
+
     def send(self, data):
         pass
 
@@ -38,6 +48,12 @@ class CACSpy:
     def send(self, data):
         self.data_sent = data
 
+    def send_bits(self, data):
+        self.send(list(data))
+
+    def send_indices(self, indices):
+        self.send(list(indices))
+
 
 class QubitSpy:
     def __init__(self):
@@ -51,6 +67,15 @@ class QubitSpy:
         self.received_Z = True
 
 
+class KeyLengthEstimatorSpy:
+    def __init__(self):
+        self.received_args = None
+
+    def diqkd_key_length(self, raw_length, test_length, win_probability, error_rate, leaked_bits):
+        self.received_args = (raw_length, test_length, win_probability, error_rate, leaked_bits)
+        return 1
+
+
 class DIQKDNodeSUT(DIQKDNode):
     def share_q_states(self):
         pass
@@ -69,15 +94,26 @@ class TestDIQKDEntangledSharing(unittest.TestCase):
         self.node = DIQKDNodeSUT(self.qc, self.cac, 0)
 
     def test_send_entangled_states(self):
-        random.seed(42)
+        self.node.random_source = SeededRandomSource(42)
         self.node._send_q_states(4)
-        self.assertSequenceEqual([0, 0, 1, 0], self.qc.received_bases)
+        self.assertSequenceEqual([1, 0, 1, 0], self.qc.received_bases.tolist())
 
     def test_receive_entangled_states(self):
-        random.seed(7)
+        self.node.random_source = SeededRandomSource(7)
         self.cac.received = [4]
         self.node._receive_q_states()
-        self.assertSequenceEqual([1, 0, 1, 2], self.qc.received_bases)
+        self.assertSequenceEqual([1, 0, 2, 2], self.qc.received_bases.tolist())
+
+    def test_sender_is_limited_by_credit_on_classical_channel(self):
+        self.node._send_q_states(4)
+        self.assertIs(self.cac, self.qc.flow_control.ca_channel)
+
+    def test_receiver_grants_credit_for_its_qubit_window(self):
+        self.node.qubit_window = 10
+        self.cac.received = [4]
+        self.node._receive_q_states()
+        self.assertIs(self.cac, self.qc.flow_control.ca_channel)
+        self.assertEqual(10, self.qc.flow_control.window)
 
 
 class TestDIQKDSending(unittest.TestCase):
@@ -86,15 +122,15 @@ class TestDIQKDSending(unittest.TestCase):
         self.node = DIQKDNodeSUT(None, self.cac, 0)
 
     def test_send_chsh_values(self):
-        self.node._qstates = [QState(1, 0), QState(0, 1), QState(0, 0), QState(1, 1)]
-        self.node._chsh_test_set = {0, 1}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(0, 1), QState(0, 0), QState(1, 1)])
+        self.node._chsh_test_set = [0, 1]
         self.node._send_chsh_test_values()
         self.assertSequenceEqual([1, 0], self.cac.data_sent)
         self.assertSequenceEqual([1, 0], self.node._chsh_test_values)
 
     def test_send_match_values(self):
-        self.node._qstates = [QState(1, 0), QState(0, 1), QState(0, 0), QState(1, 1)]
-        self.node._match_test_set = {0, 1}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(0, 1), QState(0, 0), QState(1, 1)])
+        self.node._match_test_set = [0, 1]
         self.node._send_match_test_values()
         self.assertSequenceEqual([1, 0], self.cac.data_sent)
         self.assertSequenceEqual([1, 0], self.node._match_test_values)
@@ -105,11 +141,11 @@ class TestDIQKDCommonOperations(unittest.TestCase):
         self.node = DIQKDNodeSUT(None, None, 0.1)
 
     def test_calculate_win_probability(self):
-        self.node._qstates = [QState(1, 0), QState(0, 1), QState(1, 1), QState(0, 1), QState(0, 0)]
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(0, 1), QState(1, 1), QState(0, 1), QState(0, 0)])
         self.node._chsh_test_values = [1, 0, 1, 0]
         self.node._other_chsh_test_values = [1, 1, 0, 0]
         self.node._other_bases = [1, 1, 0, 0, 0]
-        self.node._chsh_test_set = {0, 1, 2, 3}
+        self.node._chsh_test_set = [0, 1, 2, 3]
         self.assertAlmostEqual(0.75, self.node._calculate_winning_probability())
 
     def test_calculate_match_error(self):
@@ -130,16 +166,28 @@ class TestDIQKDCommonOperations(unittest.TestCase):
         self.assertFalse(self.node._is_outside_error_bound(0.85, 0.95))
 
     def test_privacy_amplification_even(self):
-        self.node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)]
-        self.node._raw_key_set = {1, 3, 4}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)])
+        self.node._raw_key_set = [1, 3, 4]
         self.node._seed = [1, 1, 0]
         self.assertEqual([0], self.node._privacy_amplification())
 
     def test_privacy_amplification_odd(self):
-        self.node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)]
-        self.node._raw_key_set = {1, 3, 4}
+        self.node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(1, 0)])
+        self.node._raw_key_set = [1, 3, 4]
+        self.node._seed = [1, 1, 1]
+        self.assertEqual([1], self.node._privacy_amplification())
+
+    def test_estimate_key_length_from_chsh_statistics(self):
+        self.node.maximize_key_bits = True
+        self.node.key_length_estimator = KeyLengthEstimatorSpy()
+        self.node._qstates = QStates.from_list([QState(1, 0)] * 5)
+        self.node._raw_key_set = [1, 3, 4]
+        self.node._chsh_test_set = [0, 2]
+        self.node.win_prob = 0.85
+        self.node.matching_error = 0.75
         self.node._seed = [1, 1, 1]
         self.assertEqual([1], self.node._privacy_amplification())
+        self.assertEqual((3, 2, 0.85, 0.25, None), self.node.key_length_estimator.received_args)
 
 
 class TestDIQKDSenderOperations(unittest.TestCase):
@@ -148,15 +196,15 @@ class TestDIQKDSenderOperations(unittest.TestCase):
 
     def test_subset_separation(self):
         self.node._other_bases = [1, 0, 2, 0, 2, 2]
-        self.node._test_set = {0, 1, 2}
-        self.node._qstates = [QState(1, 0), QState(0, 0), QState(1, 0), QState(0, 0), QState(1, 1), QState(0, 0)]
+        self.node._test_set = [0, 1, 2]
+        self.node._qstates = QStates([1, 0, 1, 0, 1, 0], [0, 0, 0, 0, 1, 0])
         self.node._separate_test_subsets()
-        self.assert_test_sets(expected_chsh={0, 1}, expected_match={2}, expected_raw_key={5})
+        self.assert_test_sets(expected_chsh=[0, 1], expected_match=[2], expected_raw_key=[5])
 
     def assert_test_sets(self, expected_chsh, expected_match, expected_raw_key):
-        self.assertEqual(expected_chsh, self.node._chsh_test_set)
-        self.assertEqual(expected_match, self.node._match_test_set)
-        self.assertEqual(expected_raw_key, self.node._raw_key_set)
+        self.assertSequenceEqual(expected_chsh, self.node._chsh_test_set.tolist())
+        self.assertSequenceEqual(expected_match, self.node._match_test_set.tolist())
+        self.assertSequenceEqual(expected_raw_key, self.node._raw_key_set.tolist())
 
 
 class TestDIQKDReceiverOperations(unittest.TestCase):
@@ -180,15 +228,15 @@ class TestDIQKDReceiverOperations(unittest.TestCase):
 
     def test_subset_separation(self):
         self.node._other_bases = [1, 0, 0, 0, 1, 0]
-        self.node._test_set = {0, 1, 2}
-        self.node._qstates = [QState(1, 1), QState(0, 0), QState(1, 2), QState(0, 0), QState(1, 1), QState(0, 2)]
+        self.node._test_set = [0, 1, 2]
+        self.node._qstates = QStates([1, 0, 1, 0, 1, 0], [1, 0, 2, 0, 1, 2])
         self.node._separate_test_subsets()
-        self.assert_test_sets(expected_chsh={0, 1}, expected_match={2}, expected_raw_key={5})
+        self.assert_test_sets(expected_chsh=[0, 1], expected_match=[2], expected_raw_key=[5])
 
     def assert_test_sets(self, expected_chsh, expected_match, expected_raw_key):
-        self.assertEqual(expected_chsh, self.node._chsh_test_set)
-        self.assertEqual(expected_match, self.node._match_test_set)
-        self.assertEqual(expected_raw_key, self.node._raw_key_set)
+        self.assertSequenceEqual(expected_chsh, self.node._chsh_test_set.tolist())
+        self.assertSequenceEqual(expected_match, self.node._match_test_set.tolist())
+        self.assertSequenceEqual(expected_raw_key, self.node._raw_key_set.tolist())
 
 
 class TestDIQKDReceiving(unittest.TestCase):
@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+import unittest
+
+from QNetwork.simulation.eve import InterceptResendAttack, EntanglingAttack, make_attack_grid, simulate, sweep, \
+    format_table
+from QNetwork.simulation.sweep import ResultCache
+from QNetwork.simulation.sweep import sweep as sweep_points
+from QNetwork.simulation.vectorized import VectorizedNetwork
+
+
+class TestAttacks(unittest.TestCase):
+    def transmit(self, attack, n=20000):
+        network = VectorizedNetwork(seed=1, eavesdropper=attack)
+        alice, bob = network.cqc_connection('Alice'), network.cqc_connection('Bob')
+        qubits = alice.allocate_qubits(n)
+        qubits.H()
+        alice.send_qubits(qubits, 'Bob')
+        received = bob.receive_qubits(n)
+        received.H()
+        return received.measure()
+
+    def test_without_interception(self):
+        self.assertEqual(0, self.transmit(InterceptResendAttack(0.0, seed=2)).sum())
+
+    def test_intercept_resend_disturbs_a_quarter(self):
+        attack = InterceptResendAttack(1.0, seed=2)
+        self.assertAlmostEqual(0.25, self.transmit(attack).mean(), delta=0.02)
+        self.assertEqual(20000, attack.intercepted)
+
+    def test_partial_interception(self):
+        self.assertAlmostEqual(0.125, self.transmit(InterceptResendAttack(0.5, seed=2)).mean(), delta=0.02)
+
+    def test_entangling_attack(self):
+        attack = EntanglingAttack(1.0, 0.5, seed=2)
+        self.assertAlmostEqual(attack.flip_probability / 2, self.transmit(attack).mean(), delta=0.02)
+
+    def test_full_strength_entangling_attack_disturbs_like_intercept_resend(self):
+        self.assertAlmostEqual(0.25, self.transmit(EntanglingAttack(1.0, 1.0, seed=2)).mean(), delta=0.02)
+
+
+def without_timing(results):
+    return [{k: v for k, v in r.items() if k != 'seconds_per_round'} for r in results]
+
+
+class TestSimulation(unittest.TestCase):
+    def test_bb84_detects_intercept_resend(self):
+        result = simulate('BB84', 'InterceptResend', 1.0, 1000, 0.05, 3, seed=3)
+        self.assertEqual(1.0, result['abort_rate'])
+        self.assertEqual(0, result['key_bits_per_state'])
+        self.assertAlmostEqual(0.25, result['error_rate'], delta=0.05)
+
+    def test_bb84_without_eve(self):
+        result = simulate('BB84', 'InterceptResend', 0.0, 1000, 0.05, 3, seed=3)
+        self.assertEqual(0.0, result['abort_rate'])
+        self.assertGreater(result['key_bits_per_state'], 0)
+        self.assertTrue(result['keys_match'])
+
+    def test_sweep_is_reproducible(self):
+        first = sweep('BB84', 'Entangling', [0.0, 0.5], [200], [0.05, 0.1], 2, workers=1, seed=4)
+        self.assertEqual([(0.0, 0.05), (0.0, 0.1), (0.5, 0.05), (0.5, 0.1)], [(r['rate'], r['error']) for r in first])
+        second = sweep('BB84', 'Entangling', [0.0, 0.5], [200], [0.05, 0.1], 2, workers=1, seed=4)
+        self.assertEqual(without_timing(first), without_timing(second))
+
+    def test_sweep_on_process_pool(self):
+        results = sweep('BB84', 'InterceptResend', [0.0, 1.0], [200], [0.05], 2, workers=2, seed=4)
+        self.assertEqual([0.0, 1.0], [r['abort_rate'] for r in results])
+
+    def test_share_cache_with_parameter_sweep(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = ResultCache(directory)
+            first = sweep('BB84', 'InterceptResend', [1.0], [200], [0.05], 1, workers=1, seed=4, cache=cache)
+            points = make_attack_grid('BB84', 'InterceptResend', [1.0], [200], [0.05], 1, seed=4)
+            self.assertEqual(first, sweep_points(points, cache, workers=1))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_format_table(self):
+        table = format_table(sweep('BB84', 'InterceptResend', [0.0], [100], [0.05], 1, workers=1, seed=4))
+        self.assertEqual(2, len(table.splitlines()))
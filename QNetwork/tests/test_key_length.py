@@ -0,0 +1,71 @@
+import unittest
+
+from QNetwork.q_network_config import NetworkFactory
+from QNetwork.q_network_settings import NetworkConfig
+from QNetwork.qkd.key_length import FiniteKeyEstimator, binary_entropy
+
+
+class TestBinaryEntropy(unittest.TestCase):
+    def test_entropy(self):
+        self.assertEqual(0.0, binary_entropy(0))
+        self.assertEqual(0.0, binary_entropy(1))
+        self.assertAlmostEqual(1.0, binary_entropy(0.5))
+        self.assertAlmostEqual(0.4690, binary_entropy(0.1), places=4)
+
+
+class TestFiniteKeyEstimator(unittest.TestCase):
+    def setUp(self):
+        self.estimator = FiniteKeyEstimator(security_parameter=1e-10)
+
+    def test_bb84_key_shrinks_with_error_rate(self):
+        clean = self.estimator.bb84_key_length(10000, 10000, 0.0)
+        noisy = self.estimator.bb84_key_length(10000, 10000, 0.02)
+        self.assertGreater(clean, noisy)
+        self.assertLess(clean, 10000)
+
+    def test_bb84_key_grows_with_test_set(self):
+        self.assertGreater(self.estimator.bb84_key_length(10000, 40000, 0.02),
+                           self.estimator.bb84_key_length(10000, 10000, 0.02))
+
+    def test_bb84_leaked_bits_are_subtracted(self):
+        self.assertEqual(self.estimator.bb84_key_length(10000, 10000, 0.0, leaked_bits=1) - 100,
+                         self.estimator.bb84_key_length(10000, 10000, 0.0, leaked_bits=101))
+
+    def test_no_leaked_bits_differ_from_unreconciled_key(self):
+        self.assertGreater(self.estimator.bb84_key_length(10000, 10000, 0.02, leaked_bits=0),
+                           self.estimator.bb84_key_length(10000, 10000, 0.02))
+
+    def test_no_key_from_small_rounds(self):
+        self.assertEqual(0, self.estimator.bb84_key_length(50, 50, 0.0))
+
+    def test_no_key_without_raw_key_or_test_set(self):
+        self.assertEqual(0, self.estimator.bb84_key_length(0, 100, 0.0))
+        self.assertEqual(0, self.estimator.diqkd_key_length(100, 0, 0.85, 0.0))
+
+    def test_diqkd_key_requires_chsh_violation(self):
+        self.assertEqual(0, self.estimator.diqkd_key_length(100000, 50000, 0.75, 0.0))
+        self.assertGreater(self.estimator.diqkd_key_length(100000, 50000, 0.85, 0.0), 0)
+
+    def test_diqkd_key_shrinks_with_error_rate(self):
+        self.assertGreater(self.estimator.diqkd_key_length(100000, 50000, 0.85, 0.0),
+                           self.estimator.diqkd_key_length(100000, 50000, 0.85, 0.02))
+
+
+class TestFiniteKeyConfiguration(unittest.TestCase):
+    def test_reject_rounds_too_small_for_any_key(self):
+        with self.assertRaises(ValueError) as cm:
+            NetworkFactory(NetworkConfig(backend='Local', security_parameter=1e-10))
+
+        self.assertEqual("No key can be extracted from rounds of 200 states with SecurityParameter 1e-10, increase "
+                         "StateSize or MaxStateSize.", cm.exception.args[0])
+
+    def test_large_enough_adaptive_rounds(self):
+        NetworkFactory(NetworkConfig(backend='Local', security_parameter=1e-10, max_state_size=10000))
+
+    def test_reject_small_diqkd_rounds(self):
+        with self.assertRaises(ValueError):
+            NetworkFactory(NetworkConfig(protocol='DIQKD', backend='Local', security_parameter=1e-10,
+                                         max_state_size=5000))
+
+    def test_single_key_bits_need_no_finite_key(self):
+        NetworkFactory(NetworkConfig(backend='Local', maximize_key_bits=False, security_parameter=1e-10))
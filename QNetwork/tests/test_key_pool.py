@@ -0,0 +1,98 @@
+import unittest
+
+from QNetwork.q_network_config import NetworkFactory
+from QNetwork.q_network_key_pool import KeyPool, get_key_pool
+from QNetwork.q_network_settings import NetworkConfig
+
+
+class TestKeyPool(unittest.TestCase):
+    def test_below_high_water_mark(self):
+        pool = KeyPool(high_water_mark=4)
+        pool.extend([1, 1, 1])
+        self.assertTrue(pool.is_below_high_water_mark())
+        pool.extend([1])
+        self.assertFalse(pool.is_below_high_water_mark())
+
+    def test_demand_adds_to_high_water_mark(self):
+        pool = KeyPool(high_water_mark=4)
+        pool.extend([1] * 8)
+        self.assertTrue(pool.is_below_high_water_mark(1))
+        pool.extend([1] * 4)
+        self.assertFalse(pool.is_below_high_water_mark(1))
+
+    def test_clear(self):
+        pool = KeyPool()
+        pool.extend([1] * 9)
+        pool.clear()
+        self.assertEqual(0, len(pool))
+        self.assertEqual((2, 16), pool.position)
+
+    def test_cursors(self):
+        pool = KeyPool()
+        pool.extend([1] * 20)
+        pool.take_bytes(1)
+        self.assertEqual((1, 20), pool.position)
+
+    def test_synchronize_skips_consumed_and_drops_unwritten_key(self):
+        pool = KeyPool()
+        pool.extend([0] * 8 + [1] * 8 + [0] * 8)
+        pool.synchronize(1, 16)
+        self.assertEqual((1, 16), pool.position)
+        self.assertEqual(b'\xff', pool.take_bytes(1))
+        self.assertEqual(0, len(pool))
+
+    def test_moved_cursors_are_not_synchronized(self):
+        pool = KeyPool()
+        self.assertFalse(pool.is_synchronized)
+        pool.synchronize(0, 0)
+        self.assertTrue(pool.is_synchronized)
+        pool.extend([1] * 8)
+        self.assertFalse(pool.is_synchronized)
+        pool.mark_synchronized()
+        self.assertTrue(pool.is_synchronized)
+
+    def test_synchronize_cuts_key_within_a_byte(self):
+        pool = KeyPool()
+        pool.extend([1] * 8 + [1, 0, 1, 0, 1, 1, 1, 1] + [1] * 3)
+        pool.synchronize(1, 12)
+        self.assertEqual((1, 12), pool.position)
+        pool.extend([0] * 4)
+        self.assertEqual(b'\xa0', pool.take_bytes(1))
+
+    def test_synchronize_cuts_pending_bits(self):
+        pool = KeyPool()
+        pool.extend([1] * 8 + [1, 0, 1])
+        pool.synchronize(0, 10)
+        self.assertEqual((0, 10), pool.position)
+        pool.extend([0] * 6)
+        self.assertEqual(b'\xff\x80', pool.take_bytes(2))
+
+    def test_synchronize_to_consumption_beyond_written_key(self):
+        pool = KeyPool()
+        pool.extend([1] * 12)
+        pool.synchronize(3, 40)
+        self.assertEqual((3, 24), pool.position)
+        self.assertEqual(0, len(pool))
+
+
+class TestKeyPoolRegistry(unittest.TestCase):
+    def test_same_direction_shares_pool(self):
+        self.assertIs(get_key_pool('Alice', 'Alice', 'Bob'), get_key_pool('Alice', 'Alice', 'Bob'))
+
+    def test_directions_have_separate_pools(self):
+        self.assertIsNot(get_key_pool('Alice', 'Alice', 'Bob'), get_key_pool('Alice', 'Bob', 'Alice'))
+
+    def test_ends_of_a_direction_have_separate_pools(self):
+        self.assertIsNot(get_key_pool('Alice', 'Alice', 'Bob'), get_key_pool('Bob', 'Alice', 'Bob'))
+
+    def test_networks_have_separate_pools(self):
+        self.assertIsNot(get_key_pool('Alice', 'Alice', 'Bob', 'SimulaQron'),
+                         get_key_pool('Alice', 'Alice', 'Bob', ('Local', None, 0, 0)))
+
+    def test_factories_share_pools_of_the_same_network_only(self):
+        def pool(**config):
+            return NetworkFactory(NetworkConfig(**config)).get_key_pool('Alice', 'Alice', 'Bob')
+
+        self.assertIs(pool(backend='Local', random_seed=1), pool(backend='Local', random_seed=1, state_size=400))
+        self.assertIsNot(pool(backend='Local', random_seed=1), pool(backend='Local', random_seed=2))
+        self.assertIsNot(pool(backend='Local'), pool(backend='SimulaQron'))
@@ -0,0 +1,204 @@
+import base64
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+import uuid
+
+from QNetwork.q_network_channels import QChannel, CAChannel
+from QNetwork.q_network_impl import SecureChannel
+from QNetwork.q_network_key_pool import KeyPool
+from QNetwork.q_network_key_service import KeyBlockBuffer, KeyService, KeyUnavailableError, encode_key_ids, \
+    decode_key_ids
+from QNetwork.qkd.bb84_qkd import BB84SenderNode, BB84ReceiverNode
+from QNetwork.simulation.local import LocalNetwork, LocalQubit
+
+
+class LocalNetworkFactory:
+    pipeline_depth = 1
+    metrics = None
+
+    def __init__(self, network):
+        self.network = network
+        self.key_pools = {}
+
+    def make_q_channel(self, from_name, to_name):
+        return QChannel(self.network.cqc_connection(from_name), LocalQubit, to_name)
+
+    def make_ca_channel(self, from_name, to_name):
+        channel = CAChannel(self.network.cac_client(from_name), to_name)
+        channel.negotiate_format()
+        return channel
+
+    def get_key_pool(self, local, writer, reader):
+        return self.key_pools.setdefault((local, writer, reader), KeyPool())
+
+    def get_round_size_policy(self, writer, reader):
+        return None
+
+    def make_sender_node(self, q_channel, ca_channel):
+        node = BB84SenderNode(q_channel, ca_channel, 0.0, 64)
+        node.maximize_key_bits = True
+        return node
+
+    def make_receiver_node(self, q_channel, ca_channel):
+        node = BB84ReceiverNode(q_channel, ca_channel, 0.0)
+        node.maximize_key_bits = True
+        return node
+
+
+def local_open_channel(network):
+    def open_channel(local, peer, config):
+        channel = SecureChannel(local, peer)
+        channel.network_factory = LocalNetworkFactory(network)
+        return channel
+    return open_channel
+
+
+class TestKeyIDs(unittest.TestCase):
+    def test_round_trip(self):
+        blocks = [('6f9619ff-8b86-d011-b42d-00cf4fc964ff', 123456, 32), ('00000000-0000-4000-8000-000000000001', 0, 1)]
+        self.assertEqual(blocks, decode_key_ids(encode_key_ids(blocks)))
+
+    def test_invalid_id(self):
+        with self.assertRaises(ValueError):
+            encode_key_ids([('no-uuid', 0, 1)])
+
+
+class TestKeyBlockBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = KeyBlockBuffer()
+        self.buffer.extend(b'\x01\x02\x03\x04')
+
+    def test_allocate_from_front(self):
+        self.assertEqual((0, b'\x01\x02'), self.buffer.allocate(2))
+        self.assertEqual((2, b'\x03'), self.buffer.allocate(1))
+        self.assertEqual(1, self.buffer.available)
+
+    def test_allocate_without_enough_key(self):
+        with self.assertRaises(KeyUnavailableError):
+            self.buffer.allocate(5, timeout=0)
+
+    def test_fetch_in_any_order(self):
+        self.assertEqual(b'\x03\x04', self.buffer.fetch(2, 2))
+        self.assertEqual(4, self.buffer.stored)
+        self.assertEqual(b'\x01\x02', self.buffer.fetch(0, 2))
+        self.assertEqual(0, self.buffer.stored)
+
+    def test_fetch_block_only_once(self):
+        self.buffer.fetch(2, 1)
+        with self.assertRaises(KeyUnavailableError):
+            self.buffer.fetch(2, 1)
+        self.buffer.fetch(0, 2)
+        with self.assertRaises(KeyUnavailableError):
+            self.buffer.fetch(0, 2)
+
+    def test_fetch_block_not_generated_yet(self):
+        with self.assertRaises(KeyUnavailableError):
+            self.buffer.fetch(3, 2, timeout=0)
+
+    def test_fetch_all_blocks_or_none(self):
+        with self.assertRaises(KeyUnavailableError):
+            self.buffer.fetch_blocks([(0, 2), (3, 2)], timeout=0)
+        self.assertEqual([b'\x01\x02', b'\x04'], self.buffer.fetch_blocks([(0, 2), (3, 1)]))
+
+    def test_wait_below(self):
+        self.assertFalse(self.buffer.wait_below(4, timeout=0))
+        self.assertTrue(self.buffer.wait_below(5, timeout=0))
+
+    def test_pending_allocation_raises_demand(self):
+        blocks = []
+        waiting = threading.Thread(target=lambda: blocks.append(self.buffer.allocate(6, timeout=5)))
+        waiting.start()
+        self.assertTrue(self.buffer.wait_below(4, timeout=5))
+        self.buffer.extend(b'\x05\x06')
+        waiting.join()
+        self.assertEqual([(0, b'\x01\x02\x03\x04\x05\x06')], blocks)
+
+
+class TestIdleKeyService(unittest.TestCase):
+    def setUp(self):
+        self.service = KeyService('Alice', 'Bob', True, timeout=0)
+        self.service.buffer.extend(bytes(range(16)))
+
+    def tearDown(self):
+        self.service.server.server_close()
+
+    def test_allocate_all_blocks_or_none(self):
+        with self.assertRaises(KeyUnavailableError):
+            self.service.enc_keys(number=3, size=64)
+        self.assertEqual(16, self.service.buffer.available)
+        blocks = self.service.enc_keys(number=2, size=64)
+        self.assertEqual([bytes(range(8)), bytes(range(8, 16))], [key for _, key in blocks])
+
+    def test_key_ids_are_random(self):
+        key_ids = [key_id for key_id, _ in self.service.enc_keys(number=2, size=64)]
+        self.assertEqual(4, uuid.UUID(key_ids[0]).version)
+        self.assertNotEqual(key_ids[0], key_ids[1])
+
+    def test_report_failed_key_generation(self):
+        self.service.error = TimeoutError("Nothing received")
+        with self.assertRaisesRegex(KeyUnavailableError, "Nothing received"):
+            self.service.enc_keys()
+        self.assertEqual("Nothing received", self.service.status()['error'])
+
+    def test_repeat_failed_dec_keys(self):
+        follower = KeyService('Bob', 'Alice', False, timeout=0)
+        self.addCleanup(follower.server.server_close)
+        key_id = str(uuid.UUID(int=1))
+        follower._key_ids[key_id] = 0, 8
+        follower.buffer.extend(bytes(4))
+        with self.assertRaises(KeyUnavailableError):
+            follower.dec_keys([key_id])
+        follower.buffer.extend(bytes(4))
+        self.assertEqual([(key_id, bytes(8))], follower.dec_keys([key_id]))
+
+
+class TestKeyService(unittest.TestCase):
+    def setUp(self):
+        open_channel = local_open_channel(LocalNetwork(seed=2))
+        self.alice = KeyService('Alice', 'Bob', True, low_water_mark=16, refill_size=16, open_channel=open_channel)
+        self.bob = KeyService('Bob', 'Alice', False, open_channel=open_channel)
+        self.bob.start()
+        self.alice.start()
+
+    def tearDown(self):
+        self.alice.stop()
+        self.bob.stop()
+        self.assertIsNone(self.alice.error)
+        self.assertIsNone(self.bob.error)
+
+    def get(self, service, path):
+        url = 'http://{}:{}/api/v1/keys/{}'.format(*service.address, path)
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def assert_status(self, status, service, path):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get(service, path)
+        self.assertEqual(status, context.exception.code)
+
+    def test_both_ends_get_same_key(self):
+        keys = self.get(self.alice, 'Bob/enc_keys?number=3&size=64')['keys']
+        self.assertEqual(3, len(keys))
+        ids = '&'.join('key_ID=' + k['key_ID'] for k in reversed(keys))
+        self.assertEqual(list(reversed(keys)), self.get(self.bob, 'Alice/dec_keys?' + ids)['keys'])
+        self.assertEqual(8, len(base64.b64decode(keys[0]['key'])))
+
+    def test_status(self):
+        status = self.get(self.alice, 'Bob/status')
+        self.assertEqual(('Alice', 'Bob', True), (status['source_KME_ID'], status['target_KME_ID'], status['master']))
+
+    def test_only_master_hands_out_new_keys(self):
+        self.assert_status(400, self.bob, 'Alice/enc_keys')
+
+    def test_invalid_size(self):
+        self.assert_status(400, self.alice, 'Bob/enc_keys?size=7')
+
+    def test_unknown_peer(self):
+        self.assert_status(404, self.alice, 'Eve/status')
+
+    def test_unknown_key_id(self):
+        self.bob.timeout = 0.5
+        self.assert_status(503, self.bob, 'Alice/dec_keys?key_ID={}'.format(uuid.UUID(int=32)))
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from QNetwork.q_network_key_store import HEADER, KeyStore, get_key_store
+
+
+class TestKeyStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'Alice-Bob.key')
+        self.store = KeyStore(self.path, capacity=4)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.store.close()
+        self.store = KeyStore(self.path)
+
+    def test_empty_store(self):
+        self.assertEqual(0, len(self.store))
+        self.assertEqual(0, self.store.byte_length)
+
+    def test_missing_bits_up_to_high_water_mark(self):
+        self.store.close()
+        self.store = KeyStore(self.path, high_water_mark=16)
+        self.store.extend([1] * 8)
+        self.assertEqual(16, self.store.missing_bits(1))
+
+    def test_take_bytes_from_front(self):
+        self.store.extend([0, 1, 0, 0, 1, 0, 0, 0] + [1] * 8)
+        self.assertEqual(b'\x48', self.store.take_bytes(1))
+        self.assertEqual(b'\xff', self.store.take_bytes(1))
+        self.assertEqual(0, len(self.store))
+
+    def test_join_bits_of_several_extends(self):
+        self.store.extend([0, 1, 0])
+        self.assertEqual(0, self.store.byte_length)
+        self.store.extend([0, 1, 0, 0, 0, 1])
+        self.assertEqual((1, 9), (self.store.byte_length, len(self.store)))
+        self.assertEqual(b'\x48', self.store.take_bytes(1))
+
+    def test_not_enough_key(self):
+        self.store.extend([1] * 8)
+        with self.assertRaises(ValueError):
+            self.store.take_bytes(2)
+
+    def test_pad_consumes_key(self):
+        self.store.extend([1] * 16)
+        self.assertEqual(b'\xb7', self.store.pad(b'H'))
+        self.assertEqual(8, len(self.store))
+
+    def test_pad_without_enough_key(self):
+        with self.assertRaises(ValueError):
+            self.store.pad(b'H')
+
+    def test_key_survives_reopening(self):
+        self.store.extend([1] * 8 + [0] * 8 + [1, 0, 1])
+        self.store.take_bytes(1)
+        self.reopen()
+        self.assertEqual((1, 19), self.store.position)
+        self.store.extend([0] * 5)
+        self.assertEqual(b'\x00\xa0', self.store.take_bytes(2))
+
+    def test_reuse_consumed_space(self):
+        for i in range(10):
+            self.store.extend([1, 0] * 12)
+            self.assertEqual(b'\xaa\xaa\xaa', self.store.take_bytes(3))
+        self.assertEqual((30, 240), self.store.position)
+        self.assertEqual(HEADER.size + 4, os.path.getsize(self.path))
+
+    def test_grow_when_full(self):
+        bits = [1, 0, 0, 0, 0, 0, 0, 0] * 10
+        self.store.extend(bits)
+        self.store.extend(bits)
+        self.assertEqual(b'\x80' * 20, self.store.take_bytes(20))
+
+    def test_synchronize_with_other_end(self):
+        self.store.extend([1] * 32)
+        self.store.take_bytes(1)
+        self.store.synchronize(consumed=2, written=24)
+        self.assertEqual((2, 24), self.store.position)
+        self.assertEqual(8, len(self.store))
+
+    def test_synchronize_keeps_own_progress(self):
+        self.store.extend([1] * 16)
+        self.store.take_bytes(1)
+        self.store.synchronize(consumed=0, written=32)
+        self.assertEqual((1, 16), self.store.position)
+
+    def test_clear(self):
+        self.store.extend([1] * 12)
+        self.store.clear()
+        self.assertEqual(0, len(self.store))
+        self.store.extend([0, 1, 0, 0, 1, 0, 0, 0])
+        self.assertEqual(b'\x48', self.store.take_bytes(1))
+
+    def test_reject_other_files(self):
+        other = os.path.join(self.directory, 'other')
+        with open(other, 'wb') as f:
+            f.write(b'\x00' * 64)
+        with self.assertRaises(ValueError):
+            KeyStore(other)
+
+
+class TestKeyStoreRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for store in (get_key_store(self.directory, 'Alice', 'Alice', 'Bob'),
+                      get_key_store(self.directory, 'Alice', 'Bob', 'Alice'),
+                      get_key_store(self.directory, 'Bob', 'Alice', 'Bob')):
+            store.close()
+        shutil.rmtree(self.directory)
+
+    def test_same_direction_shares_store(self):
+        self.assertIs(get_key_store(self.directory, 'Alice', 'Alice', 'Bob'),
+                      get_key_store(self.directory, 'Alice', 'Alice', 'Bob'))
+
+    def test_directions_have_separate_files(self):
+        self.assertIsNot(get_key_store(self.directory, 'Alice', 'Alice', 'Bob'),
+                         get_key_store(self.directory, 'Alice', 'Bob', 'Alice'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'Alice', 'Bob-Alice.key')))
+
+    def test_ends_of_a_direction_have_separate_files(self):
+        self.assertIsNot(get_key_store(self.directory, 'Alice', 'Alice', 'Bob'),
+                         get_key_store(self.directory, 'Bob', 'Alice', 'Bob'))
@@ -0,0 +1,185 @@
+import threading
+import unittest
+
+from QNetwork.q_network_channels import CAChannel, QChannel
+from QNetwork.q_network_metrics import Metrics, measured
+from QNetwork.simulation.benchmark import make_nodes
+from QNetwork.simulation.local import LocalNetwork
+
+
+class ClockStub:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class ConnectionStub:
+    def sendValueList(self, other, data):
+        pass
+
+    def getValueList(self, other):
+        return [1, 2, 3]
+
+    def sendAck(self, other):
+        pass
+
+    def getAck(self, other):
+        pass
+
+
+class QubitStub:
+    def __init__(self, connection):
+        pass
+
+    def X(self):
+        pass
+
+    def measure(self, print_info=False):
+        return 0
+
+
+class QConnectionStub:
+    def sendQubit(self, q, name):
+        pass
+
+    def recvQubit(self):
+        return QubitStub(self)
+
+
+class NodeSpy:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.round_id = None
+        self.ca_channel = CAChannel(ConnectionStub(), 'Bob')
+        self.ca_channel.metrics = metrics
+
+    @measured('share', new_round=True)
+    def share(self):
+        self.ca_channel.send([1, 2])
+        self.inner()
+
+    @measured('inner')
+    def inner(self):
+        self.ca_channel.receive()
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(clock=ClockStub())
+
+    def test_record_phase(self):
+        with self.metrics.phase('share', 1, 'Node', 'Bob'):
+            self.metrics.count('bytes_sent', 5)
+        record = self.metrics.records()[0]
+        self.assertEqual((1, 'Node', 'Bob', 'share', 1.0), (record['round_id'], record['node'], record['peer'],
+                                                           record['phase'], record['duration']))
+        self.assertEqual(5, record['bytes_sent'])
+
+    def test_nested_phases_count_into_enclosing_phase(self):
+        with self.metrics.phase('outer'):
+            self.metrics.count('messages_sent')
+            with self.metrics.phase('inner'):
+                self.metrics.count('messages_sent')
+        inner, outer = self.metrics.records()
+        self.assertEqual(('inner', 1), (inner['phase'], inner['messages_sent']))
+        self.assertEqual(('outer', 2), (outer['phase'], outer['messages_sent']))
+
+    def test_count_outside_of_phases_only_in_totals(self):
+        self.metrics.count('bytes_received', 3)
+        self.assertEqual([], self.metrics.records())
+        self.assertEqual(3, self.metrics.totals()['bytes_received'])
+
+    def test_phases_are_open_per_thread(self):
+        with self.metrics.phase('main'):
+            thread = threading.Thread(target=self.metrics.count, args=('messages_sent',))
+            thread.start()
+            thread.join()
+        self.assertEqual(0, self.metrics.records()[0]['messages_sent'])
+        self.assertEqual(1, self.metrics.totals()['messages_sent'])
+
+    def test_summary(self):
+        for _ in range(2):
+            with self.metrics.phase('share'):
+                self.metrics.count('qubits_sent', 10)
+        summary = self.metrics.summary()['share']
+        self.assertEqual((2, 2.0, 20), (summary['count'], summary['duration'], summary['qubits_sent']))
+
+    def test_keep_latest_records(self):
+        metrics = Metrics(max_records=1)
+        with metrics.phase('first'):
+            pass
+        with metrics.phase('second'):
+            pass
+        self.assertEqual(['second'], [r['phase'] for r in metrics.records()])
+
+    def test_clear(self):
+        with self.metrics.phase('share'):
+            self.metrics.count('bytes_sent')
+        self.metrics.clear()
+        self.assertEqual([], self.metrics.records())
+        self.assertEqual(0, self.metrics.totals()['bytes_sent'])
+
+
+class TestMeasuredNode(unittest.TestCase):
+    def test_record_phases_of_a_round(self):
+        metrics = Metrics()
+        node = NodeSpy(metrics)
+        node.share()
+        node.share()
+        records = metrics.records()
+        self.assertEqual([('inner', 1), ('share', 1), ('inner', 2), ('share', 2)],
+                         [(r['phase'], r['round_id']) for r in records])
+        self.assertEqual(('NodeSpy', 'Bob'), (records[1]['node'], records[1]['peer']))
+        self.assertEqual((2, 3, 1, 1), (records[1]['bytes_sent'], records[1]['bytes_received'],
+                                        records[1]['messages_sent'], records[1]['messages_received']))
+
+    def test_without_metrics(self):
+        node = NodeSpy(None)
+        node.share()
+        self.assertIsNone(node.round_id)
+
+
+class TestChannelCounting(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_count_acks_as_messages(self):
+        ca = CAChannel(ConnectionStub(), 'Bob')
+        ca.metrics = self.metrics
+        ca.send_ack()
+        ca.receive_ack()
+        totals = self.metrics.totals()
+        self.assertEqual((1, 1, 0, 0), (totals['messages_sent'], totals['messages_received'], totals['bytes_sent'],
+                                        totals['bytes_received']))
+
+    def test_count_qubits(self):
+        qc = QChannel(QConnectionStub(), QubitStub, 'Bob')
+        qc.metrics = self.metrics
+        qc.send_batch([0, 1, 0], [0, 0, 0])
+        qc.receive_batch([0, 0])
+        totals = self.metrics.totals()
+        self.assertEqual((3, 2), (totals['qubits_sent'], totals['qubits_received']))
+
+
+class TestEndToEnd(unittest.TestCase):
+    def test_record_bb84_rounds(self):
+        metrics = Metrics()
+        sender, receiver = make_nodes('BB84', LocalNetwork(seed=1), 40, 0.0)
+        for node in (sender, receiver):
+            node.metrics = node.ca_channel.metrics = node.q_channel.metrics = metrics
+
+        thread = threading.Thread(target=receiver.try_generate_key)
+        thread.start()
+        sender.try_generate_key()
+        thread.join()
+
+        summary = metrics.summary()
+        self.assertEqual(2, summary['share_q_states']['count'])
+        self.assertEqual(40, summary['share_q_states']['qubits_sent'])
+        self.assertEqual(40, summary['share_q_states']['qubits_received'])
+        self.assertEqual(summary['_send_seed']['bytes_sent'], summary['_receive_seed']['bytes_received'])
+        self.assertEqual({'share_q_states', '_share_bases', 'should_abort', 'reconcile', 'generate_key', '_send_seed',
+                          '_receive_seed', '_privacy_amplification'}, set(summary))
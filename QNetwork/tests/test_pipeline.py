@@ -0,0 +1,171 @@
+import queue
+import threading
+import unittest
+
+from QNetwork.q_network_channels import CAChannel
+from QNetwork.q_network_impl import SecureChannel
+from QNetwork.q_network_key_pool import KeyPool
+from QNetwork.qkd.pipeline import RoundDemultiplexer, RoundPipeline
+
+
+class LoopbackConnection:
+    def __init__(self):
+        self.inbox = queue.Queue()
+        self.peer = None
+
+    def sendValueList(self, other, data):
+        self.peer.inbox.put(list(data))
+
+    def getValueList(self, other):
+        return self.inbox.get(timeout=5)
+
+    def sendAck(self, other):
+        self.peer.inbox.put('ack')
+
+    def getAck(self, other):
+        assert self.inbox.get(timeout=5) == 'ack'
+
+    def clearServer(self):
+        pass
+
+
+def make_channel_pair():
+    alice, bob = LoopbackConnection(), LoopbackConnection()
+    alice.peer, bob.peer = bob, alice
+    return CAChannel(alice, 'Bob'), CAChannel(bob, 'Alice')
+
+
+class NodeFake:
+    """
+    Exchanges the round's key in both phases, so messages of concurrent rounds interleave on the channel
+    """
+    rounds = 0
+
+    def __init__(self, ca_channel, is_sender):
+        NodeFake.rounds += 1
+        self.ca_channel = ca_channel
+        self.is_sender = is_sender
+        self.key = [NodeFake.rounds % 2] * 4 if is_sender else None
+
+    def share_q_states(self):
+        if self.is_sender:
+            self.ca_channel.send_bits(self.key)
+            self.ca_channel.receive_ack()
+        else:
+            self.key = self.ca_channel.receive_bits()
+            self.ca_channel.send_ack()
+
+    def distill_key(self):
+        if self.is_sender:
+            self.ca_channel.send(len(self.key))
+        else:
+            assert self.ca_channel.receive() == [len(self.key)]
+        return self.key
+
+
+def run_in_thread(func):
+    thread = threading.Thread(target=func)
+    thread.start()
+    return thread
+
+
+class TestRoundDemultiplexer(unittest.TestCase):
+    def test_buffer_messages_of_other_rounds(self):
+        alice, bob = make_channel_pair()
+        sender, receiver = RoundDemultiplexer(alice), RoundDemultiplexer(bob)
+        sender.send(1, [1, 2])
+        sender.send(2, [3])
+        sender.send(1, [4])
+        self.assertEqual([3], receiver.receive(2))
+        self.assertEqual([1, 2], receiver.receive(1))
+        self.assertEqual([4], receiver.receive(1))
+
+    def test_large_round_ids(self):
+        alice, bob = make_channel_pair()
+        RoundDemultiplexer(alice).send(300, [255])
+        self.assertEqual([255], RoundDemultiplexer(bob).receive(300))
+
+
+class TestRoundPipeline(unittest.TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_channel_pair()
+        self.alice.format_version = self.bob.format_version = 1
+
+    def run_pipeline(self, rounds, depth):
+        sent, received = [], []
+        started = []
+
+        def should_continue():
+            started.append(1)
+            return len(started) <= rounds
+
+        sender = RoundPipeline(self.alice, lambda ca: NodeFake(ca, True), depth)
+        receiver = RoundPipeline(self.bob, lambda ca: NodeFake(ca, False), depth)
+        thread = run_in_thread(lambda: receiver.run_receiver(received.append))
+        sender.run_sender(should_continue, sent.append)
+        thread.join(5)
+        return sent, received
+
+    def test_both_ends_get_keys_in_round_order(self):
+        sent, received = self.run_pipeline(rounds=5, depth=2)
+        self.assertEqual(5, len(sent))
+        self.assertEqual(sent, received)
+
+    def test_deeper_pipeline(self):
+        sent, received = self.run_pipeline(rounds=6, depth=3)
+        self.assertEqual(6, len(sent))
+        self.assertEqual(sent, received)
+
+    def test_no_rounds(self):
+        self.assertEqual(([], []), self.run_pipeline(rounds=0, depth=2))
+
+
+class PipelinedFactoryStub:
+    pipeline_depth = 2
+
+    def __init__(self, ca_channel):
+        self.ca_channel = ca_channel
+
+    def make_q_channel(self, from_name, to_name):
+        return QChannelDummy()
+
+    def make_ca_channel(self, from_name, to_name):
+        return self.ca_channel
+
+    def get_round_size_policy(self, writer, reader):
+        return None
+
+    def get_key_pool(self, local, writer, reader):
+        return KeyPool()
+
+    def make_sender_node(self, q_channel, ca_channel):
+        return NodeFake(ca_channel, True)
+
+    def make_receiver_node(self, q_channel, ca_channel):
+        return NodeFake(ca_channel, False)
+
+
+class QChannelDummy:
+    def close(self):
+        pass
+
+
+class TestPipelinedSecureChannel(unittest.TestCase):
+    def test_pipelined_message_exchange(self):
+        alice, bob = make_channel_pair()
+        received = []
+        reader = SecureChannel('Bob', 'Alice')
+        reader.network_factory = PipelinedFactoryStub(bob)
+        writer = SecureChannel('Alice', 'Bob')
+        writer.network_factory = PipelinedFactoryStub(alice)
+
+        thread = run_in_thread(lambda: received.append(self.read_with(reader)))
+        with writer:
+            writer.write("Hello, Bob!")
+        thread.join(5)
+        self.assertEqual(["Hello, Bob!"], received)
+
+    @staticmethod
+    def read_with(sc):
+        with sc:
+            return sc.read()
@@ -0,0 +1,145 @@
+import unittest
+
+from QNetwork.q_network_config import NetworkFactory
+from QNetwork.q_network_pool import ConnectionPool
+from QNetwork.q_network_settings import NetworkConfig
+
+
+class ChannelSpy:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.received_close = False
+        self.bases_mapping = None
+
+    def close(self):
+        self.received_close = True
+
+    def discard(self):
+        self.close()
+
+
+class NegotiatingChannelSpy(ChannelSpy):
+    def __init__(self):
+        super().__init__()
+        self.negotiations = 0
+
+    def negotiate_format(self):
+        self.negotiations += 1
+
+    def is_alive(self):
+        return True
+
+
+class ClockStub:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectSpy:
+    def __init__(self):
+        self.connected = []
+
+    def __call__(self):
+        self.connected.append(ChannelSpy())
+        return self.connected[-1]
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.clock = ClockStub()
+        self.pool = ConnectionPool(max_idle=10, is_healthy=lambda c: c.healthy, clock=self.clock)
+        self.connect = ConnectSpy()
+
+    def test_connect_if_nothing_is_idle(self):
+        channel = self.pool.acquire('Alice', self.connect)
+        self.assertIs(self.connect.connected[0], channel.channel)
+
+    def test_closing_returns_channel_to_pool(self):
+        channel = self.pool.acquire('Alice', self.connect)
+        channel.close()
+        self.assertFalse(self.connect.connected[0].received_close)
+        self.assertEqual(1, self.pool.idle_count('Alice'))
+
+    def test_reuse_released_channel(self):
+        self.pool.acquire('Alice', self.connect).close()
+        channel = self.pool.acquire('Alice', self.connect)
+        self.assertEqual(1, len(self.connect.connected))
+        self.assertIs(self.connect.connected[0], channel.channel)
+
+    def test_only_connected_channels_are_new(self):
+        channel = self.pool.acquire('Alice', self.connect)
+        self.assertTrue(channel.is_new)
+        channel.close()
+        self.assertFalse(self.pool.acquire('Alice', self.connect).is_new)
+
+    def test_channels_are_kept_per_key(self):
+        self.pool.acquire('Alice', self.connect).close()
+        self.pool.acquire('Bob', self.connect)
+        self.assertEqual(2, len(self.connect.connected))
+
+    def test_proxy_forwards_attributes(self):
+        channel = self.pool.acquire('Alice', self.connect)
+        channel.bases_mapping = [1]
+        self.assertEqual([1], self.connect.connected[0].bases_mapping)
+        self.assertTrue(channel.healthy)
+
+    def test_unhealthy_channels_are_closed_instead_of_reused(self):
+        self.pool.acquire('Alice', self.connect).close()
+        self.connect.connected[0].healthy = False
+        self.pool.acquire('Alice', self.connect)
+        self.assertTrue(self.connect.connected[0].received_close)
+        self.assertEqual(2, len(self.connect.connected))
+
+    def test_evict_idle_channels(self):
+        self.pool.acquire('Alice', self.connect).close()
+        self.clock.now = 11
+        self.pool.evict_idle()
+        self.assertTrue(self.connect.connected[0].received_close)
+        self.assertEqual(0, self.pool.idle_count('Alice'))
+
+    def test_keep_recently_used_channels(self):
+        self.pool.acquire('Alice', self.connect).close()
+        self.clock.now = 10
+        self.pool.evict_idle()
+        self.assertFalse(self.connect.connected[0].received_close)
+
+    def test_close_all_idle_channels(self):
+        self.pool.acquire('Alice', self.connect).close()
+        self.pool.acquire('Bob', self.connect).close()
+        self.pool.close()
+        self.assertTrue(all(c.received_close for c in self.connect.connected))
+
+    def test_discarded_channel_is_closed_instead_of_returned(self):
+        self.pool.acquire('Alice', self.connect).discard()
+        self.assertTrue(self.connect.connected[0].received_close)
+        self.assertEqual(0, self.pool.idle_count('Alice'))
+
+
+class TestNetworkFactoryPool(unittest.TestCase):
+    def setUp(self):
+        self.factory = NetworkFactory(NetworkConfig(backend='Local', pool_connections=True))
+
+    def tearDown(self):
+        self.factory.connection_pool.close()
+
+    def test_reuse_live_channel(self):
+        channel = self.factory.make_q_channel('Alice', 'Bob')
+        channel.release()
+        self.assertIs(channel.channel, self.factory.make_q_channel('Alice', 'Bob').channel)
+
+    def test_broken_channel_is_dropped_instead_of_handed_out_again(self):
+        channel = self.factory.make_q_channel('Alice', 'Bob')
+        channel.channel.close()
+        channel.release()
+        self.assertIsNot(channel.channel, self.factory.make_q_channel('Alice', 'Bob').channel)
+        self.assertEqual(0, self.factory.connection_pool.idle_count(('quantum', 'Alice', 'Bob')))
+
+    def test_negotiate_format_of_new_channels_only(self):
+        self.factory._connect_ca_channel = lambda from_name, to_name: NegotiatingChannelSpy()
+        channel = self.factory.make_ca_channel('Alice', 'Bob')
+        channel.release()
+        self.factory.make_ca_channel('Alice', 'Bob')
+        self.assertEqual(1, channel.channel.negotiations)
@@ -0,0 +1,62 @@
+import random
+import unittest
+
+from QNetwork.qkd.privacy_amplification import ChunkedParityExtractor, ToeplitzExtractor
+
+
+class TestChunkedParityExtractor(unittest.TestCase):
+    def setUp(self):
+        self.extractor = ChunkedParityExtractor()
+
+    def test_seed_length_equals_raw_key_length(self):
+        self.assertEqual(5, self.extractor.seed_length(5))
+
+    def test_extract_multi_bit_key(self):
+        self.assertEqual([1, 0, 0], self.extractor.extract([1, 0, 1, 0, 1, 1], [1, 1, 0, 0, 1, 1], 3))
+
+    def test_ragged_last_chunk_is_dropped(self):
+        self.assertEqual([0, 1], self.extractor.extract([1, 1, 1, 1, 1], [1, 1, 0, 1, 1], 2))
+
+    def test_key_is_not_longer_than_requested(self):
+        for k in range(1, 51):
+            self.assertLessEqual(len(self.extractor.extract([1] * 50, [1] * 50, k)), k)
+
+    def test_shorter_seed_truncates_key(self):
+        self.assertEqual([0], self.extractor.extract([1, 1, 1, 1], [1, 1], 2))
+
+    def test_extraction_size_bigger_raw_key_raises_value_error(self):
+        with self.assertRaises(ValueError) as cm:
+            self.extractor.extract([1, 1, 1], [1, 1, 1], 4)
+
+        self.assertEqual("The requested key (4) is too long for the raw key (3).", cm.exception.args[0])
+
+
+class TestToeplitzExtractor(unittest.TestCase):
+    def setUp(self):
+        self.extractor = ToeplitzExtractor()
+
+    def test_seed_length_covers_square_matrix(self):
+        self.assertEqual(9, self.extractor.seed_length(5))
+
+    def test_extract_single_bit(self):
+        self.assertEqual([1], self.extractor.extract([1, 0, 1], [1, 1, 0], 1))
+
+    def test_matches_explicit_matrix_product(self):
+        rnd = random.Random(42)
+        n, k = 200, 120
+        x = [rnd.randint(0, 1) for _ in range(n)]
+        seed = [rnd.randint(0, 1) for _ in range(n + k - 1)]
+        expected = [sum(seed[i - j + n - 1] * x[j] for j in range(n)) % 2 for i in range(k)]
+        self.assertEqual(expected, self.extractor.extract(x, seed, k))
+
+    def test_extraction_size_bigger_raw_key_raises_value_error(self):
+        with self.assertRaises(ValueError) as cm:
+            self.extractor.extract([1, 1, 1], [1] * 6, 4)
+
+        self.assertEqual("The requested key (4) is too long for the raw key (3).", cm.exception.args[0])
+
+    def test_too_short_seed_raises_value_error(self):
+        with self.assertRaises(ValueError) as cm:
+            self.extractor.extract([1, 1, 1], [1, 1, 1], 2)
+
+        self.assertEqual("The seed (3) is too short for a 2 x 3 Toeplitz matrix.", cm.exception.args[0])
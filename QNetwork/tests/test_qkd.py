@@ -1,8 +1,9 @@
-import random
 import unittest
 
-from QNetwork.q_network_channels import QState
+from QNetwork.q_network_channels import QState, QStates
+from QNetwork.qkd.privacy_amplification import ToeplitzExtractor
 from QNetwork.qkd.qkd import QKDNode
+from QNetwork.qkd.randomness import SeededRandomSource
 
 
 class CACMock:
@@ -19,17 +20,53 @@ class CACMock:
             raise Exception("This mock was given an unexpected argument. Expected {0} got {1}"
                             .format(self.expected_sent, data))
 
+    def send_bits(self, data):
+        self.send(list(data))
+
+    def send_indices(self, indices):
+        self.send(list(indices))
+
     def send_ack(self):
         self.send_ack_was_called = True
 
     def receive(self):
         return self.received_data
 
+    def receive_bits(self):
+        return self.receive()
+
+    def receive_indices(self):
+        return self.receive()
+
     def receive_ack(self):
         self.receive_ack_was_called = True
 
 
+class ReconcilerSpy:
+    def __init__(self, corrected, leaked_bits, confirmed=True):
+        self.corrected = corrected
+        self.leaked_bits = leaked_bits
+        self.confirmed = confirmed
+        self.received_x = None
+        self.received_error_rate = None
+
+    def correct(self, x, ca_channel, error_rate):
+        self.received_x = x
+        self.received_error_rate = error_rate
+        return self.corrected, self.leaked_bits, self.confirmed
+
+
+class KeyLengthEstimatorStub:
+    def __init__(self, length):
+        self.length = length
+
+    def key_length(self, raw_length):
+        return self.length
+
+
 class QKDNodeSUT(QKDNode):
+    error_rate = 0.1
+
     def share_q_states(self):
         pass
 
@@ -42,12 +79,18 @@ class QKDNodeSUT(QKDNode):
     def _measure_qstates(self, amount):
         pass
 
+    def _raw_key_indices(self):
+        return [1, 3]
+
+    def _estimate_key_length(self, raw_length):
+        return self.key_length_estimator.key_length(raw_length)
+
 
 class TestQKDCommonFunctions(unittest.TestCase):
     def test_share_bases(self):
         cac = CACMock(expected_sent=[0, 0, 1, 1], received_data=[0, 1, 0, 1])
         node = self.make_node(cac)
-        node._qstates = [QState(1, 0), QState(1, 0), QState(0, 1), QState(1, 1)]
+        node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 1), QState(1, 1)])
         node._share_bases()
         self.assertSequenceEqual([0, 1, 0, 1], node._other_bases)
         self.assertTrue(cac.send_was_called)
@@ -62,23 +105,34 @@ class TestQKDCommonFunctions(unittest.TestCase):
         self.assertTrue(cac.send_was_called)
 
     def test_send_test_set(self):
-        random.seed(7)
-        cac = CACMock(expected_sent=[0, 1, 2, 5, 6, 8, 10])
+        cac = CACMock(expected_sent=[6, 7, 8, 10, 12, 13, 14])
         node = self.make_node(cac)
-        node._qstates = [QState(1, 0)] * 15
+        node.random_source = SeededRandomSource(7)
+        node._qstates = QStates.from_list([QState(1, 0)] * 15)
         node._send_test_set()
         self.assertTrue(cac.send_was_called)
+        self.assertSequenceEqual([6, 7, 8, 10, 12, 13, 14], node._test_set.tolist())
 
     def test_send_amplification_seed(self):
-        random.seed(42)
-        cac = CACMock(expected_sent=[0, 0, 1])
+        cac = CACMock(expected_sent=[1, 0, 1])
         node = self.make_node(cac)
-        node._qstates = [QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(0, 0)]
-        node._test_set = {0, 2}
+        node.random_source = SeededRandomSource(42)
+        node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(0, 0)])
+        node._test_set = [0, 2]
         node._send_seed()
-        self.assertSequenceEqual([0, 0, 1], node._seed)
+        self.assertSequenceEqual([1, 0, 1], node._seed.tolist())
         self.assertTrue(cac.send_was_called)
 
+    def test_send_seed_sized_for_extractor(self):
+        cac = CACMock(expected_sent=[1, 0, 1, 0, 1])
+        node = self.make_node(cac)
+        node.random_source = SeededRandomSource(42)
+        node.extractor = ToeplitzExtractor()
+        node._qstates = QStates.from_list([QState(1, 0), QState(1, 0), QState(0, 0), QState(1, 0), QState(0, 0)])
+        node._test_set = [0, 2]
+        node._send_seed()
+        self.assertEqual(5, len(node._seed))
+
     def test_send_acknowledgement(self):
         cac = CACMock()
         node = self.make_node(cac)
@@ -108,20 +162,80 @@ class TestQKDCommonFunctions(unittest.TestCase):
 
     def test_extract_single_bit_default(self):
         node = self.make_node(None)
-        node._qstates = [QState(1, 0)] * 4
+        node._qstates = QStates.from_list([QState(1, 0)] * 4)
         node._seed = [1, 1, 1]
-        key = node._calc_privacy_amplification_of({0, 1, 2})
+        key = node._calc_privacy_amplification_of([0, 1, 2])
         self.assertEqual([1], key)
 
     def test_maximize_key_bit_extraction_with_errors(self):
         node = self.make_node(None)
         node.maximize_key_bits = True
-        node._qstates = [QState(1, 0)] * 6
+        node._qstates = QStates.from_list([QState(1, 0)] * 6)
         node._seed = [1] * 6
         node._calculate_matching_error_of_values([1] * 6, [1, 1, 1, 0, 0, 0])
-        key = node._calc_privacy_amplification_of({0, 1, 2, 3, 4, 5})
+        key = node._calc_privacy_amplification_of([0, 1, 2, 3, 4, 5])
         self.assertEqual([0, 0, 0], key)
 
+    def test_estimated_key_length_replaces_ad_hoc_length(self):
+        node = self.make_node(None)
+        node.maximize_key_bits = True
+        node.key_length_estimator = KeyLengthEstimatorStub(2)
+        node._qstates = QStates.from_list([QState(1, 0)] * 6)
+        node._seed = [1] * 6
+        self.assertEqual([1, 1], node._calc_privacy_amplification_of([0, 1, 2, 3, 4, 5]))
+
+    def test_estimated_key_length_is_not_exceeded(self):
+        node = self.make_node(None)
+        node.maximize_key_bits = True
+        node._qstates = QStates.from_list([QState(1, 0)] * 7)
+        node._seed = [1] * 7
+        for k in range(1, 8):
+            node.key_length_estimator = KeyLengthEstimatorStub(k)
+            self.assertLessEqual(len(node._calc_privacy_amplification_of(list(range(7)))), k)
+
+    def test_no_key_if_estimated_length_is_zero(self):
+        node = self.make_node(None)
+        node.maximize_key_bits = True
+        node.key_length_estimator = KeyLengthEstimatorStub(0)
+        node._qstates = QStates.from_list([QState(1, 0)] * 6)
+        node._seed = [1] * 6
+        self.assertEqual([], node._calc_privacy_amplification_of([0, 1, 2, 3, 4, 5]))
+
+    def test_reconcile_raw_key(self):
+        node = self.make_node(None)
+        node.reconciler = ReconcilerSpy([0, 0], leaked_bits=2)
+        node._qstates = QStates([1, 1, 1, 1], [0, 0, 0, 0])
+        node.reconcile()
+        self.assertSequenceEqual([1, 1], node.reconciler.received_x.tolist())
+        self.assertEqual(0.1, node.reconciler.received_error_rate)
+        self.assertSequenceEqual([1, 0, 1, 0], node._qstates.values.tolist())
+
+    def test_drop_round_if_reconciliation_is_not_confirmed(self):
+        node = self.make_node(None)
+        node.reconciler = ReconcilerSpy([0, 0], leaked_bits=2, confirmed=False)
+        node._qstates = QStates([1, 1, 1, 1], [0, 0, 0, 0])
+        node.generate_key = lambda: [1]
+        self.assertEqual([], node.distill_key())
+
+    def test_leaked_bits_shorten_maximized_key(self):
+        node = self.make_node(None)
+        node.maximize_key_bits = True
+        node.reconciler = ReconcilerSpy([1] * 6, leaked_bits=3)
+        node._qstates = QStates.from_list([QState(1, 0)] * 6)
+        node._raw_key_indices = lambda: [0, 1, 2, 3, 4, 5]
+        node._seed = [1] * 6
+        node.reconcile()
+        self.assertEqual([0, 0, 0], node._calc_privacy_amplification_of([0, 1, 2, 3, 4, 5]))
+
+    def test_no_key_if_everything_leaked(self):
+        node = self.make_node(None)
+        node.maximize_key_bits = True
+        node.reconciler = ReconcilerSpy([1, 1], leaked_bits=2)
+        node._qstates = QStates.from_list([QState(1, 0)] * 4)
+        node._seed = [1] * 2
+        node.reconcile()
+        self.assertEqual([], node._calc_privacy_amplification_of([1, 3]))
+
     def test_receive_seed(self):
         cac = CACMock(received_data=[1, 0, 1, 0])
         node = self.make_node(cac)
@@ -132,7 +246,7 @@ class TestQKDCommonFunctions(unittest.TestCase):
         cac = CACMock(received_data=[0, 1])
         node = self.make_node(cac)
         node._receive_test_set()
-        self.assertEqual({0, 1}, node._test_set)
+        self.assertSequenceEqual([0, 1], node._test_set.tolist())
 
     def test_receive_acknowledgement(self):
         cac = CACMock()
@@ -0,0 +1,39 @@
+import unittest
+
+from QNetwork.qkd.randomness import SystemRandomSource, SeededRandomSource
+
+
+class RandomSourceContract:
+    def make_source(self):
+        raise NotImplementedError
+
+    def test_bits(self):
+        bits = self.make_source().bits(1001)
+        self.assertEqual(1001, len(bits))
+        self.assertEqual({0, 1}, set(bits.tolist()))
+
+    def test_no_bits(self):
+        self.assertEqual(0, len(self.make_source().bits(0)))
+
+    def test_integers_up_to_inclusive_bound(self):
+        values = self.make_source().integers(1000, 2)
+        self.assertEqual(1000, len(values))
+        self.assertEqual({0, 1, 2}, set(values.tolist()))
+
+    def test_sample_distinct_elements(self):
+        sample = self.make_source().sample(100, 50)
+        self.assertEqual(50, len(set(sample.tolist())))
+        self.assertTrue(all(0 <= i < 100 for i in sample))
+
+
+class TestSystemRandomSource(RandomSourceContract, unittest.TestCase):
+    def make_source(self):
+        return SystemRandomSource()
+
+
+class TestSeededRandomSource(RandomSourceContract, unittest.TestCase):
+    def make_source(self):
+        return SeededRandomSource(42)
+
+    def test_reproducible(self):
+        self.assertEqual(SeededRandomSource(7).bits(64).tolist(), SeededRandomSource(7).bits(64).tolist())
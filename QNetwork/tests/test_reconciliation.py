@@ -0,0 +1,89 @@
+import queue
+import threading
+import unittest
+
+import numpy as np
+
+from QNetwork.q_network_channels import CAChannel
+from QNetwork.qkd.randomness import SeededRandomSource
+from QNetwork.qkd.reconciliation import CascadeReconciler
+
+
+class LoopbackConnection:
+    def __init__(self):
+        self.inbox = queue.Queue()
+        self.peer = None
+
+    def sendValueList(self, other, data):
+        self.peer.inbox.put(list(data))
+
+    def getValueList(self, other):
+        return self.inbox.get(timeout=5)
+
+
+def make_channel_pair(format_version):
+    alice, bob = LoopbackConnection(), LoopbackConnection()
+    alice.peer, bob.peer = bob, alice
+    alice_channel, bob_channel = CAChannel(alice, 'Bob'), CAChannel(bob, 'Alice')
+    alice_channel.format_version = bob_channel.format_version = format_version
+    return alice_channel, bob_channel
+
+
+class TestCascadeReconciler(unittest.TestCase):
+    def reconcile(self, reference, noisy, error_rate, format_version=1, passes=4):
+        corrected, leaked, confirmed = self.reconcile_unconfirmed(reference, noisy, error_rate, format_version, passes)
+        self.assertTrue(confirmed)
+        return corrected, leaked
+
+    def reconcile_unconfirmed(self, reference, noisy, error_rate, format_version=1, passes=4):
+        alice, bob = make_channel_pair(format_version)
+        reconciler = CascadeReconciler(passes)
+        answered = []
+        thread = threading.Thread(
+            target=lambda: answered.append(reconciler.answer(reference, alice, error_rate, SeededRandomSource(1))))
+        thread.start()
+        corrected, leaked, confirmed = reconciler.correct(noisy, bob, error_rate)
+        thread.join(5)
+        self.assertEqual(answered, [(leaked, confirmed)])
+        return corrected, leaked, confirmed
+
+    def make_keys(self, n, errors):
+        generator = np.random.default_rng(3)
+        reference = generator.integers(0, 2, n, dtype=np.uint8)
+        noisy = reference.copy()
+        noisy[generator.choice(n, errors, replace=False)] ^= 1
+        return reference, noisy
+
+    def test_correct_errors(self):
+        reference, noisy = self.make_keys(2000, 60)
+        corrected, leaked = self.reconcile(reference, noisy, 0.03)
+        self.assertEqual(reference.tolist(), corrected.tolist())
+        self.assertLess(leaked, 2000)
+
+    def test_correct_errors_in_legacy_format(self):
+        reference, noisy = self.make_keys(500, 10)
+        corrected, _ = self.reconcile(reference, noisy, 0.02, format_version=0)
+        self.assertEqual(reference.tolist(), corrected.tolist())
+
+    def test_keys_without_errors_stay_unchanged(self):
+        reference, noisy = self.make_keys(300, 0)
+        corrected, leaked = self.reconcile(reference, noisy, 0.0)
+        self.assertEqual(reference.tolist(), corrected.tolist())
+        self.assertEqual(4 + CascadeReconciler().confirmation_bits, leaked)
+
+    def test_empty_raw_key(self):
+        corrected, leaked = self.reconcile([], [], 0.1)
+        self.assertEqual(0, len(corrected))
+        self.assertEqual(CascadeReconciler().confirmation_bits, leaked)
+
+    def test_missed_errors_are_not_confirmed(self):
+        reference, noisy = self.make_keys(100, 0)
+        noisy[[0, 1]] ^= 1
+        corrected, _, confirmed = self.reconcile_unconfirmed(reference, noisy, 0.01, passes=1)
+        self.assertNotEqual(reference.tolist(), corrected.tolist())
+        self.assertFalse(confirmed)
+
+    def test_first_block_size(self):
+        self.assertEqual(25, CascadeReconciler.first_block_size(100, 0.03))
+        self.assertEqual(100, CascadeReconciler.first_block_size(100, 0.0))
+        self.assertEqual(1, CascadeReconciler.first_block_size(100, 1.0))
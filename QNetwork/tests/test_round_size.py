@@ -0,0 +1,41 @@
+import unittest
+
+from QNetwork.qkd.round_size import RoundSizePolicy, get_round_size_policy
+
+
+class TestRoundSizePolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = RoundSizePolicy(min_size=100, max_size=1000, raw_fraction=0.25, smoothing=0.5)
+
+    def test_size_by_expected_yield(self):
+        self.assertEqual(400, self.policy.next_size(100))
+
+    def test_bounds(self):
+        self.assertEqual(100, self.policy.next_size(1))
+        self.assertEqual(1000, self.policy.next_size(10000))
+
+    def test_noisy_rounds_grow(self):
+        self.policy.observe(400, 75, 0.25)
+        self.assertEqual(0.125, self.policy.error_rate)
+        self.assertEqual(458, self.policy.next_size(100))
+
+    def test_aborted_rounds_lower_success_rate(self):
+        self.policy.observe(400, 0, 0.5)
+        self.assertEqual(0.5, self.policy.success_rate)
+        self.assertEqual(0.25, self.policy.raw_fraction)
+
+    def test_learn_raw_fraction(self):
+        self.policy.observe(400, 200, 0.0)
+        self.assertEqual(0.375, self.policy.raw_fraction)
+
+    def test_no_expected_yield(self):
+        self.policy.success_rate = 0
+        self.assertEqual(1000, self.policy.next_size(10))
+
+
+class TestRoundSizePolicyRegistry(unittest.TestCase):
+    def test_same_direction_shares_policy(self):
+        self.assertIs(get_round_size_policy('Alice', 'Bob'), get_round_size_policy('Alice', 'Bob'))
+
+    def test_directions_have_separate_policies(self):
+        self.assertIsNot(get_round_size_policy('Alice', 'Bob'), get_round_size_policy('Bob', 'Alice'))
@@ -0,0 +1,71 @@
+import queue
+import threading
+import unittest
+
+from QNetwork.qkd.scheduler import KeyGenerationScheduler, KeyBlock
+
+
+class NodeStub:
+    def __init__(self, *keys):
+        self.keys = list(keys)
+        self.idx = 0
+
+    def try_generate_key(self):
+        self.idx += 1
+        return self.keys[(self.idx - 1) % len(self.keys)]
+
+
+class NodeRaising:
+    def try_generate_key(self):
+        raise ValueError("Node failed")
+
+
+class BlockingNode:
+    def __init__(self):
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+    def try_generate_key(self):
+        self.entered.set()
+        self.release.wait()
+        return [1]
+
+
+class TestKeyGenerationScheduler(unittest.TestCase):
+    def test_collects_key_blocks_of_node(self):
+        with KeyGenerationScheduler() as scheduler:
+            scheduler.add('Alice-Bob', NodeStub([1, 0], [1]), rounds=2)
+            scheduler.wait()
+            self.assertEqual(KeyBlock('Alice-Bob', 0, [1, 0]), scheduler.get_block(timeout=1))
+            self.assertEqual(KeyBlock('Alice-Bob', 1, [1]), scheduler.get_block(timeout=1))
+
+    def test_skip_aborted_rounds(self):
+        with KeyGenerationScheduler() as scheduler:
+            scheduler.add('Alice-Bob', NodeStub([], [1]), rounds=2)
+            scheduler.wait()
+            self.assertEqual(KeyBlock('Alice-Bob', 1, [1]), scheduler.get_block(timeout=1))
+            with self.assertRaises(queue.Empty):
+                scheduler.get_block(timeout=0)
+
+    def test_nodes_run_concurrently(self):
+        blocking = BlockingNode()
+        with KeyGenerationScheduler(max_workers=2) as scheduler:
+            scheduler.add('Alice-Bob', blocking, rounds=1)
+            self.assertTrue(blocking.entered.wait(timeout=1))
+            scheduler.add('Alice-Charlie', NodeStub([0]), rounds=1)
+            self.assertEqual(KeyBlock('Alice-Charlie', 0, [0]), scheduler.get_block(timeout=1))
+            blocking.release.set()
+            self.assertEqual(KeyBlock('Alice-Bob', 0, [1]), scheduler.get_block(timeout=1))
+
+    def test_reraise_node_exceptions_on_wait(self):
+        with KeyGenerationScheduler() as scheduler:
+            scheduler.add('Alice-Bob', NodeRaising(), rounds=1)
+            with self.assertRaises(ValueError):
+                scheduler.wait()
+
+    def test_stop_unbounded_key_generation(self):
+        scheduler = KeyGenerationScheduler()
+        scheduler.add('Alice-Bob', NodeStub([1]))
+        scheduler.get_block(timeout=1)
+        scheduler.stop()
+        scheduler.wait()
@@ -1,28 +1,53 @@
+import io
+import shutil
+import tempfile
 import unittest
 
-from QNetwork.q_network_impl import START_KEY_GENERATION_TAG, END_KEY_GENERATION_TAG, SecureChannel, READING
+from QNetwork.q_network_impl import START_KEY_GENERATION_TAG, END_KEY_GENERATION_TAG, END_STREAM_TAG, SecureChannel, \
+    READING, WRITING
+from QNetwork.q_network_key_pool import KeyPool
+from QNetwork.q_network_key_store import KeyStore
+from QNetwork.qkd.round_size import RoundSizePolicy
 
 
 class QChannelSpy:
     def __init__(self):
         self.received_close = False
+        self.received_discard = False
 
     def close(self):
         self.received_close = True
 
+    def discard(self):
+        self.received_discard = True
+
 
 class CAChannelSpy:
     def __init__(self):
         self.data_sent = None
         self.record = []
+        self.is_new = True
+        self.positions_sent = None
         self.received_send_ack = False
         self.received_receive_ack = False
         self.received_clear = False
+        self.received_release = False
+        self.received_discard = False
 
     def send(self, data):
         self.record.append(data)
         self.data_sent = data
 
+    def send_bytes(self, data):
+        self.send(data)
+
+    def send_integers(self, values):
+        self.positions_sent = list(values)
+
+    def receive_integers(self):
+        # The other end holds the same key as this end
+        return self.positions_sent[2:4] + self.positions_sent[0:2]
+
     def send_ack(self):
         self.received_send_ack = True
 
@@ -32,8 +57,16 @@ class CAChannelSpy:
     def clear(self):
         self.received_clear = True
 
+    def release(self):
+        self.received_release = True
+
+    def discard(self):
+        self.received_discard = True
+
 
 class NetworkFactorySpy:
+    pipeline_depth = 1
+
     def __init__(self, q_channel, ca_channel):
         self.q_channel = q_channel
         self.ca_channel = ca_channel
@@ -48,6 +81,12 @@ class NetworkFactorySpy:
         self.cac_from_to_names = (from_name, to_name)
         return self.ca_channel
 
+    def get_round_size_policy(self, writer, reader):
+        return None
+
+    def get_key_pool(self, local, writer, reader):
+        return KeyPool()
+
     def make_sender_node(self, q_channel, ca_channel):
         return NodeStub([1])
 
@@ -56,10 +95,21 @@ class NetworkFactorySpy:
 
 
 class NetworkFactoryStub:
-    def __init__(self, q_channel, ca_channel, node):
+    pipeline_depth = 1
+
+    def __init__(self, q_channel, ca_channel, node, key_pool_size=0, round_size=None):
         self.q_channel = q_channel
         self.ca_channel = ca_channel
         self.node = node
+        self.key_pools = {}
+        self.key_pool_size = key_pool_size
+        self.round_size = round_size
+
+    def get_round_size_policy(self, writer, reader):
+        return self.round_size
+
+    def get_key_pool(self, local, writer, reader):
+        return self.key_pools.setdefault((local, writer, reader), KeyPool(self.key_pool_size))
 
     def make_q_channel(self, from_name, to_name):
         return self.q_channel
@@ -78,11 +128,22 @@ class CACStub:
     def __init__(self, *received_data):
         self.received_data = received_data
         self.idx = 0
+        self.is_new = True
 
     def receive(self):
         self.idx += 1
         return self.received_data[self.idx - 1]
 
+    def receive_bytes(self):
+        return bytes(self.receive())
+
+    def send_integers(self, values):
+        self.positions_sent = list(values)
+
+    def receive_integers(self):
+        # The other end holds the same key as this end
+        return self.positions_sent[2:4] + self.positions_sent[0:2]
+
 
 class NodeStub:
     def __init__(self, key):
@@ -92,6 +153,17 @@ class NodeStub:
         return self.key
 
 
+class SizedNodeSpy:
+    def __init__(self, error_rate):
+        self.n = 0
+        self.error_rate = error_rate
+        self.round_sizes = []
+
+    def try_generate_key(self):
+        self.round_sizes.append(self.n)
+        return [1] * (self.n // 4)
+
+
 class TestConnectionHandling(unittest.TestCase):
     def setUp(self):
         self.q_channel = QChannelSpy()
@@ -115,6 +187,7 @@ class TestConnectionHandling(unittest.TestCase):
         self.assertFalse(self.ca_channel.received_send_ack)
         self.assertTrue(self.ca_channel.received_clear)
         self.assertTrue(self.q_channel.received_close)
+        self.assertTrue(self.ca_channel.received_release)
 
     def test_after_write_wait_for_acknowledgement_before_closing(self):
         self.sc.__enter__()
@@ -126,7 +199,7 @@ class TestConnectionHandling(unittest.TestCase):
 
     def test_after_read_send_acknowledgement_before_and_do_not_close_cac(self):
         self.sc.__enter__()
-        self.sc._state = READING
+        self.sc.start_reading()
         self.sc.__exit__(None, None, None)
         self.assertTrue(self.ca_channel.received_send_ack)
         self.assertFalse(self.ca_channel.received_clear)
@@ -136,7 +209,9 @@ class TestConnectionHandling(unittest.TestCase):
         self.sc.__enter__()
         self.sc.__exit__(ValueError, ValueError("Some Error"), None)
         self.assertTrue(self.ca_channel.received_clear)
-        self.assertTrue(self.q_channel.received_close)
+        self.assertTrue(self.q_channel.received_discard)
+        self.assertTrue(self.ca_channel.received_discard)
+        self.assertFalse(self.ca_channel.received_release)
 
 
 class TestMessageSending(unittest.TestCase):
@@ -148,50 +223,162 @@ class TestMessageSending(unittest.TestCase):
         self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1, 1, 1, 1, 1, 1, 1, 1]))
         self.sc.__enter__()
         self.sc.write("H")
-        self.assertEqual([1, 0, 1, 1, 0, 1, 1, 1], self.cac.data_sent)
+        self.assertEqual(bytes([0b10110111]), self.cac.data_sent)
 
     def test_fill_up_key(self):
         self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1, 1, 1]))
         self.sc.__enter__()
         self.sc.write("H")
-        self.assertEqual([1, 0, 1, 1, 0, 1, 1, 1], self.cac.data_sent)
+        self.assertEqual(bytes([0b10110111]), self.cac.data_sent)
 
     def test_inform_receiver_about_key_generation(self):
         self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1, 1, 1]))
         self.sc.__enter__()
         self.sc.write("H")
-        self.assertEqual(self.sc.to_binary_list(START_KEY_GENERATION_TAG), self.cac.record[0])
-        self.assertEqual(self.sc.to_binary_list(START_KEY_GENERATION_TAG), self.cac.record[1])
-        self.assertEqual(self.sc.to_binary_list(START_KEY_GENERATION_TAG), self.cac.record[2])
-        self.assertEqual(self.sc.to_binary_list(END_KEY_GENERATION_TAG), self.cac.record[3])
+        self.assertEqual(self.sc.to_bytes(START_KEY_GENERATION_TAG), self.cac.record[0])
+        self.assertEqual(self.sc.to_bytes(START_KEY_GENERATION_TAG), self.cac.record[1])
+        self.assertEqual(self.sc.to_bytes(START_KEY_GENERATION_TAG), self.cac.record[2])
+        self.assertEqual(self.sc.to_bytes(END_KEY_GENERATION_TAG), self.cac.record[3])
+
+    def test_send_binary_message(self):
+        self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1] * 16))
+        self.sc.__enter__()
+        self.sc.write(b'\x00\x0f')
+        self.assertEqual(b'\xff\xf0', self.cac.data_sent)
+
+
+class TestStreamSending(unittest.TestCase):
+    def setUp(self):
+        self.sc = SecureChannel('Alice', 'Bob')
+        self.cac = CAChannelSpy()
+        self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1] * 8))
+        self.sc.__enter__()
+        self.start_tag = self.sc.to_bytes(START_KEY_GENERATION_TAG)
+        self.end_tag = self.sc.to_bytes(END_KEY_GENERATION_TAG)
+        self.end_stream_tag = self.sc.to_bytes(END_STREAM_TAG)
+
+    def test_send_bytes_in_frames(self):
+        self.sc.write_stream(b'\x00\x0f\xff', frame_size=2)
+        self.assertEqual([self.start_tag, self.start_tag, self.end_tag, b'\xff\xf0',
+                          self.start_tag, self.end_tag, b'\x00',
+                          self.end_stream_tag], self.cac.record)
+
+    def test_send_file_like_object(self):
+        self.sc.write_stream(io.BytesIO(b'\x00\x0f\xff'), frame_size=2)
+        self.assertEqual([b'\xff\xf0', b'\x00'], self.sent_frames())
+
+    def sent_frames(self):
+        tags = [self.start_tag, self.end_tag, self.end_stream_tag]
+        return [r for r in self.cac.record if r not in tags]
+
+    def test_send_iterable_of_chunks(self):
+        self.sc.write_stream(iter([b'\x00', b'\x0f\xff\x00', b'\x0f']), frame_size=2)
+        self.assertEqual([b'\xff\xf0', b'\x00\xff', b'\xf0'], self.sent_frames())
+
+    def test_end_stream_without_data(self):
+        self.sc.write_stream(b'')
+        self.assertEqual([self.end_stream_tag], self.cac.record)
+
+
+class TestKeyPooling(unittest.TestCase):
+    def setUp(self):
+        self.sc = SecureChannel('Alice', 'Bob')
+        self.cac = CAChannelSpy()
+        self.start_tag = self.sc.to_bytes(START_KEY_GENERATION_TAG)
+        self.end_tag = self.sc.to_bytes(END_KEY_GENERATION_TAG)
+
+    def test_keep_surplus_key_for_next_message(self):
+        self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1] * 16))
+        self.sc.__enter__()
+        self.sc.write("H")
+        self.sc.write("H")
+        self.assertEqual([self.start_tag, self.end_tag, bytes([0b10110111]), self.end_tag, bytes([0b10110111])],
+                         self.cac.record)
+
+    def test_fill_up_to_high_water_mark_on_top_of_demand(self):
+        self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1] * 8), key_pool_size=16)
+        self.sc.__enter__()
+        self.sc.write("H")
+        self.assertEqual([self.start_tag] * 3 + [self.end_tag, bytes([0b10110111])], self.cac.record)
+        self.assertEqual(16, len(self.sc.network_factory.get_key_pool('Alice', 'Alice', 'Bob')))
+
+    def test_fill_key_pool_ahead_of_demand(self):
+        self.sc.network_factory = NetworkFactoryStub(None, self.cac, NodeStub([1] * 8), key_pool_size=16)
+        self.sc.__enter__()
+        self.sc.fill_key_pool()
+        self.assertEqual([self.start_tag] * 2 + [self.end_tag], self.cac.record)
+        self.assertEqual(WRITING, self.sc.state)
+
+    def test_sync_key_pool_with_writer(self):
+        self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.start_tag, self.end_tag),
+                                                     NodeStub([1] * 8))
+        self.sc.__enter__()
+        self.sc.sync_key_pool()
+        self.assertEqual(16, len(self.sc.network_factory.get_key_pool('Alice', 'Bob', 'Alice')))
+        self.assertEqual(READING, self.sc.state)
+
+    def test_read_from_stock(self):
+        self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.end_tag, [0b10110111]), None)
+        self.sc.network_factory.get_key_pool('Alice', 'Bob', 'Alice').extend([1] * 8)
+        self.sc.__enter__()
+        self.assertEqual('H', self.sc.read())
+
+    def test_discard_pooled_key_on_exceptional_close(self):
+        self.sc.network_factory = NetworkFactoryStub(QChannelSpy(), self.cac, None)
+        self.sc.network_factory.get_key_pool('Alice', 'Alice', 'Bob').extend([1] * 8)
+        self.sc.network_factory.get_key_pool('Alice', 'Bob', 'Alice').extend([1] * 8)
+        self.sc.__enter__()
+        self.sc.__exit__(ValueError, ValueError("Some Error"), None)
+        self.assertEqual(0, len(self.sc.network_factory.get_key_pool('Alice', 'Alice', 'Bob')))
+        self.assertEqual(0, len(self.sc.network_factory.get_key_pool('Alice', 'Bob', 'Alice')))
+
+
+class TestAdaptiveRoundSize(unittest.TestCase):
+    def setUp(self):
+        self.sc = SecureChannel('Alice', 'Bob')
+        self.node = SizedNodeSpy(error_rate=0.0)
+        self.policy = RoundSizePolicy(min_size=8, max_size=40, smoothing=0.5)
+
+    def test_size_rounds_by_missing_key(self):
+        self.sc.network_factory = NetworkFactoryStub(None, CAChannelSpy(), self.node, round_size=self.policy)
+        self.sc.__enter__()
+        self.sc.write("He")
+        self.assertEqual([40, 24], self.node.round_sizes)
+
+    def test_rounds_are_observed(self):
+        self.node.error_rate = 0.5
+        self.sc.network_factory = NetworkFactoryStub(None, CAChannelSpy(), self.node, round_size=self.policy)
+        self.sc.__enter__()
+        self.sc.write("H")
+        self.assertEqual(0.25, self.policy.error_rate)
 
 
 class TestMessageReceiving(unittest.TestCase):
     def setUp(self):
         self.sc = SecureChannel('Alice', 'Bob')
-        self.start_tag = self.sc.to_binary_list(START_KEY_GENERATION_TAG)
-        self.end_tag = self.sc.to_binary_list(END_KEY_GENERATION_TAG)
+        self.start_tag = self.sc.to_bytes(START_KEY_GENERATION_TAG)
+        self.end_tag = self.sc.to_bytes(END_KEY_GENERATION_TAG)
 
     def test_receive_encrypted_message(self):
         self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.end_tag,
-                                                                   [1, 0, 1, 1, 0, 1, 1, 1]),
+                                                                   [0b10110111]),
                                                      NodeStub([1, 1, 1, 1, 1, 1, 1, 1]))
         self.sc.__enter__()
         msg = self.sc.read()
         self.assertEqual('H', msg)
-        self.assertEqual(READING, self.sc._state)
+        self.assertEqual(READING, self.sc.state)
 
     def test_receive_multiple_key_generations(self):
         self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.start_tag, self.start_tag,
                                                                    self.end_tag,
-                                                                   [1, 0, 1, 1, 0, 1, 1, 1]), NodeStub([1, 1, 1]))
+                                                                   [0b10110111]), NodeStub([1, 1, 1]))
         self.sc.__enter__()
         msg = self.sc.read()
         self.assertEqual('H', msg)
 
     def test_assert_key_generation_is_ended_properly(self):
         self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag,
-                                                                   [1, 0, 1, 1, 0, 1, 1, 1]),
+                                                                   [0b10110111]),
                                                      NodeStub([1, 1, 1, 1, 1, 1, 1, 1]))
         self.sc.__enter__()
         with self.assertRaises(AssertionError):
@@ -199,7 +386,188 @@ class TestMessageReceiving(unittest.TestCase):
 
     def test_assert_that_there_is_enough_key(self):
         self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.end_tag,
-                                                                   [1, 0, 1, 1, 0, 1, 1, 1]), NodeStub([1, 1, 1]))
+                                                                   [0b10110111]), NodeStub([1, 1, 1]))
         self.sc.__enter__()
         with self.assertRaises(AssertionError):
             msg = self.sc.read()
+
+    def test_receive_binary_message(self):
+        self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.end_tag, [0xff, 0xf0]),
+                                                     NodeStub([1] * 16))
+        self.sc.__enter__()
+        self.assertEqual(b'\x00\x0f', self.sc.read_bytes())
+
+    def test_receive_stream(self):
+        end_stream_tag = self.sc.to_bytes(END_STREAM_TAG)
+        self.sc.network_factory = NetworkFactoryStub(None, CACStub(self.start_tag, self.end_tag, [0xff, 0xf0],
+                                                                   self.start_tag, self.end_tag, [0x00],
+                                                                   end_stream_tag),
+                                                     NodeStub([1] * 16))
+        self.sc.__enter__()
+        self.assertEqual([b'\x00\x0f', b'\xff'], list(self.sc.read_stream()))
+        self.assertEqual(READING, self.sc.state)
+
+
+class CAChannelSpyStub(CAChannelSpy):
+    def __init__(self, *received_data):
+        super().__init__()
+        self.received_data = list(received_data)
+
+    def receive(self):
+        return self.received_data.pop(0)
+
+    def receive_bytes(self):
+        return bytes(self.receive())
+
+
+class CAChannelPositionsStub(CAChannelSpy):
+    def __init__(self, positions):
+        super().__init__()
+        self.positions = positions
+
+    def receive_integers(self):
+        return self.positions
+
+
+class TestSessionMode(unittest.TestCase):
+    def setUp(self):
+        self.sc = SecureChannel('Alice', 'Bob', session=True)
+        self.start_tag = self.sc.to_bytes(START_KEY_GENERATION_TAG)
+        self.end_tag = self.sc.to_bytes(END_KEY_GENERATION_TAG)
+        self.frame = bytes([0xfe, 0b10110111, 0xfe, 0x96])
+
+    def enter(self, ca_channel):
+        self.sc.network_factory = NetworkFactoryStub(QChannelSpy(), ca_channel, NodeStub([1] * 32))
+        self.sc.__enter__()
+
+    def test_buffer_messages_until_flush(self):
+        cac = CAChannelSpy()
+        self.enter(cac)
+        self.sc.write("H")
+        self.sc.write("i")
+        self.assertEqual([], cac.record)
+        self.sc.flush()
+        self.assertEqual([self.start_tag, self.end_tag, self.frame], cac.record)
+
+    def test_flush_without_messages_sends_nothing(self):
+        cac = CAChannelSpy()
+        self.enter(cac)
+        self.sc.flush()
+        self.assertEqual([], cac.record)
+
+    def test_exit_sends_buffered_messages_before_teardown(self):
+        cac = CAChannelSpy()
+        self.enter(cac)
+        self.sc.write("H")
+        self.sc.write("i")
+        self.sc.__exit__(None, None, None)
+        self.assertEqual(self.frame, cac.data_sent)
+        self.assertTrue(cac.received_receive_ack)
+        self.assertTrue(cac.received_clear)
+
+    def test_read_messages_of_one_frame(self):
+        self.enter(CAChannelSpyStub(self.start_tag, self.end_tag, self.frame))
+        self.assertEqual('H', self.sc.read())
+        self.assertEqual('i', self.sc.read())
+        self.assertEqual(READING, self.sc.state)
+
+    def test_read_empty_message(self):
+        self.enter(CAChannelSpyStub(self.start_tag, self.end_tag, [0xff]))
+        self.assertEqual(b'', self.sc.read_bytes())
+
+    def test_read_sends_buffered_messages_first(self):
+        cac = CAChannelSpyStub(self.end_tag, [0xfe, 0x96])
+        self.enter(cac)
+        self.sc.network_factory.get_key_pool('Alice', 'Bob', 'Alice').extend([1] * 16)
+        self.sc.write("H")
+        self.assertEqual('i', self.sc.read())
+        self.assertEqual([self.start_tag, self.end_tag, bytes([0xfe, 0b10110111])], cac.record)
+
+    def test_discard_buffered_messages_on_exceptional_close(self):
+        cac = CAChannelSpy()
+        self.enter(cac)
+        self.sc.write("H")
+        self.sc.__exit__(ValueError, ValueError("Some Error"), None)
+        self.assertEqual([], cac.record)
+
+
+class TestKeyPoolSynchronization(unittest.TestCase):
+    def enter(self, positions, writer_pool, reader_pool, is_new=True):
+        cac = CAChannelPositionsStub(positions)
+        cac.is_new = is_new
+        factory = NetworkFactoryStub(QChannelSpy(), cac, None)
+        factory.key_pools = {('Alice', 'Alice', 'Bob'): writer_pool, ('Alice', 'Bob', 'Alice'): reader_pool}
+        self.sc = SecureChannel('Alice', 'Bob')
+        self.sc.network_factory = factory
+        self.sc.__enter__()
+        return cac
+
+    def test_align_cursors_on_enter(self):
+        # Bob consumed one byte of Alice's writing direction, but did not store the last round of his own
+        writer_pool, reader_pool = KeyPool(), KeyPool()
+        writer_pool.extend([1] * 32)
+        reader_pool.extend([0] * 16 + [1] * 16)
+        reader_pool.take_bytes(1)
+        cac = self.enter([0, 16, 1, 32], writer_pool, reader_pool)
+        self.assertEqual([0, 32, 1, 32], cac.positions_sent)
+        self.assertEqual((1, 32), writer_pool.position)
+        self.assertEqual(3, writer_pool.byte_length)
+        self.assertEqual((1, 16), reader_pool.position)
+        self.assertEqual(b'\x00', reader_pool.take_bytes(1))
+
+    def test_key_discarded_by_the_other_end_after_an_error(self):
+        writer_pool, reader_pool = KeyPool(), KeyPool()
+        writer_pool.extend([1] * 16)
+        reader_pool.extend([1] * 16)
+        self.enter([2, 16, 2, 16], writer_pool, reader_pool)
+        self.assertEqual((0, 0), (len(writer_pool), len(reader_pool)))
+
+    def test_reused_channel_skips_comparison_of_agreed_pools(self):
+        writer_pool, reader_pool = KeyPool(), KeyPool()
+        writer_pool.mark_synchronized()
+        reader_pool.mark_synchronized()
+        cac = self.enter([0, 0, 0, 0], writer_pool, reader_pool, is_new=False)
+        self.assertIsNone(cac.positions_sent)
+
+    def test_reused_channel_compares_moved_pools(self):
+        writer_pool, reader_pool = KeyPool(), KeyPool()
+        writer_pool.mark_synchronized()
+        reader_pool.mark_synchronized()
+        reader_pool.extend([1] * 8)
+        cac = self.enter([0, 0, 0, 0], writer_pool, reader_pool, is_new=False)
+        self.assertEqual([0, 0, 0, 8], cac.positions_sent)
+        self.assertEqual(0, len(reader_pool))
+
+    def test_completed_context_marks_pools_as_agreed(self):
+        writer_pool, reader_pool = KeyPool(), KeyPool()
+        self.enter([0, 0, 0, 0], writer_pool, reader_pool)
+        writer_pool.extend([1] * 8)
+        self.sc.__exit__(None, None, None)
+        self.assertTrue(writer_pool.is_synchronized)
+        self.assertTrue(reader_pool.is_synchronized)
+
+
+class TestKeyStoreSynchronization(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.writer_store = KeyStore(self.directory + '/Alice-Bob.key')
+        self.reader_store = KeyStore(self.directory + '/Bob-Alice.key')
+        self.writer_store.extend([1] * 32)
+        self.reader_store.extend([1] * 32)
+        self.reader_store.take_bytes(1)
+
+    def tearDown(self):
+        self.writer_store.close()
+        self.reader_store.close()
+        shutil.rmtree(self.directory)
+
+    def test_exchange_and_align_cursors_on_enter(self):
+        cac = CAChannelPositionsStub([0, 16, 1, 32])
+        factory = NetworkFactoryStub(None, cac, None)
+        factory.key_pools = {('Alice', 'Alice', 'Bob'): self.writer_store, ('Alice', 'Bob', 'Alice'): self.reader_store}
+        sc = SecureChannel('Alice', 'Bob')
+        sc.network_factory = factory
+        sc.__enter__()
+        self.assertEqual([0, 32, 1, 32], cac.positions_sent)
+        self.assertEqual((1, 32), self.writer_store.position)
+        self.assertEqual((1, 16), self.reader_store.position)
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from QNetwork.q_network_settings import NetworkConfig, load_config
+
+
+class TestNetworkConfig(unittest.TestCase):
+    def test_defaults_of_optional_keys(self):
+        config = NetworkConfig.from_dict({'Protocol': 'DIQKD', 'Error': 0.1, 'StateSize': 100, 'MaximizeKeyBits': True})
+        self.assertEqual(NetworkConfig('DIQKD', 0.1, 100, True), config)
+
+    def test_collect_metrics(self):
+        config = NetworkConfig.from_dict({'Protocol': 'BB84', 'Error': 0, 'StateSize': 100, 'MaximizeKeyBits': True,
+                                          'CollectMetrics': True})
+        self.assertTrue(config.collect_metrics)
+
+    def test_local_backend(self):
+        config = NetworkConfig.from_dict({'Protocol': 'BB84', 'Error': 0, 'StateSize': 100, 'MaximizeKeyBits': True,
+                                          'Backend': 'Local', 'Noise': 0.01, 'Loss': 0.1})
+        self.assertEqual(('Local', 0.01, 0.1), (config.backend, config.noise, config.loss))
+
+    def test_missing_required_key(self):
+        with self.assertRaises(KeyError):
+            NetworkConfig.from_dict({'Protocol': 'BB84'})
+
+
+class TestLoadConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'q_network.cfg')
+        self.write_config(100, mtime=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_config(self, state_size, mtime):
+        with open(self.path, 'w') as f:
+            json.dump({'Protocol': 'BB84', 'Error': 0, 'StateSize': state_size, 'MaximizeKeyBits': True}, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_load_config(self):
+        self.assertEqual(100, load_config(self.path).state_size)
+
+    def test_unchanged_file_is_parsed_once(self):
+        self.assertIs(load_config(self.path), load_config(self.path))
+
+    def test_reload_changed_file(self):
+        load_config(self.path)
+        self.write_config(300, mtime=2000)
+        self.assertEqual(300, load_config(self.path).state_size)
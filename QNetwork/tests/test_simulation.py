@@ -0,0 +1,133 @@
+import unittest
+
+from QNetwork.q_network_metrics import measured
+from QNetwork.qkd.qkd import QKDNode
+from QNetwork.simulation.benchmark import benchmark, format_table, run_round, PHASES
+from QNetwork.simulation.local import LocalNetwork, LocalQubit
+
+
+class TestLocalNetwork(unittest.TestCase):
+    def setUp(self):
+        self.network = LocalNetwork(seed=5, timeout=1)
+        self.alice = self.network.cqc_connection('Alice')
+        self.bob = self.network.cqc_connection('Bob')
+
+    def test_fresh_qubit_measures_zero(self):
+        self.assertEqual(0, LocalQubit(self.alice).measure())
+
+    def test_x_flips_qubit(self):
+        q = LocalQubit(self.alice)
+        q.X()
+        self.assertEqual(1, q.measure())
+
+    def test_hadamard_twice_is_identity(self):
+        q = LocalQubit(self.alice)
+        q.X()
+        q.H()
+        q.H()
+        self.assertEqual(1, q.measure())
+
+    def test_send_qubit(self):
+        q = LocalQubit(self.alice)
+        q.X()
+        self.alice.sendQubit(q, 'Bob')
+        self.assertEqual(1, self.bob.recvQubit().measure())
+
+    def test_epr_pairs_are_correlated(self):
+        for _ in range(20):
+            local = self.alice.createEPR('Bob')
+            self.assertEqual(local.measure(), self.bob.recvEPR().measure())
+
+    def test_epr_pairs_are_correlated_in_hadamard_basis(self):
+        for _ in range(20):
+            local = self.alice.createEPR('Bob')
+            remote = self.bob.recvEPR()
+            local.H()
+            remote.H()
+            self.assertEqual(local.measure(), remote.measure())
+
+    def test_classical_values(self):
+        alice, bob = self.network.cac_client('Alice'), self.network.cac_client('Bob')
+        alice.sendValueList('Bob', [1, 2, 3])
+        self.assertEqual([1, 2, 3], bob.getValueList('Alice'))
+        bob.sendAck('Alice')
+        alice.getAck('Bob')
+
+    def test_receive_times_out(self):
+        with self.assertRaises(TimeoutError):
+            self.bob.recvQubit()
+
+
+class CAChannelDummy:
+    other = 'Bob'
+
+
+class NodeStub:
+    distill_key = QKDNode.distill_key
+
+    def __init__(self, aborts, key, confirms=True):
+        self.aborts = aborts
+        self.key = key
+        self.confirms = confirms
+        self.error_rate = 0.25
+        self.ca_channel = CAChannelDummy()
+        self.metrics = None
+
+    @measured('share_q_states', new_round=True)
+    def share_q_states(self):
+        pass
+
+    @measured('should_abort')
+    def should_abort(self):
+        return self.aborts
+
+    @measured('reconcile')
+    def reconcile(self):
+        return self.confirms
+
+    @measured('generate_key')
+    def generate_key(self):
+        return self.key
+
+
+class TestRunRound(unittest.TestCase):
+    def setUp(self):
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.outcomes = []
+
+    def test_record_abort_and_error_rate(self):
+        self.assertEqual([], run_round(NodeStub(True, [1]), self.timings, self.outcomes))
+        self.assertEqual([(True, 0.25)], self.outcomes)
+
+    def test_empty_key_is_no_abort(self):
+        run_round(NodeStub(False, []), self.timings, self.outcomes)
+        self.assertEqual([(False, 0.25)], self.outcomes)
+
+    def test_failed_reconciliation_is_no_abort(self):
+        self.assertEqual([], run_round(NodeStub(False, [1], confirms=False), self.timings, self.outcomes))
+        self.assertEqual([(False, 0.25)], self.outcomes)
+
+    def test_time_all_phases(self):
+        node = NodeStub(False, [1])
+        self.assertEqual([1], run_round(node, self.timings))
+        self.assertTrue(all(self.timings[p] > 0 for p in PHASES))
+        self.assertIsNone(node.metrics)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_bb84_end_to_end(self):
+        result = benchmark('BB84', 60, 2, seed=3)
+        self.assertTrue(result['keys_match'])
+        self.assertEqual(0, result['aborted_rounds'])
+        self.assertGreater(result['key_bits'], 0)
+        self.assertGreater(result['peak_memory_bytes'], 0)
+        self.assertEqual(set(PHASES), set(result['phase_seconds']))
+
+    def test_bb84_with_reconciliation(self):
+        result = benchmark('BB84', 200, 2, seed=3, reconciliation='Cascade')
+        self.assertTrue(result['keys_match'])
+        self.assertGreater(result['phase_seconds']['reconcile'], 0)
+
+    def test_format_table(self):
+        table = format_table([benchmark('BB84', 20, 1, seed=3)])
+        self.assertEqual(2, len(table.splitlines()))
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+import unittest
+
+from QNetwork.simulation.sweep import ResultCache, make_grid, point_seed, run_point, sweep, format_table
+
+
+class TestGrid(unittest.TestCase):
+    def test_combinations(self):
+        points = make_grid('BB84', [0.0, 0.1], [100, 200], [True, False])
+        self.assertEqual(8, len(points))
+        self.assertEqual({'protocol': 'BB84', 'error': 0.0, 'state_size': 100, 'maximize_key_bits': True,
+                          'noise': 0.0, 'loss': 0.0, 'rounds': 10, 'seed': 0}, points[0])
+
+
+class TestRunPoint(unittest.TestCase):
+    def test_bb84_point(self):
+        result = run_point(make_grid('BB84', [0.0], [400], rounds=2)[0])
+        self.assertEqual(0.0, result['abort_rate'])
+        self.assertTrue(result['keys_match'])
+        self.assertGreater(result['key_bits_per_state'], 0)
+        self.assertGreater(result['seconds_per_round'], 0)
+
+    def test_point_seed_depends_on_parameters_only(self):
+        first, second = make_grid('BB84', [0.0, 0.1], [100])
+        self.assertEqual(point_seed(second).entropy, point_seed(make_grid('BB84', [0.1], [100])[0]).entropy)
+        self.assertNotEqual(point_seed(first).entropy, point_seed(second).entropy)
+
+    def test_attack_point(self):
+        point = dict(make_grid('BB84', [0.05], [400], rounds=2)[0], attack='InterceptResend', rate=1.0, strength=1.0)
+        result = run_point(point)
+        self.assertEqual(1.0, result['abort_rate'])
+        self.assertEqual(800, result['intercepted'])
+
+    def test_noise_beyond_tolerated_error_aborts(self):
+        result = run_point(make_grid('BB84', [0.0], [400], noises=[0.2], rounds=2)[0])
+        self.assertEqual(1.0, result['abort_rate'])
+        self.assertEqual(0, result['key_bits_per_state'])
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_key_depends_on_parameters_only(self):
+        a = {'error': 0.0, 'state_size': 100}
+        self.assertEqual(ResultCache.key(a), ResultCache.key({'state_size': 100, 'error': 0.0}))
+        self.assertNotEqual(ResultCache.key(a), ResultCache.key({'error': 0.1, 'state_size': 100}))
+
+    def test_repeated_sweep_only_computes_new_points(self):
+        cached, new = make_grid('BB84', [0.0], [100, 200], rounds=1)
+        self.cache.put(cached, {'cached': True})
+        results = sweep([cached, new], self.cache, workers=1)
+        self.assertEqual({'cached': True}, results[0])
+        self.assertEqual(results[1], self.cache.get(new))
+
+    def test_sweep_on_process_pool(self):
+        results = sweep(make_grid('BB84', [0.0, 0.1], [100], rounds=1), self.cache, workers=2)
+        self.assertEqual([0.0, 0.1], [r['error'] for r in results])
+        self.assertEqual(results, sweep(make_grid('BB84', [0.0, 0.1], [100], rounds=1), self.cache, workers=2))
+
+    def test_warn_about_diqkd(self):
+        point = make_grid('DIQKD', [0.1], [100], rounds=1)[0]
+        self.cache.put(point, {'cached': True})
+        with self.assertWarnsRegex(RuntimeWarning, 'DIQKD'):
+            sweep([point], self.cache, workers=1)
+
+    def test_format_table(self):
+        table = format_table(sweep(make_grid('BB84', [0.0], [100], rounds=1), workers=1))
+        self.assertEqual(2, len(table.splitlines()))
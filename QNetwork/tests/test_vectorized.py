@@ -0,0 +1,168 @@
+import threading
+import unittest
+
+import numpy as np
+
+from QNetwork.q_network_channels import QChannel, CreditFlowControl
+from QNetwork.q_network_config import NetworkFactory
+from QNetwork.q_network_settings import NetworkConfig
+from QNetwork.qkd.reconciliation import CascadeReconciler
+from QNetwork.simulation.benchmark import make_nodes, run_rounds
+from QNetwork.simulation.local import LocalQubit
+from QNetwork.simulation.vectorized import VectorizedNetwork, get_local_network
+
+
+class TestVectorizedNetwork(unittest.TestCase):
+    def setUp(self):
+        self.network = VectorizedNetwork(seed=7, timeout=1)
+        self.alice = self.network.cqc_connection('Alice')
+        self.bob = self.network.cqc_connection('Bob')
+
+    def test_fresh_qubits_measure_zero(self):
+        self.assertEqual([0, 0, 0], self.alice.allocate_qubits(3).measure().tolist())
+
+    def test_gates_on_selected_qubits(self):
+        qubits = self.alice.allocate_qubits(4)
+        qubits.select([True, False, True, False]).X()
+        hadamard = qubits.select([False, False, True, True])
+        hadamard.H()
+        hadamard.H()
+        self.assertEqual([1, 0, 1, 0], qubits.measure().tolist())
+
+    def test_hadamard_gives_uniform_outcomes(self):
+        qubits = self.alice.allocate_qubits(10000)
+        qubits.H()
+        self.assertAlmostEqual(0.5, qubits.measure().mean(), delta=0.03)
+
+    def test_receive_in_chunks_of_other_size(self):
+        for n in (3, 5):
+            qubits = self.alice.allocate_qubits(n)
+            qubits.X()
+            self.alice.send_qubits(qubits, 'Bob')
+        self.assertEqual([1] * 2, self.bob.receive_qubits(2).measure().tolist())
+        self.assertEqual([1] * 6, self.bob.receive_qubits(6).measure().tolist())
+
+    def test_epr_pairs_are_correlated(self):
+        local = self.alice.create_epr_pairs('Bob', 1000)
+        remote = self.bob.receive_epr_pairs(1000)
+        outcomes = local.measure()
+        np.testing.assert_array_equal(outcomes, remote.measure())
+        self.assertAlmostEqual(0.5, outcomes.mean(), delta=0.1)
+
+    def test_epr_pairs_are_correlated_in_hadamard_basis(self):
+        local = self.alice.create_epr_pairs('Bob', 1000)
+        remote = self.bob.receive_epr_pairs(1000)
+        local.H()
+        remote.H()
+        np.testing.assert_array_equal(remote.measure(), local.measure())
+
+    def test_epr_pairs_measured_in_rotated_bases(self):
+        local = self.alice.create_epr_pairs('Bob', 20000)
+        remote = self.bob.receive_epr_pairs(20000)
+        remote.rot_Y(32)
+        agree = np.mean(local.measure() == remote.measure())
+        self.assertAlmostEqual(np.cos(np.pi / 8) ** 2, agree, delta=0.02)
+
+    def test_noise_flips_outcomes(self):
+        network = VectorizedNetwork(seed=7, noise=0.3)
+        alice, bob = network.cqc_connection('Alice'), network.cqc_connection('Bob')
+        alice.send_qubits(alice.allocate_qubits(20000), 'Bob')
+        self.assertAlmostEqual(0.2, bob.receive_qubits(20000).measure().mean(), delta=0.02)
+
+    def test_lost_epr_halves_are_uncorrelated(self):
+        network = VectorizedNetwork(seed=7, loss=1.0)
+        alice, bob = network.cqc_connection('Alice'), network.cqc_connection('Bob')
+        local = alice.create_epr_pairs('Bob', 20000)
+        agree = np.mean(local.measure() == bob.receive_epr_pairs(20000).measure())
+        self.assertAlmostEqual(0.5, agree, delta=0.02)
+
+    def test_single_qubit_interface(self):
+        q = LocalQubit(self.alice)
+        q.X()
+        self.alice.sendQubit(q, 'Bob')
+        self.assertEqual(1, self.bob.recvQubit().measure())
+
+
+class TestQChannelBatches(unittest.TestCase):
+    def setUp(self):
+        network = VectorizedNetwork(seed=3, timeout=1)
+        self.sender = QChannel(network.cqc_connection('Alice'), LocalQubit, 'Bob')
+        self.receiver = QChannel(network.cqc_connection('Bob'), LocalQubit, 'Alice')
+
+    def test_send_and_receive_in_same_bases(self):
+        values = np.array([0, 1, 1, 0, 1], dtype=np.uint8)
+        bases = np.array([0, 1, 0, 1, 1], dtype=np.uint8)
+        self.sender.send_batch(values, bases)
+        np.testing.assert_array_equal(values, self.receiver.receive_batch(bases))
+
+    def test_epr_in_same_bases(self):
+        bases = np.array([0, 1] * 500, dtype=np.uint8)
+        np.testing.assert_array_equal(self.sender.send_epr_batch(bases), self.receiver.receive_epr_batch(bases))
+
+    def test_epr_batches_skip_flow_control(self):
+        bases = np.array([0, 1] * 500, dtype=np.uint8)
+        np.testing.assert_array_equal(self.sender.send_epr_batch(bases, CreditFlowControl(None)),
+                                      self.receiver.receive_epr_batch(bases, CreditFlowControl(None)))
+
+    def test_large_round(self):
+        n = 10 ** 6
+        values = np.random.default_rng(1).integers(0, 2, n, dtype=np.uint8)
+        bases = np.random.default_rng(2).integers(0, 2, n, dtype=np.uint8)
+        self.sender.send_batch(values, bases)
+        np.testing.assert_array_equal(values, self.receiver.receive_batch(bases))
+
+
+class TestEndToEnd(unittest.TestCase):
+    def test_bb84_round(self):
+        sender, receiver = make_nodes('BB84', VectorizedNetwork(seed=4), 10000, 0.0)
+        sender_keys, receiver_keys, _, outcomes = run_rounds(sender, receiver, 1)
+        self.assertEqual(sender_keys, receiver_keys)
+        self.assertGreater(len(sender_keys[0]), 0)
+        self.assertEqual([(False, 0.0)], outcomes)
+
+    def test_bb84_error_rate_of_noisy_channel(self):
+        sender, receiver = make_nodes('BB84', VectorizedNetwork(seed=4, noise=0.15), 20000, 0.2)
+        run_rounds(sender, receiver, 1)
+        self.assertAlmostEqual(0.1, sender.error_rate, delta=0.02)
+
+    def test_reconciled_keys_of_noisy_channel_match(self):
+        sender, receiver = make_nodes('BB84', VectorizedNetwork(seed=5, noise=0.05), NetworkConfig().state_size, 0.2)
+        for node in (sender, receiver):
+            node.maximize_key_bits = False
+            node.reconciler = CascadeReconciler()
+        receiver_keys = []
+        thread = threading.Thread(target=lambda: receiver_keys.extend(receiver.try_generate_key() for _ in range(20)))
+        thread.start()
+        sender_keys = [sender.try_generate_key() for _ in range(20)]
+        thread.join()
+        self.assertEqual(sender_keys, receiver_keys)
+        self.assertGreater(sum(1 for k in sender_keys if k), 10)
+
+
+class TestLocalBackend(unittest.TestCase):
+    def test_factory_connects_nodes_in_process(self):
+        factory = NetworkFactory(NetworkConfig(state_size=100, backend='Local'))
+        keys = {}
+
+        def generate(name, other, make_node):
+            node = make_node(factory.make_q_channel(name, other), factory.make_ca_channel(name, other))
+            keys[name] = node.try_generate_key()
+
+        thread = threading.Thread(target=generate, args=('Bob', 'Alice', factory.make_receiver_node))
+        thread.start()
+        generate('Alice', 'Bob', factory.make_sender_node)
+        thread.join()
+        self.assertEqual(keys['Alice'], keys['Bob'])
+
+    def test_networks_are_kept_per_parameters(self):
+        self.assertIs(get_local_network(7, 0.1), get_local_network(7, 0.1))
+        self.assertIsNot(get_local_network(7, 0.1), get_local_network(8, 0.1))
+        self.assertIsNot(get_local_network(7, 0.1), get_local_network(7, 0.2))
+
+    def test_factory_passes_random_seed(self):
+        factory = NetworkFactory(NetworkConfig(backend='Local', random_seed=11, noise=0.05))
+        self.assertIs(get_local_network(11, 0.05), factory._local_network())
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            NetworkFactory(NetworkConfig(backend='Hardware'))
@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from QNetwork.q_network_wire import encode_bits, decode_bits, encode_indices, decode_indices, encode_varints, \
+    decode_varints
+
+
+class TestBitFrames(unittest.TestCase):
+    def test_encode_bits(self):
+        self.assertEqual([1, 9, 0b10110111, 0b10000000], encode_bits([1, 0, 1, 1, 0, 1, 1, 1, 1]))
+
+    def test_encode_bases_with_two_bit_width(self):
+        self.assertEqual([2, 3, 0b00011000], encode_bits([0, 1, 2]))
+
+    def test_round_trip(self):
+        values = [random.randint(0, 2) for _ in range(1000)]
+        self.assertEqual(values, decode_bits(encode_bits(values)))
+
+    def test_empty_bits(self):
+        self.assertEqual([], decode_bits(encode_bits([])))
+
+    def test_bits_take_an_eighth_of_the_values(self):
+        self.assertEqual(1000 // 8 + 3, len(encode_bits([1] * 1000)))
+
+
+class TestIndexFrames(unittest.TestCase):
+    def test_delta_coded_indices(self):
+        self.assertEqual([0, 1, 1, 3], encode_indices([0, 1, 2, 5]))
+
+    def test_round_trip(self):
+        indices = sorted(random.sample(range(10 ** 6), 1000))
+        self.assertEqual(indices, decode_indices(encode_indices(indices)))
+
+    def test_empty_indices(self):
+        self.assertEqual([], decode_indices(encode_indices([])))
+
+
+class TestVarints(unittest.TestCase):
+    def test_small_values_take_one_byte(self):
+        self.assertEqual([0, 1, 127], encode_varints([0, 1, 127]))
+
+    def test_large_values_continue_in_next_bytes(self):
+        self.assertEqual([0x80, 0x01, 0xac, 0x02], encode_varints([128, 300]))
+
+    def test_round_trip(self):
+        values = [0, 1, 127, 128, 300, 2 ** 21, 2 ** 40 + 5]
+        self.assertEqual(values, decode_varints(encode_varints(values)).tolist())